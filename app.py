@@ -2,18 +2,31 @@ import streamlit as st
 import requests
 import io
 import json
+import uuid
 from PIL import Image
 import os
+import sys
 from dotenv import load_dotenv
 from datetime import datetime
 
+# Shared image utilities live alongside the Flask app
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'flask_app'))
+from phash_index import compute_dhash, NearDuplicateIndex
+from image_preprocess import prepare_for_upload
+from history_index import HistoryIndex
+from blob_store import write_blob, write_atomic
+from sightengine_client import SightengineClient, DetectionAPIError, CircuitOpenError, QuotaExceededError
+from detectors import get_detector, decide_bytes
+from provenance import scan_provenance, PROVENANCE_SCORE
+from verdicts import verdict_for_score, verdict_for_provenance, with_metadata_hints
+
 # Load environment variables
 load_dotenv()
 
 # API Configuration
-API_URL = "https://api.sightengine.com/1.0/check.json"
 API_USER = os.getenv("SIGHTENGINE_API_USER", "")
 API_SECRET = os.getenv("SIGHTENGINE_API_SECRET", "")
+PHASH_MAX_DISTANCE = int(os.getenv("PHASH_MAX_DISTANCE", 4))
 
 # Create directories for saving images and results
 UPLOAD_DIR = "uploaded_images"
@@ -22,18 +35,25 @@ os.makedirs(UPLOAD_DIR, exist_ok=True)
 os.makedirs(RESULTS_DIR, exist_ok=True)
 
 # Function to save image and results
-def save_image_and_results(image, image_name, analysis_result):
-    """Save uploaded image and analysis results with timestamp"""
+def save_image_and_results(image, image_bytes, image_name, analysis_result):
+    """
+    Save the uploaded image verbatim and the analysis results with timestamp
+    
+    The original bytes are stored content-addressed under UPLOAD_DIR (no
+    decode/re-encode, and re-uploads of the same file share one copy); the
+    decoded image is only used for the history thumbnail.
+    """
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
     base_name = os.path.splitext(image_name)[0]
+    # Timestamps have one-second resolution; the suffix keeps saves within a second apart
+    stem = f"{timestamp}_{base_name}_{uuid.uuid4().hex[:8]}"
     
     # Save image
-    image_filename = f"{timestamp}_{base_name}.png"
-    image_path = os.path.join(UPLOAD_DIR, image_filename)
-    image.save(image_path)
+    ext = os.path.splitext(image_name)[1].lstrip('.').lower() or 'bin'
+    _, image_path, _ = write_blob(UPLOAD_DIR, image_bytes, ext)
     
     # Save JSON result
-    json_filename = f"{timestamp}_{base_name}.json"
+    json_filename = f"{stem}.json"
     json_path = os.path.join(RESULTS_DIR, json_filename)
     
     # Add metadata to result
@@ -44,11 +64,38 @@ def save_image_and_results(image, image_name, analysis_result):
         **analysis_result
     }
     
-    with open(json_path, 'w', encoding='utf-8') as f:
-        json.dump(result_with_metadata, f, indent=2)
+    write_atomic(json_path, json.dumps(result_with_metadata, indent=2).encode('utf-8'))
+    
+    # Record in the history index with a precomputed preview
+    history = load_history_index()
+    thumbnail_path = history.make_thumbnail(image, stem)
+    history.add(json_path, result_with_metadata, thumbnail_path)
     
     return image_path, json_path
 
+@st.cache_resource
+def load_history_index():
+    """Open (and on first run backfill) the analysis history index"""
+    return HistoryIndex(RESULTS_DIR)
+
+# Only upstream verdicts are reused for near-duplicates, as in the Flask verdict
+# cache: local and metadata verdicts never stand in for them. A result's tier
+# names the engine that decided it (a cascade records 'local' or 'sightengine')
+REUSABLE_TIERS = (SightengineClient.name,)
+
+@st.cache_resource
+def load_phash_index():
+    """Index perceptual hashes of saved upstream results so near-duplicates can reuse them"""
+    index = NearDuplicateIndex(PHASH_MAX_DISTANCE)
+    for phash, json_path in load_history_index().phashes(tiers=REUSABLE_TIERS):
+        index.add(phash, json_path)
+    return index
+
+@st.cache_resource
+def load_detector():
+    """One engine (DETECTION_ENGINE) per server, so the Sightengine client's connections and breaker are shared"""
+    return get_detector()
+
 # Page configuration
 st.set_page_config(
     page_title="AI Image Detector",
@@ -107,8 +154,8 @@ with st.expander("ℹ️ About This Tool"):
     - Noise patterns typical of diffusion models
     """)
 
-# API Key Check
-if not API_USER or not API_SECRET:
+# API Key Check (the local engine needs none)
+if load_detector().remote and (not API_USER or not API_SECRET):
     st.warning("⚠️ API credentials not configured. Please set up your `.env` file with Sightengine API credentials.")
     st.info("Sign up at: https://dashboard.sightengine.com/signup")
     st.code("""
@@ -118,6 +165,12 @@ SIGHTENGINE_API_SECRET=your_api_secret_here
     """)
     st.stop()
 
+# Monthly API allowance, shared with the Flask app
+limiter = getattr(load_detector(), 'limiter', None)
+quota = limiter.get_status() if limiter is not None else {}
+if quota.get('remaining') is not None:
+    st.caption(f"📊 {quota['remaining']} of {quota['monthly_budget']} detections left this month")
+
 # File uploader
 st.subheader("📤 Upload Image")
 uploaded_file = st.file_uploader(
@@ -149,20 +202,64 @@ if uploaded_file is not None:
         if st.button("🚀 Detect AI Generation", type="primary", use_container_width=True):
             with st.spinner("🔍 Analyzing image for AI artifacts..."):
                 try:
-                    # Reset file pointer
-                    uploaded_file.seek(0)
-                    
-                    # Prepare API request
-                    files = {"media": uploaded_file.getvalue()}
-                    data = {
-                        "models": "genai",
-                        "api_user": API_USER,
-                        "api_secret": API_SECRET
-                    }
+                    # Reuse the score of a previously analyzed near-duplicate
+                    phash_index = load_phash_index()
+                    phash = compute_dhash(image)
+                    match = phash_index.find(phash)
+                    prior_score = None
+                    if match:
+                        try:
+                            with open(match[0], 'r', encoding='utf-8') as f:
+                                prior = json.load(f)
+                            if prior.get("detection_tier") in REUSABLE_TIERS:
+                                prior_score = prior.get("probability_score")
+                        except (OSError, ValueError):
+                            phash_index.remove(match[0])
                     
-                    # Make API call
-                    response = requests.post(API_URL, files=files, data=data, timeout=30)
-                    result = response.json()
+                    # Generator markers in the file headers settle it without an engine call
+                    provenance = scan_provenance(uploaded_file.getvalue())
+                    if provenance and provenance["declared"]:
+                        st.info("🏷️ The file's metadata declares it AI-generated")
+                        result = {
+                            "status": "success",
+                            "type": {"ai_generated": PROVENANCE_SCORE},
+                            "tier": "metadata",
+                            "provenance": provenance
+                        }
+                    elif prior_score is not None:
+                        st.info("♻️ Near-duplicate of a previously analyzed image - reusing its result")
+                        result = {
+                            "status": "success",
+                            "type": {"ai_generated": prior_score},
+                            "tier": prior.get("detection_tier")
+                        }
+                    else:
+                        original_bytes = uploaded_file.getvalue()
+                        
+                        def prepare():
+                            # Downscale large images so less data goes over the wire
+                            payload, preprocessing = prepare_for_upload(
+                                io.BytesIO(original_bytes), len(original_bytes)
+                            )
+                            if preprocessing['resized']:
+                                st.caption(
+                                    f"📉 Sent {preprocessing['sent_bytes'] / 1024:.1f} KB instead of "
+                                    f"{preprocessing['original_bytes'] / 1024:.1f} KB "
+                                    f"(preprocessed in {preprocessing['preprocess_ms']:.0f} ms)"
+                                )
+                            return payload
+                        
+                        # Score with the configured engine; prepare() only runs if the image goes upstream
+                        try:
+                            score, tier = decide_bytes(
+                                load_detector(), original_bytes, uploaded_file.name, prepare=prepare
+                            )
+                            result = {"status": "success", "type": {"ai_generated": score}, "tier": tier}
+                        except DetectionAPIError as api_error:
+                            result = {
+                                "status": "failure",
+                                "error": {"code": api_error.code, "message": api_error.message}
+                            }
                     
                     # Check for API errors
                     if result.get("status") == "success":
@@ -171,53 +268,18 @@ if uploaded_file is not None:
                         confidence_percent = score * 100
                         probability_score = score
                         
-                        # Determine if AI-generated
-                        is_ai = score > 0.5
-                        label = "AI-Generated" if is_ai else "Likely Real"
-                        
-                        # Determine likely generator based on score patterns
-                        if is_ai:
-                            if score > 0.9:
-                                likely_generator = "Midjourney/DALL-E (High Confidence)"
-                            elif score > 0.75:
-                                likely_generator = "Stable Diffusion/Flux"
-                            else:
-                                likely_generator = "Unknown AI Generator"
+                        # Verdict from the shared score table (see flask_app/verdicts.py)
+                        if result.get("provenance"):
+                            verdict = verdict_for_provenance(result["provenance"])
                         else:
-                            likely_generator = "Real Photo"
-                        
-                        # Generate explanation
-                        explanation_points = []
-                        if is_ai:
-                            if score > 0.9:
-                                explanation_points.append("• Very high AI probability detected")
-                                explanation_points.append("• Strong diffusion model patterns identified")
-                                explanation_points.append("• Unnatural smoothness in textures")
-                            elif score > 0.75:
-                                explanation_points.append("• High AI probability detected")
-                                explanation_points.append("• Moderate diffusion patterns present")
-                            else:
-                                explanation_points.append("• Moderate AI probability detected")
-                                explanation_points.append("• Some synthetic artifacts found")
-                            
-                            explanation_points.append("• Possible anatomical inconsistencies")
-                            explanation_points.append("• Lighting/shadow patterns suggest generation")
-                        else:
-                            if score < 0.1:
-                                explanation_points.append("• Very low AI probability")
-                                explanation_points.append("• Natural grain and imperfections present")
-                                explanation_points.append("• Organic asymmetry detected")
-                            elif score < 0.3:
-                                explanation_points.append("• Low AI probability")
-                                explanation_points.append("• Mostly natural characteristics")
-                            else:
-                                explanation_points.append("• Borderline case")
-                                explanation_points.append("• May be edited or filtered real photo")
-                            
-                            explanation_points.append("• Realistic depth-of-field")
-                            explanation_points.append("• Natural lighting characteristics")
-                        
-                        explanation = "\n".join(explanation_points)
+                            verdict = verdict_for_score(score, result.get("tier"))
+                            if provenance:
+                                # Generator names in free-text metadata inform but do not decide
+                                verdict = with_metadata_hints(verdict, provenance["hints"])
+                        is_ai = verdict["is_ai_generated"]
+                        label = "AI-Generated" if is_ai else "Likely Real"
+                        likely_generator = verdict["likely_generator"]
+                        explanation = verdict["explanation"]
                         
                         # Create JSON output
                         json_output = {
@@ -225,7 +287,8 @@ if uploaded_file is not None:
                             "confidence_percent": round(confidence_percent, 2),
                             "probability_score": round(probability_score, 4),
                             "explanation": explanation,
-                            "likely_generator": likely_generator
+                            "likely_generator": likely_generator,
+                            "detection_tier": result.get("tier")
                         }
                         
                         # Display result with styling
@@ -262,9 +325,12 @@ if uploaded_file is not None:
                         try:
                             saved_image_path, saved_json_path = save_image_and_results(
                                 image, 
+                                uploaded_file.getvalue(),
                                 uploaded_file.name, 
-                                json_output
+                                {**json_output, "phash": phash}
                             )
+                            if json_output["detection_tier"] in REUSABLE_TIERS:
+                                phash_index.add(phash, saved_json_path)
                             st.success(f"✅ Image and results saved successfully!")
                             with st.expander("💾 Saved Files"):
                                 st.write(f"**Image:** `{saved_image_path}`")
@@ -282,6 +348,13 @@ if uploaded_file is not None:
                     else:
                         st.error(f"❌ Unexpected response: {result}")
                 
+                except QuotaExceededError as e:
+                    if e.reason == 'budget':
+                        st.error("📉 The monthly detection quota has been used up.")
+                    else:
+                        st.error(f"🚦 Too many detections right now. Please retry in {e.retry_after:.0f}s.")
+                except CircuitOpenError:
+                    st.error("🚧 Detection service is temporarily unavailable. Please try again shortly.")
                 except requests.exceptions.Timeout:
                     st.error("⏱️ Request timed out. Please try again.")
                 except requests.exceptions.RequestException as e:
@@ -294,56 +367,52 @@ if uploaded_file is not None:
 st.markdown("---")
 st.subheader("📚 Analysis History")
 
-# Get all saved results
-if os.path.exists(RESULTS_DIR):
-    json_files = sorted([f for f in os.listdir(RESULTS_DIR) if f.endswith('.json')], reverse=True)
+HISTORY_PAGE_SIZE = 10
+history = load_history_index()
+total_analyses = history.count()
+
+if total_analyses:
+    st.write(f"**Total Analyses:** {total_analyses}")
     
-    if json_files:
-        st.write(f"**Total Analyses:** {len(json_files)}")
+    with st.expander(f"📂 View History ({total_analyses} records)"):
+        page_count = (total_analyses + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1) - 1
         
-        with st.expander(f"📂 View History ({len(json_files)} records)"):
-            # Limit display to last 10 results
-            for json_file in json_files[:10]:
-                json_path = os.path.join(RESULTS_DIR, json_file)
+        for entry in history.page(page, HISTORY_PAGE_SIZE):
+            result_data = entry['result']
+            json_file = os.path.basename(entry['json_path'])
+            
+            try:
+                # Create columns for history display
+                hist_col1, hist_col2 = st.columns([1, 2])
                 
-                try:
-                    with open(json_path, 'r', encoding='utf-8') as f:
-                        result_data = json.load(f)
-                    
-                    # Create columns for history display
-                    hist_col1, hist_col2 = st.columns([1, 2])
-                    
-                    with hist_col1:
-                        # Display saved image if exists
-                        image_path = result_data.get('saved_image_path', '')
-                        if os.path.exists(image_path):
-                            saved_img = Image.open(image_path)
-                            st.image(saved_img, width=150)
-                    
-                    with hist_col2:
-                        st.write(f"**File:** {result_data.get('original_filename', 'Unknown')}")
-                        st.write(f"**Time:** {result_data.get('timestamp', 'Unknown')}")
-                        st.write(f"**Result:** {'🤖 AI-Generated' if result_data.get('is_ai_generated') else '✅ Likely Real'}")
-                        st.write(f"**Confidence:** {result_data.get('confidence_percent', 0):.1f}%")
-                        
-                        # Download button for this result
-                        st.download_button(
-                            label="📥 Download JSON",
-                            data=json.dumps(result_data, indent=2),
-                            file_name=json_file,
-                            mime="application/json",
-                            key=f"download_{json_file}"
-                        )
-                    
-                    st.markdown("---")
+                with hist_col1:
+                    # Precomputed preview; results from before the index fall back to the full image
+                    preview_path = entry['thumbnail_path'] or entry['image_path'] or ''
+                    if os.path.exists(preview_path):
+                        st.image(preview_path, width=150)
+                
+                with hist_col2:
+                    st.write(f"**File:** {entry['original_filename']}")
+                    st.write(f"**Time:** {entry['timestamp'] or 'Unknown'}")
+                    st.write(f"**Result:** {'🤖 AI-Generated' if entry['is_ai_generated'] else '✅ Likely Real'}")
+                    st.write(f"**Confidence:** {entry['confidence_percent']:.1f}%")
                     
-                except Exception as e:
-                    st.error(f"Error loading {json_file}: {str(e)}")
-            
-            if len(json_files) > 10:
-                st.info(f"Showing last 10 results. Total records: {len(json_files)}")
-    else:
-        st.info("No analysis history yet. Upload and analyze an image to get started!")
+                    # Download button for this result
+                    st.download_button(
+                        label="📥 Download JSON",
+                        data=json.dumps(result_data, indent=2),
+                        file_name=json_file,
+                        mime="application/json",
+                        key=f"download_{json_file}"
+                    )
+                
+                st.markdown("---")
+                
+            except Exception as e:
+                st.error(f"Error loading {json_file}: {str(e)}")
+        
+        st.info(f"Page {page + 1} of {page_count}. Total records: {total_analyses}")
 else:
     st.info("No analysis history yet. Upload and analyze an image to get started!")
 
@@ -0,0 +1,3 @@
+"""
+Benchmarks and local test tooling (stub upstream API, load scripts)
+"""
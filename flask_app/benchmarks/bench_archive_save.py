@@ -0,0 +1,73 @@
+"""
+Benchmark: archiving an analyzed upload
+Compares the old save path (decoded image re-encoded as PNG) with storing the
+original bytes content-addressed, on latency and bytes on disk
+
+Usage:
+    python benchmarks/bench_archive_save.py --runs 5
+"""
+import os
+import sys
+import io
+import time
+import shutil
+import argparse
+import tempfile
+import statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image
+from blob_store import write_blob
+from benchmarks.bench_preprocess import make_photo, SIZES
+
+def save_png(image, directory, name):
+    """Previous behaviour of save_image_and_results"""
+    path = os.path.join(directory, f"{name}.png")
+    image.save(path)
+    return os.path.getsize(path)
+
+def save_original(image_bytes, directory):
+    """Current behaviour: original bytes, content-addressed"""
+    _, path, _ = write_blob(directory, image_bytes, 'jpg')
+    return os.path.getsize(path)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--runs', type=int, default=5)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-archive-')
+    print(f"{'image':>11} | {'upload':>8} | {'png ms':>8} | {'png size':>9} | {'blob ms':>8} | {'blob size':>9} | {'speedup':>7}")
+    print("-" * 82)
+
+    try:
+        for width, height in SIZES:
+            image_bytes = make_photo(width, height)
+            png_ms, blob_ms = [], []
+
+            for run in range(args.runs):
+                # The old path always had a decoded image in hand, so decoding is not timed
+                image = Image.open(io.BytesIO(image_bytes))
+                image.load()
+
+                started = time.perf_counter()
+                png_size = save_png(image, workdir, f"{width}x{height}_{run}")
+                png_ms.append((time.perf_counter() - started) * 1000)
+
+                blob_dir = os.path.join(workdir, f"blobs_{run}")
+                started = time.perf_counter()
+                blob_size = save_original(image_bytes, blob_dir)
+                blob_ms.append((time.perf_counter() - started) * 1000)
+
+            png_median = statistics.median(png_ms)
+            blob_median = statistics.median(blob_ms)
+            print(
+                f"{width:>5}x{height:<5} | {len(image_bytes) / 1024:>6.0f}KB | {png_median:>8.1f} | "
+                f"{png_size / 1024 / 1024:>7.1f}MB | {blob_median:>8.2f} | {blob_size / 1024 / 1024:>7.1f}MB | "
+                f"{png_median / blob_median:>6.0f}x"
+            )
+    finally:
+        shutil.rmtree(workdir)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""
+Benchmark: login latency while detection traffic is running
+Starts the Flask app on a throwaway SQLite database with a local stub in
+place of Sightengine, keeps detection clients busy, and measures login
+latency percentiles with bcrypt inline or in the hashing process pool
+
+Usage:
+    python benchmarks/bench_login.py --workers 0 --duration 20
+    python benchmarks/bench_login.py --workers 2 --duration 20
+"""
+import os
+import sys
+import time
+import argparse
+import tempfile
+import threading
+import statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * pct / 100))]
+
+def summarize(name, latencies, statuses):
+    ms = [t * 1000 for t in latencies]
+    codes = ', '.join(f'{code}: {count}' for code, count in sorted(statuses.items()))
+    print(f"{name:<10} n={len(ms):<5} p50={percentile(ms, 50):7.1f}ms "
+          f"p95={percentile(ms, 95):7.1f}ms p99={percentile(ms, 99):7.1f}ms  ({codes})")
+
+def client_loop(send, stop, latencies, statuses, lock):
+    while not stop.is_set():
+        started = time.perf_counter()
+        status = send()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[status] = statuses.get(status, 0) + 1
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--workers', type=int, default=2, help='BCRYPT_WORKERS (0 = inline)')
+    parser.add_argument('--rounds', type=int, default=12, help='BCRYPT_ROUNDS')
+    parser.add_argument('--logins', type=int, default=8, help='concurrent login clients')
+    parser.add_argument('--detectors', type=int, default=4, help='concurrent detection clients')
+    parser.add_argument('--duration', type=float, default=20, help='seconds of load')
+    parser.add_argument('--fast-path', action='store_true', help='keep the verified-credential cache on')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_login_')
+    os.environ.update({
+        'DB_BACKEND': 'sqlite',
+        'SQLITE_PATH': os.path.join(workdir, 'bench.db'),
+        'DETECTION_JOBS_DB': os.path.join(workdir, 'jobs.db'),
+        'DETECTION_CACHE_TTL': '0',  # Every detection does the full upload path
+        'BCRYPT_WORKERS': str(args.workers),
+        'BCRYPT_ROUNDS': str(args.rounds),
+        'LOGIN_CACHE_TTL': '300' if args.fast_path else '0',
+        'SIGHTENGINE_API_USER': 'bench',
+        'SIGHTENGINE_API_SECRET': 'bench'
+    })
+
+    from benchmarks.stub_sightengine import start_stub
+    stub = start_stub(latency=0.05)
+    os.environ['SIGHTENGINE_API_URL'] = stub.url
+
+    import requests
+    from werkzeug.serving import make_server
+    from benchmarks.bench_preprocess import make_photo
+    from database import init_db
+    from server import app
+
+    init_db()
+    app.config['UPLOAD_FOLDER'] = os.path.join(workdir, 'uploads')
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    base = f'http://127.0.0.1:{server.server_port}'
+
+    credentials = {'username': 'bench', 'password': 'correct horse battery staple'}
+    requests.post(f'{base}/api/auth/register', json=credentials).raise_for_status()
+
+    photos = [make_photo(1600, 1200, seed) for seed in range(8)]
+    counter = iter(range(10 ** 9))
+
+    def login():
+        return requests.post(f'{base}/api/auth/login', json=credentials).status_code
+
+    def detect():
+        photo = photos[next(counter) % len(photos)]
+        files = {'image': ('bench.jpg', photo, 'image/jpeg')}
+        return requests.post(f'{base}/api/detect-ai-image', files=files).status_code
+
+    stop = threading.Event()
+    lock = threading.Lock()
+    results = {'login': ([], {}), 'detect': ([], {})}
+    threads = [
+        threading.Thread(target=client_loop, args=(detect, stop, *results['detect'], lock))
+        for _ in range(args.detectors)
+    ] + [
+        threading.Thread(target=client_loop, args=(login, stop, *results['login'], lock))
+        for _ in range(args.logins)
+    ]
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join()
+    server.shutdown()
+
+    mode = 'inline' if args.workers <= 0 else f'pool of {args.workers}'
+    print(f"bcrypt {mode}, cost {args.rounds}, {args.logins} login + {args.detectors} "
+          f"detection clients for {args.duration:.0f}s on {os.cpu_count()} CPU(s)")
+    for name, (latencies, statuses) in results.items():
+        summarize(name, latencies, statuses)
+    detect_latencies = results['detect'][0]
+    if detect_latencies:
+        print(f"detection throughput: {len(detect_latencies) / args.duration:.1f} req/s "
+              f"(mean {statistics.mean(detect_latencies) * 1000:.1f}ms)")
+
+if __name__ == '__main__':
+    main()
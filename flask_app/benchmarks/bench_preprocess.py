@@ -0,0 +1,83 @@
+"""
+Benchmark: end-to-end upstream latency with and without image preprocessing
+Generates photo-like JPEGs at several resolutions and posts each to a local
+stub API throttled to a phone-like uplink, once as the original file and once
+after prepare_for_upload()
+
+Usage:
+    python benchmarks/bench_preprocess.py --bandwidth 1.5 --runs 3
+"""
+import os
+import sys
+import io
+import time
+import argparse
+import statistics
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import numpy as np
+import requests
+from PIL import Image
+from image_preprocess import prepare_for_upload
+from benchmarks.stub_sightengine import start_stub
+
+SIZES = [(1280, 960), (2048, 1536), (4032, 3024), (6000, 4000)]
+
+def make_photo(width, height, seed=0):
+    """Smooth gradients plus sensor-like noise, encoded like a phone camera JPEG"""
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    base = np.stack([
+        128 + 100 * np.sin(x / 180 + seed),
+        128 + 100 * np.cos(y / 140),
+        128 + 80 * np.sin((x + y) / 260)
+    ], axis=-1)
+    noisy = base + rng.normal(0, 12, base.shape)
+    image = Image.fromarray(np.clip(noisy, 0, 255).astype(np.uint8))
+    out = io.BytesIO()
+    image.save(out, 'JPEG', quality=92)
+    return out.getvalue()
+
+def post(url, payload):
+    started = time.perf_counter()
+    requests.post(url, files={'media': payload}, data={'models': 'genai'}, timeout=300)
+    return time.perf_counter() - started
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--bandwidth', type=float, default=1.5, help='Simulated uplink in MB/s')
+    parser.add_argument('--latency', type=float, default=0.2, help='Simulated model time in seconds')
+    parser.add_argument('--runs', type=int, default=3)
+    args = parser.parse_args()
+
+    stub = start_stub(bandwidth=int(args.bandwidth * 1024 * 1024), latency=args.latency)
+
+    print(f"Uplink {args.bandwidth} MB/s, model latency {args.latency}s, {args.runs} runs each\n")
+    print(f"{'image':>11} | {'original':>9} | {'sent':>8} | {'prep ms':>7} | {'orig s':>7} | {'prep+send s':>11} | {'speedup':>7}")
+    print("-" * 80)
+
+    for width, height in SIZES:
+        original = make_photo(width, height)
+        plain, prepared, prep_ms, sent = [], [], [], len(original)
+
+        for _ in range(args.runs):
+            plain.append(post(stub.url, original))
+
+            started = time.perf_counter()
+            payload, stats = prepare_for_upload(io.BytesIO(original), len(original))
+            prep_ms.append(stats['preprocess_ms'])
+            sent = stats['sent_bytes']
+            post(stub.url, payload or original)
+            prepared.append(time.perf_counter() - started)
+
+        plain_s = statistics.median(plain)
+        prepared_s = statistics.median(prepared)
+        print(
+            f"{width:>5}x{height:<5} | {len(original) / 1024:>7.0f}KB | {sent / 1024:>6.0f}KB | "
+            f"{statistics.median(prep_ms):>7.1f} | {plain_s:>7.2f} | {prepared_s:>11.2f} | {plain_s / prepared_s:>6.1f}x"
+        )
+
+    stub.shutdown()
+
+if __name__ == '__main__':
+    main()
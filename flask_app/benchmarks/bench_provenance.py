@@ -0,0 +1,83 @@
+"""
+Benchmark: provenance scan throughput versus decoding the image
+Writes a mixed set of generator-marked and unmarked images to a temp folder
+and measures images per second for the header-only scan, a full Pillow
+decode, and the local forensic engine, as a reference for what the fast
+path saves before any upstream call
+
+Usage:
+    python benchmarks/bench_provenance.py --images 200
+"""
+import io
+import os
+import sys
+import time
+import argparse
+import tempfile
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from PIL import Image, PngImagePlugin
+from provenance import scan_provenance, PROVENANCE_SCAN_BYTES
+from forensic_detector import LocalForensicDetector
+from benchmarks.bench_preprocess import make_photo
+
+def make_corpus(folder, count):
+    """Quarter each of: camera JPEG, SD web UI PNG, XMP-tagged JPEG, plain PNG"""
+    photo = Image.open(io.BytesIO(make_photo(1600, 1200)))
+    square = photo.crop((0, 0, 1024, 1024))
+    camera = Image.Exif()
+    camera[0x010F], camera[0x0110] = 'Canon', 'EOS R5'
+    parameters = PngImagePlugin.PngInfo()
+    parameters.add_text('parameters', 'a lighthouse at dusk\nSteps: 30, Sampler: DPM++ 2M, CFG scale: 7')
+    xmp = (b'<x:xmpmeta xmlns:x="adobe:ns:meta/"><Iptc4xmpExt:DigitalSourceType>'
+           b'http://cv.iptc.org/newscodes/digitalsourcetype/trainedAlgorithmicMedia'
+           b'</Iptc4xmpExt:DigitalSourceType></x:xmpmeta>')
+    kinds = [
+        ('camera.jpg', lambda path: photo.save(path, 'JPEG', quality=90, exif=camera)),
+        ('webui.png', lambda path: square.save(path, 'PNG', pnginfo=parameters)),
+        ('xmp.jpg', lambda path: photo.save(path, 'JPEG', quality=90, xmp=xmp)),
+        ('plain.png', lambda path: square.save(path, 'PNG')),
+    ]
+    paths = []
+    for index in range(count):
+        name, save = kinds[index % len(kinds)]
+        path = os.path.join(folder, f'{index:05d}_{name}')
+        save(path)
+        paths.append(path)
+    return paths
+
+def measure(name, paths, fn):
+    started = time.perf_counter()
+    results = [fn(path) for path in paths]
+    elapsed = time.perf_counter() - started
+    print(f"{name:<22} {len(paths) / elapsed:9.1f} images/s  ({elapsed / len(paths) * 1000:6.2f} ms/image)")
+    return results
+
+def full_decode(path):
+    with Image.open(path) as image:
+        image.load()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--images', type=int, default=200, help='images in the corpus')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix='bench_provenance_') as folder:
+        paths = make_corpus(folder, args.images)
+        total_bytes = sum(os.path.getsize(path) for path in paths)
+        print(f"{len(paths)} images, {total_bytes / len(paths) / 1024:.0f} KB average, "
+              f"scan limit {PROVENANCE_SCAN_BYTES // 1024} KB")
+
+        reports = measure('provenance scan', paths, scan_provenance)
+        measure('full decode (Pillow)', paths, full_decode)
+        local = LocalForensicDetector()
+        measure('local forensic engine', paths, local.check_file)
+        stats = local.get_stats()
+        print(f"{'  of which decoding':<22} {'':19}  ({stats['mean_decode_ms']:6.2f} ms/image)")
+
+        marked = sum(bool(report and report['declared']) for report in reports)
+        print(f"\nprovenance decided {marked} of {len(paths)} images "
+              f"({marked / len(paths) * 100:.0f}%) without decoding them")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+"""
+Offline evaluation of the detection cascade on a labeled local image set
+Scores every image with the local forensic engine once, then replays the
+cascade for the configured band and a sweep of alternatives, reporting the
+escalation rate, upstream calls saved and agreement with upstream verdicts
+(and accuracy, where labels are known)
+
+Layout: images under DATASET/ai/ and DATASET/real/ are labeled by their
+folder; anything else is scored but unlabeled. Upstream scores come from a
+CSV of path,score; with --live, missing ones are fetched from Sightengine
+(this spends quota) and appended to that CSV so reruns are free.
+
+Usage:
+    python benchmarks/eval_cascade.py DATASET --upstream-scores scores.csv
+    python benchmarks/eval_cascade.py DATASET --upstream-scores scores.csv --live
+    python benchmarks/eval_cascade.py DATASET --real-below 0.1 --ai-above 0.95
+"""
+import os
+import sys
+import csv
+import argparse
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from detectors import CASCADE_REAL_BELOW, CASCADE_AI_ABOVE
+from forensic_detector import LocalForensicDetector
+from sightengine_client import DetectionAPIError
+from verdicts import AI_THRESHOLD
+
+IMAGE_EXTENSIONS = {'.png', '.jpg', '.jpeg', '.webp'}
+SWEEP = [(0.05, 0.95), (0.10, 0.90), (0.15, 0.90), (0.20, 0.85), (0.30, 0.70), (0.50, 0.50)]
+
+def find_images(root):
+    """Yield (path relative to root, label) with label True/False/None"""
+    for folder, _, files in os.walk(root):
+        top = os.path.relpath(folder, root).split(os.sep)[0].lower()
+        label = {'ai': True, 'real': False}.get(top)
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() in IMAGE_EXTENSIONS:
+                yield os.path.relpath(os.path.join(folder, name), root), label
+
+def load_upstream_scores(path):
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, newline='', encoding='utf-8') as f:
+        return {row['path']: float(row['score']) for row in csv.DictReader(f)}
+
+def fetch_missing(root, samples, scores, path):
+    """Score images without an upstream score through Sightengine, appending to the CSV"""
+    from sightengine_client import SightengineClient
+    client = SightengineClient.from_env()
+    new_file = not os.path.exists(path)
+    with open(path, 'a', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        if new_file:
+            writer.writerow(['path', 'score'])
+        for sample in samples:
+            if sample['path'] in scores:
+                continue
+            try:
+                score = client.check_file(os.path.join(root, sample['path']))
+            except Exception as e:
+                print(f"  upstream failed for {sample['path']}: {e}")
+                continue
+            scores[sample['path']] = score
+            writer.writerow([sample['path'], score])
+            f.flush()
+
+def rate(numerator, denominator):
+    return f"{numerator / denominator * 100:5.1f}%" if denominator else '    -'
+
+def evaluate(samples, real_below, ai_above):
+    """Replay the cascade for one band over precomputed scores"""
+    result = {'escalated': 0, 'local': 0, 'local_agree': 0, 'local_compared': 0,
+              'cascade_correct': 0, 'labeled': 0, 'unknown_upstream': 0}
+    for sample in samples:
+        local, upstream, label = sample['local'], sample['upstream'], sample['label']
+        decisive = local is not None and (local < real_below or local >= ai_above)
+        if decisive:
+            result['local'] += 1
+            final = local
+            if upstream is not None:
+                result['local_compared'] += 1
+                result['local_agree'] += (local > AI_THRESHOLD) == (upstream > AI_THRESHOLD)
+        else:
+            result['escalated'] += 1
+            final = upstream
+            if upstream is None:
+                result['unknown_upstream'] += 1
+        if label is not None and final is not None:
+            result['labeled'] += 1
+            result['cascade_correct'] += (final > AI_THRESHOLD) == label
+    return result
+
+def accuracy(samples, key):
+    judged = [s for s in samples if s['label'] is not None and s[key] is not None]
+    correct = sum((s[key] > AI_THRESHOLD) == s['label'] for s in judged)
+    return rate(correct, len(judged)), len(judged)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('dataset', help='folder of images (ai/ and real/ subfolders are labeled)')
+    parser.add_argument('--upstream-scores', help='CSV of path,score from Sightengine')
+    parser.add_argument('--live', action='store_true', help='fetch missing upstream scores (uses quota)')
+    parser.add_argument('--real-below', type=float, default=CASCADE_REAL_BELOW)
+    parser.add_argument('--ai-above', type=float, default=CASCADE_AI_ABOVE)
+    args = parser.parse_args()
+
+    detector = LocalForensicDetector()
+    samples = []
+    for path, label in find_images(args.dataset):
+        try:
+            local = detector.check_file(os.path.join(args.dataset, path))
+        except DetectionAPIError:
+            local = None  # The cascade escalates images the screen cannot read
+        samples.append({'path': path, 'label': label, 'local': local, 'upstream': None})
+    if not samples:
+        parser.error(f'no images found under {args.dataset}')
+
+    scores = load_upstream_scores(args.upstream_scores)
+    if args.live:
+        if not args.upstream_scores:
+            parser.error('--live needs --upstream-scores to record the fetched scores')
+        fetch_missing(args.dataset, samples, scores, args.upstream_scores)
+    for sample in samples:
+        sample['upstream'] = scores.get(sample['path'])
+
+    total = len(samples)
+    stats = detector.get_stats()
+    print(f"{total} images ({sum(s['label'] is not None for s in samples)} labeled, "
+          f"{sum(s['upstream'] is not None for s in samples)} with upstream scores), "
+          f"local engine {stats['mean_ms']:.1f} ms/image")
+
+    for name, key in (('local only', 'local'), ('upstream only', 'upstream')):
+        acc, judged = accuracy(samples, key)
+        print(f"  {name:<14} accuracy {acc} over {judged} labeled images")
+
+    print(f"\n{'band':<13} {'escalated':>10} {'calls saved':>12} {'agree w/ upstream':>18} {'cascade acc':>12}")
+    bands = [(args.real_below, args.ai_above)] + [band for band in SWEEP if band != (args.real_below, args.ai_above)]
+    for index, (real_below, ai_above) in enumerate(bands):
+        r = evaluate(samples, real_below, ai_above)
+        marker = ' *' if index == 0 else ''
+        print(f"{real_below:.2f}-{ai_above:.2f}{marker:<3} {rate(r['escalated'], total):>10} "
+              f"{r['local']:>5} ({rate(r['local'], total).strip()}) "
+              f"{rate(r['local_agree'], r['local_compared']):>10} of {r['local_compared']:<5} "
+              f"{rate(r['cascade_correct'], r['labeled']):>10}")
+        if index == 0 and r['unknown_upstream']:
+            print(f"   {r['unknown_upstream']} escalated images have no upstream score "
+                  f"(pass --live to fetch them); they are left out of cascade accuracy")
+    print('\n* configured band (CASCADE_REAL_BELOW / CASCADE_AI_ABOVE or --real-below / --ai-above)')
+
+if __name__ == '__main__':
+    main()
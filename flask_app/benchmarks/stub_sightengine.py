@@ -0,0 +1,103 @@
+"""
+Local stand-in for the Sightengine check endpoint
+Used by the benchmarks, and for running the app offline with
+SIGHTENGINE_API_URL=http://localhost:5001/1.0/check.json
+
+Usage:
+    python benchmarks/stub_sightengine.py --port 5001 --bandwidth 2 --latency 0.3
+"""
+import argparse
+import hashlib
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class StubHandler(BaseHTTPRequestHandler):
+    """Answers every POST with a deterministic genai score for the body"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def do_POST(self):
+        server = self.server
+        length = int(self.headers.get('Content-Length', 0))
+        digest = hashlib.sha256()
+
+        # Read the upload at the simulated uplink speed
+        remaining = length
+        while remaining > 0:
+            chunk = self.rfile.read(min(64 * 1024, remaining))
+            if not chunk:
+                break
+            digest.update(chunk)
+            remaining -= len(chunk)
+            if server.bandwidth:
+                time.sleep(len(chunk) / server.bandwidth)
+
+        if server.latency:
+            time.sleep(server.latency)
+
+        with server.lock:
+            server.requests += 1
+            server.bytes_received += length
+            fail = server.fail_next > 0
+            if fail:
+                server.fail_next -= 1
+
+        if fail:
+            self._reply(503, {'status': 'failure', 'error': {'code': 'unavailable', 'message': 'Stub outage'}})
+            return
+
+        score = digest.digest()[0] / 255
+        self._reply(200, {'status': 'success', 'type': {'ai_generated': round(score, 4)}})
+
+    def _reply(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+def start_stub(port=0, bandwidth=0, latency=0.0):
+    """
+    Start the stub in a background thread
+
+    Args:
+        port: Port to bind on localhost (0 picks a free one)
+        bandwidth: Simulated uplink in bytes/second (0 = unlimited)
+        latency: Fixed processing delay in seconds
+
+    Returns:
+        The running server; its url attribute is the check endpoint.
+        Set server.fail_next = N to answer the next N calls with 503.
+    """
+    server = ThreadingHTTPServer(('127.0.0.1', port), StubHandler)
+    server.daemon_threads = True
+    server.bandwidth = bandwidth
+    server.latency = latency
+    server.lock = threading.Lock()
+    server.requests = 0
+    server.bytes_received = 0
+    server.fail_next = 0
+    server.url = f'http://127.0.0.1:{server.server_address[1]}/1.0/check.json'
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Stub Sightengine API server')
+    parser.add_argument('--port', type=int, default=5001)
+    parser.add_argument('--bandwidth', type=float, default=0, help='Simulated uplink in MB/s (0 = unlimited)')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fixed response delay in seconds')
+    args = parser.parse_args()
+
+    stub = start_stub(args.port, int(args.bandwidth * 1024 * 1024), args.latency)
+    print(f"🧪 Stub Sightengine API listening on {stub.url}")
+    print("Press Ctrl+C to stop")
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        stub.shutdown()
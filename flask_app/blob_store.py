@@ -0,0 +1,109 @@
+"""
+Content-addressed blob storage
+Files are named by the SHA-256 of their bytes and sharded into nested
+directories (ab/cd/abcd...ext), so identical uploads are stored once and no
+single directory grows without bound
+"""
+import os
+import hashlib
+import tempfile
+
+CHUNK_SIZE = 64 * 1024
+
+def shard_path(root, digest, ext):
+    """Path of a blob under root: <root>/<d[0:2]>/<d[2:4]>/<digest>.<ext>"""
+    return os.path.join(root, digest[:2], digest[2:4], f"{digest}.{ext}")
+
+def find_blob(root, digest):
+    """
+    Path of an already stored blob with this digest, whatever extension it
+    was first stored under, or None
+    """
+    directory = os.path.dirname(shard_path(root, digest, ''))
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return None
+    for name in names:
+        if name.split('.', 1)[0] == digest:
+            return os.path.join(directory, name)
+    return None
+
+def write_atomic(path, data):
+    """Write bytes to path via a temp file and rename, so readers never see a partial file"""
+    directory = os.path.dirname(path)
+    os.makedirs(directory, exist_ok=True)
+    fd, temp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def write_blob(root, data, ext):
+    """
+    Store bytes under their content hash
+
+    Returns:
+        Tuple of (digest, path, created) where created is False when an
+        identical blob was already stored
+    """
+    digest = hashlib.sha256(data).hexdigest()
+    existing = find_blob(root, digest)
+    if existing:
+        return digest, existing, False
+    path = shard_path(root, digest, ext)
+    write_atomic(path, data)
+    return digest, path, True
+
+def store_stream(root, stream, ext):
+    """
+    Copy a stream into the store in fixed-size chunks, hashing on the way
+
+    The data lands in a temp file inside root and is renamed to its content
+    path once the digest is known; if that blob already exists (under any
+    extension) the copy is simply dropped and the stored path returned.
+
+    Returns:
+        Tuple of (digest, path, size, created)
+    """
+    os.makedirs(root, exist_ok=True)
+    digest = hashlib.sha256()
+    size = 0
+    fd, temp_path = tempfile.mkstemp(dir=root, prefix='.incoming-')
+    try:
+        with os.fdopen(fd, 'wb') as out:
+            while True:
+                chunk = stream.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                out.write(chunk)
+                size += len(chunk)
+
+        digest = digest.hexdigest()
+        existing = find_blob(root, digest)
+        if existing:
+            os.remove(temp_path)
+            return digest, existing, size, False
+
+        path = shard_path(root, digest, ext)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        os.replace(temp_path, path)
+        return digest, path, size, True
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+def iter_blobs(root):
+    """Yield (digest, path) for every blob file under root"""
+    for directory, _, filenames in os.walk(root):
+        for filename in filenames:
+            if filename.startswith('.'):
+                continue
+            digest = filename.split('.', 1)[0]
+            yield digest, os.path.join(directory, filename)
@@ -0,0 +1,82 @@
+"""
+Read-through cache of the public content lists as serialized JSON
+Entries are tagged with the table's content_versions counter. Writers call
+invalidate_list(), which drops the local copy and bumps the shared version.
+With CONTENT_CACHE_COHERENCE=db every read compares against that version,
+so all worker processes see a write immediately. With 'local' a hit costs
+no query at all, and other processes catch up within CONTENT_CACHE_TTL.
+"""
+import os
+import time
+import threading
+from content_versions import get_version, bump_version
+
+CONTENT_CACHE_TTL = int(os.getenv('CONTENT_CACHE_TTL', 300))
+CONTENT_CACHE_COHERENCE = os.getenv('CONTENT_CACHE_COHERENCE', 'db').lower()
+
+# table -> (version, updated_at, body, expires_at)
+_entries = {}
+_load_locks = {}
+_locks_lock = threading.Lock()
+
+_stats = {'hits': 0, 'misses': 0, 'stale': 0, 'invalidations': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _load_lock(table):
+    with _locks_lock:
+        return _load_locks.setdefault(table, threading.Lock())
+
+def _fresh(entry, expected_version, now):
+    if entry is None or entry[3] < now:
+        return False
+    return expected_version is None or entry[0] == expected_version
+
+def get_list(table, load):
+    """
+    Return (version, updated_at, body) for a content list
+
+    load() runs the list query and returns the serialized body, or None if
+    the query failed; failures are returned but never cached. Concurrent
+    misses for one table share a single load.
+    """
+    current = get_version(table) if CONTENT_CACHE_COHERENCE == 'db' else None
+    expected = current[0] if current else None
+
+    entry = _entries.get(table)
+    if _fresh(entry, expected, time.time()):
+        _count('hits')
+        return entry[:3]
+
+    with _load_lock(table):
+        entry = _entries.get(table)
+        if _fresh(entry, expected, time.time()):
+            _count('hits')
+            return entry[:3]
+
+        _count('stale' if entry is not None else 'misses')
+        # Read the version before the rows, so a concurrent write can only
+        # leave the entry tagged older than its contents, never newer
+        version, updated_at = current or get_version(table)
+        body = load()
+        if body is None:
+            return version, updated_at, None
+        _entries[table] = (version, updated_at, body, time.time() + CONTENT_CACHE_TTL)
+        return version, updated_at, body
+
+def invalidate_list(table):
+    """Call after any write to a content table"""
+    _entries.pop(table, None)
+    bump_version(table)
+    _count('invalidations')
+
+def get_content_cache_stats():
+    """Return content list cache counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    stats['entries'] = len(_entries)
+    stats['coherence'] = CONTENT_CACHE_COHERENCE
+    return stats
@@ -0,0 +1,43 @@
+"""
+Per-table change counters for the public content lists
+Every write to user_manual, scam_tips or malaysia_cases bumps its table's
+version, so readers can tell whether a list changed with one primary-key lookup
+"""
+import time
+from database import execute_query, transaction, Error
+
+def get_version(table):
+    """
+    Return (version, updated_at) for a table
+
+    Tables that were never bumped report version 0 and updated_at None.
+    """
+    row = execute_query(
+        "SELECT version, updated_at FROM content_versions WHERE table_name = %s",
+        (table,),
+        fetch_one=True
+    )
+    if not row:
+        return 0, None
+    return row['version'], row['updated_at']
+
+def bump_version(table):
+    """Record that a table's rows changed"""
+    now = time.time()
+    try:
+        with transaction() as cursor:
+            cursor.execute(
+                "UPDATE content_versions SET version = version + 1, updated_at = %s WHERE table_name = %s",
+                (now, table)
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    "INSERT INTO content_versions (table_name, version, updated_at) VALUES (%s, 1, %s)",
+                    (table, now)
+                )
+    except Error:
+        # Lost an insert race with a concurrent first write to the same table
+        execute_query(
+            "UPDATE content_versions SET version = version + 1, updated_at = %s WHERE table_name = %s",
+            (now, table)
+        )
@@ -1,159 +1,487 @@
 """
-Database connection and initialization for MySQL
+Database connection and initialization
+Runs on MySQL (default) or SQLite, selected with DB_BACKEND
 """
 import os
-import mysql.connector
-from mysql.connector import Error
+import time
+import threading
+from collections import deque
+from contextlib import contextmanager
 from dotenv import load_dotenv
+from db_backends import create_backend
 
 load_dotenv()
 
 # Database configuration
+DB_BACKEND = os.getenv('DB_BACKEND', 'mysql').lower()
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'localhost'),
     'user': os.getenv('DB_USER', 'root'),
     'password': os.getenv('DB_PASSWORD', ''),
     'database': os.getenv('DB_NAME', 'ai_image_detection')
 }
+SQLITE_PATH = os.getenv(
+    'SQLITE_PATH',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ai_image_detection.db')
+)
+
+# Connection pool configuration
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 10))
+DB_POOL_TIMEOUT = float(os.getenv('DB_POOL_TIMEOUT', 10))
+DB_POOL_MAX_LIFETIME = int(os.getenv('DB_POOL_MAX_LIFETIME', 1800))
+
+backend = create_backend(DB_BACKEND, DB_CONFIG, SQLITE_PATH)
+Error = backend.Error
+
+# Table definitions shared by every backend; {pk} and {on_update} are
+# replaced with the backend's column syntax
+TABLES = [
+    ('users', """
+        CREATE TABLE IF NOT EXISTS users (
+            id {pk},
+            username VARCHAR(255) UNIQUE NOT NULL,
+            password_hash VARCHAR(255) NOT NULL,
+            role VARCHAR(50) NOT NULL DEFAULT 'user',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{on_update}
+        )
+    """),
+    ('user_manual', """
+        CREATE TABLE IF NOT EXISTS user_manual (
+            id {pk},
+            title VARCHAR(255) NOT NULL,
+            file_path VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{on_update}
+        )
+    """),
+    ('scam_tips', """
+        CREATE TABLE IF NOT EXISTS scam_tips (
+            id {pk},
+            title VARCHAR(255) NOT NULL,
+            image_path VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{on_update}
+        )
+    """),
+    # Scam-cases
+    ('malaysia_cases', """
+        CREATE TABLE IF NOT EXISTS malaysia_cases (
+            id {pk},
+            headline VARCHAR(255) NOT NULL,
+            image_path VARCHAR(500),
+            news_link VARCHAR(500),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP{on_update}
+        )
+    """),
+    # AI detection results
+    ('ai_detections', """
+        CREATE TABLE IF NOT EXISTS ai_detections (
+            id {pk},
+            filename VARCHAR(255) NOT NULL,
+            image_path VARCHAR(500) NOT NULL,
+            is_ai_generated BOOLEAN NOT NULL,
+            confidence_percent DECIMAL(5, 2) NOT NULL,
+            probability_score DECIMAL(10, 4) NOT NULL,
+            likely_generator VARCHAR(255),
+            explanation_id SMALLINT,
+            explanation TEXT,
+            user_id INT,
+            detection_tier VARCHAR(20),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
+        )
+    """),
+    # Verdicts keyed by SHA-256 of the image bytes
+    ('detection_cache', """
+        CREATE TABLE IF NOT EXISTS detection_cache (
+            content_hash CHAR(64) PRIMARY KEY,
+            phash CHAR(16),
+            score DECIMAL(10, 4) NOT NULL,
+            is_ai_generated BOOLEAN NOT NULL,
+            likely_generator VARCHAR(255),
+            explanation TEXT,
+            cached_at DOUBLE NOT NULL,
+            last_hit_at DOUBLE NOT NULL,
+            hit_count INT NOT NULL DEFAULT 0
+        )
+    """),
+    # Content-addressed uploads (see upload_store.py); ref_count is the
+    # number of rows whose path points at the blob
+    ('blobs', """
+        CREATE TABLE IF NOT EXISTS blobs (
+            digest CHAR(64) PRIMARY KEY,
+            path VARCHAR(500) NOT NULL,
+            size BIGINT NOT NULL,
+            ref_count INT NOT NULL DEFAULT 0,
+            created_at DOUBLE NOT NULL,
+            last_ref_at DOUBLE NOT NULL
+        )
+    """),
+    # Change counters for the public content lists (see content_versions.py)
+    ('content_versions', """
+        CREATE TABLE IF NOT EXISTS content_versions (
+            table_name VARCHAR(64) PRIMARY KEY,
+            version INT NOT NULL DEFAULT 0,
+            updated_at DOUBLE NOT NULL
+        )
+    """),
+    # Cross-process single-flight locks (see single_flight.py)
+    ('flight_locks', """
+        CREATE TABLE IF NOT EXISTS flight_locks (
+            lock_key VARCHAR(64) PRIMARY KEY,
+            owner VARCHAR(64) NOT NULL,
+            expires_at DOUBLE NOT NULL
+        )
+    """)
+]
+
+# Secondary indexes as (table, index name, columns); missing ones are
+# created on existing deployments by migrate_db()
+INDEXES = [
+    ('detection_cache', 'idx_detection_cache_last_hit', 'last_hit_at'),
+    # TTL eviction and the near-duplicate index refresh (WHERE cached_at ...)
+    ('detection_cache', 'idx_detection_cache_cached', 'cached_at'),
+    # Per-user history in keyset order (WHERE user_id = ? ORDER BY created_at DESC, id DESC)
+    ('ai_detections', 'idx_ai_detections_user_created', 'user_id, created_at, id'),
+    # Public content lists (ORDER BY created_at DESC)
+    ('user_manual', 'idx_user_manual_created', 'created_at'),
+    ('scam_tips', 'idx_scam_tips_created', 'created_at'),
+    ('malaysia_cases', 'idx_malaysia_cases_created', 'created_at')
+]
+
+# Columns added after a table first shipped, as (table, column, definition);
+# CREATE TABLE IF NOT EXISTS leaves older tables alone, so migrate_db() adds them
+COLUMNS = [
+    ('detection_cache', 'phash', 'CHAR(16)'),
+    # Engine that decided each detection (see detectors.py); NULL on older rows
+    ('ai_detections', 'detection_tier', 'VARCHAR(20)'),
+    # Explanation template id (see verdicts.py); explanation then holds only per-row detail
+    ('ai_detections', 'explanation_id', 'SMALLINT')
+]
+
+# Tables with an updated_at column
+UPDATED_AT_TABLES = ['users', 'user_manual', 'scam_tips', 'malaysia_cases']
+
+class PoolTimeoutError(Error):
+    """No pooled connection became available within DB_POOL_TIMEOUT"""
+
+class ConnectionPool:
+    """
+    Process-wide pool of database connections
+    
+    Connections are opened lazily up to `size`, health-checked on checkout,
+    and replaced once they are older than `max_lifetime` seconds.
+    """
+    
+    def __init__(self, connect, is_healthy, size, timeout, max_lifetime):
+        self._connect = connect
+        self._check = is_healthy
+        self.size = size
+        self.timeout = timeout
+        self.max_lifetime = max_lifetime
+        self._idle = deque()  # (connection, created_at)
+        self._born = {}  # id(connection) -> created_at for checked-out connections
+        self._open = 0
+        self._cond = threading.Condition()
+        self._stats = {
+            'checkouts': 0,
+            'wait_time_total': 0.0,
+            'wait_time_max': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'recycled': 0,
+            'health_check_failures': 0
+        }
+    
+    def acquire(self):
+        """Check out a healthy connection, waiting up to `timeout` seconds"""
+        started = time.monotonic()
+        deadline = started + self.timeout
+        
+        while True:
+            with self._cond:
+                while not self._idle and self._open >= self.size:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        self._stats['timeouts'] += 1  # Condition lock already held
+                        raise PoolTimeoutError(
+                            f'No database connection available after {self.timeout}s'
+                        )
+                    self._cond.wait(remaining)
+                
+                if self._idle:
+                    connection, created_at = self._idle.pop()
+                else:
+                    connection, created_at = None, None
+                    self._open += 1
+            
+            if connection is None:
+                try:
+                    connection = self._connect()
+                except Exception:
+                    self._forget()
+                    raise
+                created_at = time.monotonic()
+                self._count('created')
+            elif time.monotonic() - created_at > self.max_lifetime:
+                self._count('recycled')
+                self._close(connection)
+                continue
+            elif not self._is_healthy(connection):
+                self._count('health_check_failures')
+                self._close(connection)
+                continue
+            
+            waited = time.monotonic() - started
+            with self._cond:
+                self._born[id(connection)] = created_at
+                self._stats['checkouts'] += 1
+                self._stats['wait_time_total'] += waited
+                self._stats['wait_time_max'] = max(self._stats['wait_time_max'], waited)
+            return connection
+    
+    def release(self, connection, discard=False):
+        """Return a connection to the pool (or close it when discard is set)"""
+        with self._cond:
+            created_at = self._born.pop(id(connection), time.monotonic())
+        
+        if discard:
+            self._close(connection)
+            return
+        
+        with self._cond:
+            self._idle.append((connection, created_at))
+            self._cond.notify()
+    
+    def _count(self, key):
+        with self._cond:
+            self._stats[key] += 1
+    
+    def _is_healthy(self, connection):
+        try:
+            return self._check(connection)
+        except Exception:
+            return False
+    
+    def _close(self, connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+        self._forget()
+    
+    def _forget(self):
+        with self._cond:
+            self._open -= 1
+            self._cond.notify()
+    
+    def get_stats(self):
+        """Return pool size, active/idle counts and checkout wait times"""
+        with self._cond:
+            stats = dict(self._stats)
+            idle = len(self._idle)
+            stats['size'] = self.size
+            stats['open'] = self._open
+            stats['idle'] = idle
+            stats['active'] = self._open - idle
+        checkouts = stats['checkouts']
+        stats['wait_time_avg'] = round(stats['wait_time_total'] / checkouts, 6) if checkouts else 0.0
+        stats['wait_time_total'] = round(stats['wait_time_total'], 6)
+        stats['wait_time_max'] = round(stats['wait_time_max'], 6)
+        return stats
+
+class Cursor:
+    """Cursor wrapper that accepts %s placeholders on every backend"""
+    
+    def __init__(self, cursor):
+        self._cursor = cursor
+    
+    def execute(self, query, params=()):
+        self._cursor.execute(backend.prepare(query), params)
+    
+    def executemany(self, query, seq_params):
+        self._cursor.executemany(backend.prepare(query), seq_params)
+    
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+_pool = ConnectionPool(backend.connect, backend.is_healthy,
+                       DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_MAX_LIFETIME)
+
+@contextmanager
+def get_connection():
+    """
+    Borrow a pooled connection for several statements
+    
+    Usage:
+        with get_connection() as connection:
+            cursor = get_cursor(connection)
+            ...
+    """
+    connection = _pool.acquire()
+    discard = False
+    try:
+        yield connection
+    except Error:
+        # The connection may be in an unknown state; let the pool replace it
+        discard = True
+        raise
+    finally:
+        _pool.release(connection, discard=discard)
+
+def get_cursor(connection):
+    """Return a dict-row cursor that accepts %s placeholders"""
+    return Cursor(backend.cursor(connection))
+
+@contextmanager
+def transaction():
+    """
+    Run several statements atomically on one pooled connection
+    
+    Commits when the block exits normally and rolls back on any exception.
+    
+    Usage:
+        with transaction() as cursor:
+            cursor.execute(...)
+            cursor.execute(...)
+    """
+    with get_connection() as connection:
+        backend.begin(connection)
+        cursor = get_cursor(connection)
+        try:
+            yield cursor
+            connection.commit()
+        except BaseException:
+            connection.rollback()
+            raise
+        finally:
+            cursor.close()
+
+def get_pool_stats():
+    """Return connection pool metrics for this process"""
+    stats = _pool.get_stats()
+    stats['backend'] = backend.name
+    return stats
 
 def get_db_connection():
-    """Create and return a database connection"""
+    """Create and return a standalone (unpooled) database connection"""
     try:
-        connection = mysql.connector.connect(**DB_CONFIG)
-        return connection
+        return backend.connect(autocommit=False)
     except Error as e:
-        print(f"Error connecting to MySQL: {e}")
+        print(f"Error connecting to {backend.name}: {e}")
         return None
 
 def init_db():
     """Initialize database tables"""
     try:
-        # First connect without specifying database to create it if needed
-        temp_config = DB_CONFIG.copy()
-        db_name = temp_config.pop('database')
-        
-        connection = mysql.connector.connect(**temp_config)
-        cursor = connection.cursor()
+        db_name = backend.create_database()
+        print(f"✅ Database '{db_name}' ready ({backend.name})")
         
-        # Create database if not exists
-        cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
-        cursor.execute(f"USE {db_name}")
-        
-        print(f"✅ Database '{db_name}' ready")
+        with get_connection() as connection:
+            cursor = get_cursor(connection)
+            
+            for table, ddl in TABLES:
+                cursor.execute(ddl.format(**backend.types))
+                print(f"✅ Created/verified {table} table")
+            
+            for table in UPDATED_AT_TABLES:
+                backend.create_update_trigger(cursor, table)
+            
+            connection.commit()
+            cursor.close()
         
-        # Create users table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS users (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                username VARCHAR(255) UNIQUE NOT NULL,
-                password_hash VARCHAR(255) NOT NULL,
-                role VARCHAR(50) NOT NULL DEFAULT 'user',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created/verified users table")
+        migrate_db()
         
-        # Create user_manual table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS user_manual (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                file_path VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created/verified user_manual table")
+        print("✅ All database tables initialized successfully")
         
-        # Create scam_tips table
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS scam_tips (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                title VARCHAR(255) NOT NULL,
-                image_path VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created/verified scam_tips table")
+    except Error as e:
+        print(f"❌ Error initializing database: {e}")
+        raise
+
+def migrate_db():
+    """
+    Bring an existing database up to the current schema
+    
+    Adds missing columns and indexes; safe to run repeatedly. Runs as part of
+    init_db(), or standalone with `python database.py`.
+    """
+    with get_connection() as connection:
+        cursor = get_cursor(connection)
         
-        # Create malaysia_cases table (scam-cases)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS malaysia_cases (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                headline VARCHAR(255) NOT NULL,
-                image_path VARCHAR(500),
-                news_link VARCHAR(500),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-            )
-        """)
-        print("✅ Created/verified malaysia_cases table")
+        for table, column, definition in COLUMNS:
+            if not backend.column_exists(cursor, table, column):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {column} {definition}")
+                print(f"✅ Added column {table}.{column}")
         
-        # Create ai_detections table (for storing AI detection results)
-        cursor.execute("""
-            CREATE TABLE IF NOT EXISTS ai_detections (
-                id INT AUTO_INCREMENT PRIMARY KEY,
-                filename VARCHAR(255) NOT NULL,
-                image_path VARCHAR(500) NOT NULL,
-                is_ai_generated BOOLEAN NOT NULL,
-                confidence_percent DECIMAL(5, 2) NOT NULL,
-                probability_score DECIMAL(10, 4) NOT NULL,
-                likely_generator VARCHAR(255),
-                explanation TEXT,
-                user_id INT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
-            )
-        """)
-        print("✅ Created/verified ai_detections table")
+        for table, index_name, columns in INDEXES:
+            if not backend.index_exists(cursor, table, index_name):
+                cursor.execute(f"CREATE INDEX {index_name} ON {table} ({columns})")
+                print(f"✅ Created index {index_name} on {table}")
         
         connection.commit()
         cursor.close()
-        connection.close()
-        
-        print("✅ All database tables initialized successfully")
-        
-    except Error as e:
-        print(f"❌ Error initializing database: {e}")
-        raise
 
 def execute_query(query, params=None, fetch_one=False, fetch_all=False):
     """
-    Execute a database query
+    Execute a database query on a pooled connection
     
     Args:
-        query: SQL query string
-        params: Query parameters (tuple or dict)
+        query: SQL query string (%s placeholders on every backend)
+        params: Query parameters (tuple)
         fetch_one: Return single row
         fetch_all: Return all rows
         
     Returns:
         Query results or lastrowid for INSERT
     """
-    connection = get_db_connection()
-    if not connection:
+    try:
+        with get_connection() as connection:
+            cursor = get_cursor(connection)
+            try:
+                cursor.execute(query, params or ())
+                
+                if fetch_one:
+                    result = cursor.fetchone()
+                    # Drain any remaining rows so the connection is reusable
+                    cursor.fetchall()
+                elif fetch_all:
+                    result = cursor.fetchall()
+                else:
+                    connection.commit()
+                    result = cursor.lastrowid
+            finally:
+                cursor.close()
+        return result
+        
+    except Error as e:
+        print(f"Database error: {e}")
         return None
+
+def execute_many(query, seq_params):
+    """
+    Execute one statement for many parameter sets on a single connection
     
-    try:
-        cursor = connection.cursor(dictionary=True)
-        cursor.execute(query, params or ())
+    mysql.connector rewrites an INSERT ... VALUES executemany into a single
+    multi-row INSERT, so a batch costs one round trip and one commit; on
+    SQLite the whole batch runs inside one transaction.
+    
+    Args:
+        query: SQL query string
+        seq_params: Sequence of parameter tuples
         
-        if fetch_one:
-            result = cursor.fetchone()
-        elif fetch_all:
-            result = cursor.fetchall()
-        else:
-            connection.commit()
-            result = cursor.lastrowid
-            
-        cursor.close()
-        connection.close()
-        return result
+    Returns:
+        Number of affected rows, or None on error
+    """
+    try:
+        with transaction() as cursor:
+            cursor.executemany(query, seq_params)
+            return cursor.rowcount
         
     except Error as e:
         print(f"Database error: {e}")
-        if connection:
-            connection.close()
         return None
+
+if __name__ == '__main__':
+    init_db()
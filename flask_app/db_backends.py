@@ -0,0 +1,178 @@
+"""
+Storage backends for the data layer - MySQL for deployments, SQLite for local runs
+database.py picks one via DB_BACKEND and talks to it only through this interface
+"""
+import os
+import re
+import sqlite3
+from functools import lru_cache
+
+class MySQLBackend:
+    """mysql.connector backend (the production default)"""
+
+    name = 'mysql'
+
+    # Column-type tokens used by the shared schema in database.py
+    types = {
+        'pk': 'INT AUTO_INCREMENT PRIMARY KEY',
+        'on_update': ' ON UPDATE CURRENT_TIMESTAMP'
+    }
+
+    def __init__(self, config):
+        import mysql.connector
+        self._mysql = mysql.connector
+        self.Error = mysql.connector.Error
+        self.config = config
+
+    def create_database(self):
+        """Create the configured database if it does not exist yet"""
+        temp_config = self.config.copy()
+        db_name = temp_config.pop('database')
+
+        connection = self._mysql.connect(**temp_config)
+        try:
+            cursor = connection.cursor()
+            cursor.execute(f"CREATE DATABASE IF NOT EXISTS {db_name}")
+            cursor.close()
+        finally:
+            connection.close()
+        return db_name
+
+    def connect(self, autocommit=True):
+        # Autocommit keeps pooled connections from pinning a stale REPEATABLE READ
+        # snapshot between requests; begin() opens explicit transactions
+        return self._mysql.connect(autocommit=autocommit, **self.config)
+
+    def is_healthy(self, connection):
+        return connection.is_connected()
+
+    def cursor(self, connection):
+        return connection.cursor(dictionary=True)
+
+    def begin(self, connection):
+        connection.start_transaction()
+
+    def prepare(self, query):
+        return query
+
+    def index_exists(self, cursor, table, index_name):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.statistics
+               WHERE table_schema = DATABASE() AND table_name = %s AND index_name = %s
+               LIMIT 1""",
+            (table, index_name)
+        )
+        return bool(cursor.fetchall())
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute(
+            """SELECT 1 FROM information_schema.columns
+               WHERE table_schema = DATABASE() AND table_name = %s AND column_name = %s
+               LIMIT 1""",
+            (table, column)
+        )
+        return bool(cursor.fetchall())
+
+    def create_update_trigger(self, cursor, table):
+        """MySQL maintains updated_at through ON UPDATE CURRENT_TIMESTAMP"""
+
+class SQLiteBackend:
+    """
+    Embedded SQLite backend in WAL mode
+
+    Zero external dependencies, so the app can be run and load-tested
+    locally without a MySQL server.
+    """
+
+    name = 'sqlite'
+    Error = sqlite3.Error
+
+    types = {
+        'pk': 'INTEGER PRIMARY KEY AUTOINCREMENT',
+        'on_update': ''
+    }
+
+    def __init__(self, path):
+        self.path = path
+
+    def create_database(self):
+        """The database file is created on first connect"""
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        return self.path
+
+    def connect(self, autocommit=True):
+        # Pooled connections are handed between threads, one at a time
+        connection = sqlite3.connect(
+            self.path,
+            timeout=30,
+            check_same_thread=False,
+            isolation_level=None if autocommit else 'DEFERRED'
+        )
+        connection.row_factory = _dict_row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA foreign_keys=ON")
+        return connection
+
+    def is_healthy(self, connection):
+        try:
+            connection.execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def cursor(self, connection):
+        return connection.cursor()
+
+    def begin(self, connection):
+        connection.execute("BEGIN")
+
+    def prepare(self, query):
+        return _to_qmark(query)
+
+    def index_exists(self, cursor, table, index_name):
+        cursor.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'index' AND tbl_name = ? AND name = ?",
+            (table, index_name)
+        )
+        return bool(cursor.fetchall())
+
+    def column_exists(self, cursor, table, column):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return any(row['name'] == column for row in cursor.fetchall())
+
+    def create_update_trigger(self, cursor, table):
+        """Emulate MySQL's ON UPDATE CURRENT_TIMESTAMP for updated_at"""
+        cursor.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_{table}_updated_at
+            AFTER UPDATE ON {table}
+            FOR EACH ROW WHEN NEW.updated_at = OLD.updated_at
+            BEGIN
+                UPDATE {table} SET updated_at = CURRENT_TIMESTAMP WHERE id = OLD.id;
+            END
+        """)
+
+def _dict_row(cursor, row):
+    return {column[0]: value for column, value in zip(cursor.description, row)}
+
+# Quoted SQL strings/identifiers (doubled quotes escape), or a placeholder
+_QMARK_TOKENS = re.compile(r"""'(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|%s""")
+
+@lru_cache(maxsize=512)
+def _to_qmark(query):
+    """
+    Translate mysql.connector %s placeholders to sqlite3 ? placeholders
+
+    A '%s' inside a quoted literal (e.g. LIKE '%sale%') is text, not a
+    placeholder, and is left alone.
+    """
+    return _QMARK_TOKENS.sub(lambda m: '?' if m.group() == '%s' else m.group(), query)
+
+def create_backend(name, mysql_config, sqlite_path):
+    """Instantiate the backend selected by DB_BACKEND"""
+    if name == 'mysql':
+        return MySQLBackend(mysql_config)
+    if name == 'sqlite':
+        return SQLiteBackend(sqlite_path)
+    raise ValueError(f"Unknown DB_BACKEND '{name}' (expected 'mysql' or 'sqlite')")
@@ -0,0 +1,178 @@
+"""
+WebP thumbnails of stored images at a few fixed sizes
+Derivatives are keyed by the source's content hash and cached under
+uploads/derivatives/<size>/ab/cd/<sha256>.webp; generation runs on a small
+worker pool so a request never waits for an image to be resized
+"""
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from PIL import Image, ImageOps
+from blob_store import shard_path, write_atomic
+from multipart_stream import hash_file
+
+# Longest edge in pixels for each ?size= value
+DERIVATIVE_SIZES = {
+    'small': 160,
+    'medium': 480,
+    'large': 1024
+}
+DERIVATIVE_DIR = 'derivatives'
+DERIVATIVE_QUALITY = int(os.getenv('DERIVATIVE_QUALITY', 80))
+DERIVATIVE_WORKERS = int(os.getenv('DERIVATIVE_WORKERS', 2))
+# Legacy (non-blob) uploads whose content hash is remembered
+DIGEST_CACHE_SIZE = int(os.getenv('DERIVATIVE_DIGEST_CACHE_SIZE', 4096))
+
+IMAGE_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp', 'avif'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+# Source path -> future of the generation job currently running for it
+_pending = {}
+_pending_lock = threading.Lock()
+
+_stats = {'generated': 0, 'failed': 0, 'served': 0, 'deferred': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=DERIVATIVE_WORKERS,
+                    thread_name_prefix='derivatives'
+                )
+    return _executor
+
+def is_image(filename):
+    return '.' in filename and filename.rsplit('.', 1)[1].lower() in IMAGE_EXTENSIONS
+
+def source_digest(source_path):
+    """
+    Content hash of a source image
+
+    Blob store files carry it in their name; legacy uploads are hashed once
+    per (mtime, size), remembering the DIGEST_CACHE_SIZE most recent.
+    """
+    name = os.path.basename(source_path).split('.', 1)[0]
+    if len(name) == 64 and all(c in '0123456789abcdef' for c in name):
+        return name
+
+    stat = os.stat(source_path)
+    return _file_digest(source_path, stat.st_mtime, stat.st_size)
+
+@lru_cache(maxsize=DIGEST_CACHE_SIZE)
+def _file_digest(source_path, mtime, size):
+    # mtime and size are only part of the key, so an edited file is hashed again
+    return hash_file(source_path)
+
+def derivative_path(upload_folder, digest, size):
+    return shard_path(os.path.join(upload_folder, DERIVATIVE_DIR, size), digest, 'webp')
+
+def render_derivatives(source_path, upload_folder, sizes=None):
+    """
+    Decode a source image once and write every missing derivative size
+
+    Returns:
+        List of sizes written
+    """
+    digest = source_digest(source_path)
+    sizes = [size for size in (sizes or DERIVATIVE_SIZES)
+             if not os.path.exists(derivative_path(upload_folder, digest, size))]
+    if not sizes:
+        return []
+
+    with Image.open(source_path) as image:
+        largest = max(DERIVATIVE_SIZES[size] for size in sizes)
+        if image.format == 'JPEG':
+            image.draft('RGB', (largest, largest))
+        image = ImageOps.exif_transpose(image)  # First frame only for animations
+        if image.mode not in ('RGB', 'RGBA'):
+            image = image.convert('RGBA' if 'A' in image.getbands() or 'transparency' in image.info else 'RGB')
+
+        # Largest first, so each smaller size is resized from the previous one
+        written = []
+        for size in sorted(sizes, key=DERIVATIVE_SIZES.get, reverse=True):
+            edge = DERIVATIVE_SIZES[size]
+            if max(image.size) > edge:
+                image = image.copy()
+                image.thumbnail((edge, edge), Image.LANCZOS)
+            output = _encode_webp(image)
+            write_atomic(derivative_path(upload_folder, digest, size), output)
+            written.append(size)
+    return written
+
+def _encode_webp(image):
+    output = io.BytesIO()
+    image.save(output, 'WEBP', quality=DERIVATIVE_QUALITY, method=4)
+    return output.getvalue()
+
+def schedule(source_path, upload_folder, sizes=None):
+    """
+    Queue derivative generation for a source image without waiting for it
+
+    Concurrent calls for the same source share one job.
+    """
+    with _pending_lock:
+        future = _pending.get(source_path)
+        if future is not None:
+            return future
+        future = _get_executor().submit(_run, source_path, upload_folder, sizes)
+        _pending[source_path] = future
+    return future
+
+def _run(source_path, upload_folder, sizes):
+    try:
+        for _ in render_derivatives(source_path, upload_folder, sizes):
+            _count('generated')
+    except Exception as e:
+        _count('failed')
+        print(f"❌ Derivative generation failed for {source_path}: {e}")
+    finally:
+        with _pending_lock:
+            _pending.pop(source_path, None)
+
+def get_derivative(source_path, upload_folder, size):
+    """
+    Path of a cached derivative, or None if it is not ready yet
+
+    A miss schedules generation in the background, so the caller can serve
+    the original this time and the derivative on a later request.
+    """
+    digest = source_digest(source_path)
+    path = derivative_path(upload_folder, digest, size)
+    if os.path.exists(path):
+        _count('served')
+        return path
+
+    _count('deferred')
+    schedule(source_path, upload_folder)
+    return None
+
+def remove_derivatives(upload_folder, digest):
+    """Delete every cached derivative of a source; returns bytes freed"""
+    freed = 0
+    for size in DERIVATIVE_SIZES:
+        path = derivative_path(upload_folder, digest, size)
+        try:
+            freed += os.path.getsize(path)
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+    return freed
+
+def get_derivative_stats():
+    """Return derivative pipeline counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _pending_lock:
+        stats['pending'] = len(_pending)
+    return stats
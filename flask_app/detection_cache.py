@@ -0,0 +1,195 @@
+"""
+Content-hash detection cache - reuse Sightengine verdicts for identical uploads
+Entries live in the detection_cache table, keyed by the SHA-256 of the image bytes,
+with a perceptual hash per entry so re-encoded copies can reuse the verdict too
+"""
+import os
+import time
+import threading
+from database import execute_query, execute_many
+from phash_index import NearDuplicateIndex
+
+# Cache configuration
+CACHE_TTL_SECONDS = int(os.getenv('DETECTION_CACHE_TTL', 7 * 24 * 3600))
+CACHE_MAX_ENTRIES = int(os.getenv('DETECTION_CACHE_MAX_ENTRIES', 100000))
+# Eviction needs a COUNT(*), so it runs once every N stores rather than on each one
+EVICT_EVERY = 50
+# Maximum Hamming distance (out of 64 bits) for two images to count as the same picture
+PHASH_MAX_DISTANCE = int(os.getenv('PHASH_MAX_DISTANCE', 4))
+# Seconds between pulls of entries other processes stored into this process's index
+PHASH_INDEX_REFRESH = float(os.getenv('PHASH_INDEX_REFRESH_SECONDS', 5))
+# Each pull re-reads this far back, so rows committed out of cached_at order are not skipped
+INDEX_REFRESH_OVERLAP = 30
+
+_stats_lock = threading.Lock()
+_stats = {'hits': 0, 'near_duplicate_hits': 0, 'misses': 0, 'stores': 0, 'evictions': 0}
+
+_index = None
+_index_lock = threading.Lock()
+_index_synced_to = 0.0  # Newest cached_at pulled into the index
+_index_checked_at = 0.0  # When the table was last polled
+
+def _count(key, amount=1):
+    with _stats_lock:
+        _stats[key] += amount
+
+def _get_index():
+    """
+    The near-duplicate index, built from the cache table on first use
+
+    Every PHASH_INDEX_REFRESH seconds it is topped up with the rows stored
+    since the last pull, which includes those stored by other processes.
+    """
+    global _index, _index_synced_to, _index_checked_at
+    now = time.time()
+    if _index is not None and now - _index_checked_at < PHASH_INDEX_REFRESH:
+        return _index
+    with _index_lock:
+        if _index is not None and now - _index_checked_at < PHASH_INDEX_REFRESH:
+            return _index
+        if _index is None:
+            index = NearDuplicateIndex(PHASH_MAX_DISTANCE)
+            since = now - CACHE_TTL_SECONDS
+        else:
+            index = _index
+            since = _index_synced_to - INDEX_REFRESH_OVERLAP
+        rows = execute_query(
+            """SELECT content_hash, phash, cached_at FROM detection_cache
+               WHERE phash IS NOT NULL AND cached_at >= %s""",
+            (since,),
+            fetch_all=True
+        )
+        for row in rows or []:
+            index.add(row['phash'], row['content_hash'])
+            _index_synced_to = max(_index_synced_to, float(row['cached_at']))
+        _index_checked_at = now
+        _index = index
+    return _index
+
+def _unindex(digests):
+    if _index is not None:
+        for digest in digests:
+            _index.remove(digest)
+
+def _fetch(digest, now):
+    entry = execute_query(
+        """SELECT score, is_ai_generated, likely_generator, explanation
+           FROM detection_cache
+           WHERE content_hash = %s AND cached_at >= %s""",
+        (digest, now - CACHE_TTL_SECONDS),
+        fetch_one=True
+    )
+    if not entry:
+        return None
+
+    # Touch the entry so LRU eviction keeps frequently forwarded images
+    execute_query(
+        "UPDATE detection_cache SET last_hit_at = %s, hit_count = hit_count + 1 WHERE content_hash = %s",
+        (now, digest)
+    )
+
+    return {
+        'score': float(entry['score']),
+        'is_ai_generated': bool(entry['is_ai_generated']),
+        'likely_generator': entry['likely_generator'],
+        'explanation': entry['explanation']
+    }
+
+def lookup_detection(digest, phash=None):
+    """
+    Look up a previous verdict for an image
+
+    Tries the exact content hash first, then the closest perceptual hash
+    within PHASH_MAX_DISTANCE bits.
+
+    Returns:
+        Tuple of (entry, status) where entry is a dict with score,
+        is_ai_generated, likely_generator and explanation (or None) and
+        status is 'hit', 'near_duplicate' or 'miss'
+    """
+    now = time.time()
+    entry = _fetch(digest, now)
+    if entry:
+        _count('hits')
+        return entry, 'hit'
+
+    if phash:
+        index = _get_index()
+        # A few tries, so a row expired or evicted elsewhere does not hide the next-closest match
+        for _ in range(3):
+            match = index.find(phash)
+            if not match:
+                break
+            entry = _fetch(match[0], now)
+            if entry:
+                _count('near_duplicate_hits')
+                return entry, 'near_duplicate'
+            index.remove(match[0])
+
+    _count('misses')
+    return None, 'miss'
+
+def peek_detection(digest):
+    """Exact-hash lookup that leaves the hit/miss counters alone (used while polling)"""
+    return _fetch(digest, time.time())
+
+def store_detection(digest, score, is_ai_generated, likely_generator, explanation, phash=None):
+    """Insert or refresh the cached verdict for a content hash"""
+    now = time.time()
+    execute_query(
+        """REPLACE INTO detection_cache
+           (content_hash, phash, score, is_ai_generated, likely_generator,
+            explanation, cached_at, last_hit_at, hit_count)
+           VALUES (%s, %s, %s, %s, %s, %s, %s, %s, 0)""",
+        (digest, phash, score, is_ai_generated, likely_generator, explanation, now, now)
+    )
+    if phash:
+        _get_index().add(phash, digest)
+    with _stats_lock:
+        _stats['stores'] += 1
+        due = _stats['stores'] % EVICT_EVERY == 1
+    if due:
+        _evict()
+
+def _evict():
+    """Drop expired entries, then the least recently used ones above the size cap"""
+    cutoff = time.time() - CACHE_TTL_SECONDS
+    expired = execute_query(
+        "SELECT content_hash FROM detection_cache WHERE cached_at < %s",
+        (cutoff,),
+        fetch_all=True
+    ) or []
+    if expired:
+        execute_query("DELETE FROM detection_cache WHERE cached_at < %s", (cutoff,))
+        _unindex(row['content_hash'] for row in expired)
+
+    row = execute_query("SELECT COUNT(*) AS total FROM detection_cache", fetch_one=True)
+    overflow = (row['total'] if row else 0) - CACHE_MAX_ENTRIES
+    if overflow <= 0:
+        return
+
+    # Delete by key so the same keys can leave the in-memory index
+    lru = execute_query(
+        "SELECT content_hash FROM detection_cache ORDER BY last_hit_at ASC LIMIT %s",
+        (overflow,),
+        fetch_all=True
+    ) or []
+    digests = [row['content_hash'] for row in lru]
+    if digests and execute_many(
+        "DELETE FROM detection_cache WHERE content_hash = %s",
+        [(digest,) for digest in digests]
+    ) is not None:
+        _unindex(digests)
+        _count('evictions', len(digests))
+
+def get_cache_stats():
+    """Return hit/miss counters and the hit ratio for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    served = stats['hits'] + stats['near_duplicate_hits']
+    lookups = served + stats['misses']
+    stats['hit_ratio'] = round(served / lookups, 4) if lookups else 0.0
+    stats['indexed_phashes'] = len(_index) if _index is not None else 0
+    stats['ttl_seconds'] = CACHE_TTL_SECONDS
+    stats['max_entries'] = CACHE_MAX_ENTRIES
+    return stats
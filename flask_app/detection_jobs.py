@@ -0,0 +1,295 @@
+"""
+Asynchronous detection jobs - SQLite-backed queue with a background worker pool
+Jobs are persisted to DETECTION_JOBS_DB so queued and interrupted work survives a restart
+"""
+import os
+import json
+import time
+import uuid
+import sqlite3
+import threading
+
+# Job queue configuration
+JOBS_DB_PATH = os.getenv(
+    'DETECTION_JOBS_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'detection_jobs.db')
+)
+JOB_WORKERS = int(os.getenv('DETECTION_JOB_WORKERS', 2))
+JOB_MAX_QUEUE = int(os.getenv('DETECTION_JOB_MAX_QUEUE', 500))
+# Read timeout for each upstream call a job makes; it does not bound the job
+# as a whole (retries and rate-limit waits come on top). DETECTION_JOB_TIMEOUT
+# is the old name, still read
+JOB_READ_TIMEOUT = int(os.getenv('DETECTION_JOB_READ_TIMEOUT', os.getenv('DETECTION_JOB_TIMEOUT', 30)))
+JOB_MAX_ATTEMPTS = 3
+# A running job whose worker has been silent this long is assumed lost and
+# requeued, or failed once it has used all its attempts
+JOB_LEASE_SECONDS = JOB_READ_TIMEOUT * 2 + 30
+POLL_INTERVAL = 1.0
+
+class QueueFullError(Exception):
+    """Raised when the queue already holds DETECTION_JOB_MAX_QUEUE pending jobs"""
+
+_wakeup = threading.Event()
+_workers = []
+_workers_lock = threading.Lock()
+
+def _connect():
+    connection = sqlite3.connect(JOBS_DB_PATH, timeout=30, isolation_level=None)
+    connection.row_factory = sqlite3.Row
+    connection.execute("PRAGMA journal_mode=WAL")
+    connection.execute("PRAGMA synchronous=NORMAL")
+    return connection
+
+def init_jobs_db():
+    """Create the jobs table if needed"""
+    connection = _connect()
+    try:
+        connection.execute("""
+            CREATE TABLE IF NOT EXISTS detection_jobs (
+                id TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                filename TEXT NOT NULL,
+                image_path TEXT NOT NULL,
+                file_path TEXT NOT NULL,
+                user_id INTEGER,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                result TEXT,
+                error TEXT,
+                created_at REAL NOT NULL,
+                started_at REAL,
+                finished_at REAL,
+                run_after REAL
+            )
+        """)
+        # Queues created before jobs could be deferred
+        columns = {row['name'] for row in connection.execute("PRAGMA table_info(detection_jobs)")}
+        if 'run_after' not in columns:
+            connection.execute("ALTER TABLE detection_jobs ADD COLUMN run_after REAL")
+        connection.execute(
+            "CREATE INDEX IF NOT EXISTS idx_detection_jobs_status ON detection_jobs (status, created_at)"
+        )
+    finally:
+        connection.close()
+
+def enqueue_job(filename, image_path, file_path, user_id=None):
+    """
+    Queue a saved upload for detection
+
+    Returns:
+        The new job id
+
+    Raises:
+        QueueFullError: Too many jobs are already waiting
+    """
+    job_id = uuid.uuid4().hex
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+        depth = connection.execute(
+            "SELECT COUNT(*) FROM detection_jobs WHERE status = 'queued'"
+        ).fetchone()[0]
+        if depth >= JOB_MAX_QUEUE:
+            connection.execute("ROLLBACK")
+            raise QueueFullError(f'Detection queue is full ({depth} jobs waiting)')
+
+        connection.execute(
+            """INSERT INTO detection_jobs
+               (id, status, filename, image_path, file_path, user_id, created_at)
+               VALUES (?, 'queued', ?, ?, ?, ?, ?)""",
+            (job_id, filename, image_path, file_path, user_id, time.time())
+        )
+        connection.execute("COMMIT")
+    finally:
+        connection.close()
+
+    _wakeup.set()
+    return job_id
+
+def get_job(job_id):
+    """Return a job as a dict, or None if unknown"""
+    connection = _connect()
+    try:
+        row = connection.execute(
+            "SELECT * FROM detection_jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+    finally:
+        connection.close()
+
+    if not row:
+        return None
+
+    job = dict(row)
+    job['result'] = json.loads(job['result']) if job['result'] else None
+    return job
+
+def get_active_image_paths():
+    """Public image paths of jobs that are still queued or running"""
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            "SELECT image_path FROM detection_jobs WHERE status IN ('queued', 'running')"
+        ).fetchall()
+    finally:
+        connection.close()
+    return [row['image_path'] for row in rows]
+
+def _claim_next_job(on_failure=None):
+    """
+    Atomically move the oldest runnable job to 'running'
+
+    Jobs whose lease expired after their last attempt are failed on the way,
+    and passed to on_failure once committed
+    """
+    job, lost = _claim(time.time())
+    if on_failure is not None:
+        for lost_job in lost:
+            on_failure(lost_job)
+    return job
+
+def _claim(now):
+    connection = _connect()
+    try:
+        connection.execute("BEGIN IMMEDIATE")
+
+        # Recover jobs left running by a crashed or restarted worker; one that
+        # has used its attempts fails, so a job that kills its worker cannot loop
+        lost = [dict(row) for row in connection.execute(
+            """SELECT * FROM detection_jobs
+               WHERE status = 'running' AND started_at < ? AND attempts >= ?""",
+            (now - JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+        )]
+        connection.execute(
+            """UPDATE detection_jobs SET status = 'failed', error = ?, finished_at = ?
+               WHERE status = 'running' AND started_at < ? AND attempts >= ?""",
+            ('Job did not finish (worker lost) after the maximum number of attempts',
+             now, now - JOB_LEASE_SECONDS, JOB_MAX_ATTEMPTS)
+        )
+        connection.execute(
+            """UPDATE detection_jobs SET status = 'queued', started_at = NULL
+               WHERE status = 'running' AND started_at < ?""",
+            (now - JOB_LEASE_SECONDS,)
+        )
+
+        row = connection.execute(
+            """SELECT * FROM detection_jobs
+               WHERE status = 'queued' AND (run_after IS NULL OR run_after <= ?)
+               ORDER BY created_at LIMIT 1""",
+            (now,)
+        ).fetchone()
+        if not row:
+            connection.execute("COMMIT")
+            return None, lost
+
+        connection.execute(
+            """UPDATE detection_jobs
+               SET status = 'running', started_at = ?, attempts = attempts + 1
+               WHERE id = ?""",
+            (now, row['id'])
+        )
+        connection.execute("COMMIT")
+        job = dict(row)
+        job['attempts'] += 1
+        return job, lost
+    finally:
+        connection.close()
+
+def _finish_job(job_id, status, result=None, error=None):
+    connection = _connect()
+    try:
+        connection.execute(
+            """UPDATE detection_jobs
+               SET status = ?, result = ?, error = ?, finished_at = ?
+               WHERE id = ?""",
+            (status, json.dumps(result) if result is not None else None, error, time.time(), job_id)
+        )
+    finally:
+        connection.close()
+
+def _defer_job(job_id, delay, error):
+    """Put a job back in the queue for later without spending one of its attempts"""
+    connection = _connect()
+    try:
+        connection.execute(
+            """UPDATE detection_jobs
+               SET status = 'queued', started_at = NULL, attempts = attempts - 1,
+                   run_after = ?, error = ?
+               WHERE id = ?""",
+            (time.time() + max(delay, POLL_INTERVAL), error, job_id)
+        )
+    finally:
+        connection.close()
+
+def _worker_loop(runner, on_failure):
+    while True:
+        try:
+            job = _claim_next_job(on_failure)
+        except sqlite3.Error as e:
+            print(f"Job queue error: {e}")
+            job = None
+
+        if not job:
+            _wakeup.wait(POLL_INTERVAL)
+            _wakeup.clear()
+            continue
+
+        _run_job(job, runner, on_failure)
+
+def _run_job(job, runner, on_failure=None):
+    """Run one claimed job and record its outcome: done, deferred, requeued or failed"""
+    try:
+        result = runner(job, JOB_READ_TIMEOUT)
+        _finish_job(job['id'], 'done', result=result)
+    except Exception as e:
+        defer = getattr(e, 'defer', None)
+        if defer is not None:
+            _defer_job(job['id'], defer, str(e))
+        elif job['attempts'] < JOB_MAX_ATTEMPTS and getattr(e, 'retryable', False):
+            _finish_job(job['id'], 'queued', error=str(e))
+        else:
+            _finish_job(job['id'], 'failed', error=str(e))
+            if on_failure is not None:
+                on_failure(job)
+
+def start_workers(runner, on_failure=None):
+    """
+    Start the background worker threads (idempotent)
+
+    Args:
+        runner: Callable (job, read_timeout) -> result dict, raising on failure.
+                Exceptions with a truthy ``retryable`` attribute are retried
+                up to JOB_MAX_ATTEMPTS times; a ``defer`` attribute (seconds)
+                requeues the job for that much later without counting the attempt.
+        on_failure: Optional callable (job) run once a job has failed for good,
+                    e.g. to drop the upload it will never reference.
+    """
+    with _workers_lock:
+        if _workers:
+            return
+        init_jobs_db()
+        for i in range(JOB_WORKERS):
+            worker = threading.Thread(
+                target=_worker_loop,
+                args=(runner, on_failure),
+                name=f'detection-job-{i}',
+                daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+
+def get_queue_stats():
+    """Return job counts by status and the worker configuration"""
+    connection = _connect()
+    try:
+        rows = connection.execute(
+            "SELECT status, COUNT(*) AS total FROM detection_jobs GROUP BY status"
+        ).fetchall()
+    except sqlite3.Error:
+        rows = []
+    finally:
+        connection.close()
+
+    stats = {row['status']: row['total'] for row in rows}
+    stats['workers'] = len(_workers)
+    stats['max_queue'] = JOB_MAX_QUEUE
+    stats['read_timeout'] = JOB_READ_TIMEOUT
+    return stats
@@ -0,0 +1,157 @@
+"""
+Pluggable detection engines
+Every engine exposes the same interface, so the Flask routes and the
+Streamlit app can swap them without caring which one runs:
+
+    name                                    identifier recorded with results
+    remote                                  True if calls leave the machine
+    check_file(path, payload=None, read_timeout=None) -> ai_generated 0.0-1.0
+    check_bytes(data, filename, read_timeout=None)    -> ai_generated 0.0-1.0
+    get_stats()                             counters for /metrics
+
+Engines:
+    sightengine   Sightengine genai model (sightengine_client.py)
+    local         Offline forensic features (forensic_detector.py)
+    cascade       local first; only scores inside the uncertainty band go
+                  on to sightengine
+
+decide_file() / decide_bytes() also report the tier (engine name) that made
+the decision, which is stored with each detection.
+"""
+import os
+import threading
+from sightengine_client import SightengineClient, DetectionAPIError
+from forensic_detector import LocalForensicDetector
+
+# Engine used for detections
+DETECTION_ENGINE = os.getenv('DETECTION_ENGINE', 'sightengine').lower()
+
+# Cascade band: local scores below CASCADE_REAL_BELOW or at/above
+# CASCADE_AI_ABOVE are final, anything in between is escalated upstream
+CASCADE_REAL_BELOW = float(os.getenv('CASCADE_REAL_BELOW', 0.15))
+CASCADE_AI_ABOVE = float(os.getenv('CASCADE_AI_ABOVE', 0.90))
+
+class CascadeDetector:
+    """
+    Tiered engine: a cheap local screen decides clear-cut images and the
+    upstream engine only sees the uncertain ones
+
+    Images the screen cannot decode are escalated rather than rejected.
+    """
+
+    name = 'cascade'
+    remote = True
+
+    def __init__(self, screen, upstream, real_below=CASCADE_REAL_BELOW, ai_above=CASCADE_AI_ABOVE):
+        if not 0.0 <= real_below <= 0.5 <= ai_above <= 1.0:
+            raise ValueError('Cascade band must satisfy 0 <= CASCADE_REAL_BELOW <= 0.5 <= CASCADE_AI_ABOVE <= 1')
+        self.screen = screen
+        self.upstream = upstream
+        self.real_below = real_below
+        self.ai_above = ai_above
+        self._stats_lock = threading.Lock()
+        self._stats = {'screened': 0, 'decided_real': 0, 'decided_ai': 0, 'escalated': 0, 'screen_failed': 0}
+
+    @classmethod
+    def from_env(cls):
+        return cls(get_detector('local'), get_detector('sightengine'))
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def screen_score(self, check):
+        """
+        Run the local tier; check is a zero-argument call into the screen
+
+        Returns:
+            The local score when it is decisive, otherwise None
+        """
+        self._count('screened')
+        try:
+            score = check()
+        except DetectionAPIError:
+            self._count('screen_failed')
+            return None
+        if score < self.real_below:
+            self._count('decided_real')
+            return score
+        if score >= self.ai_above:
+            self._count('decided_ai')
+            return score
+        self._count('escalated')
+        return None
+
+    def check_file(self, path, payload=None, read_timeout=None):
+        return decide_file(self, path, read_timeout=read_timeout)[0]
+
+    def check_bytes(self, data, filename='image', read_timeout=None):
+        return decide_bytes(self, data, filename, read_timeout=read_timeout)[0]
+
+    def get_stats(self):
+        """Tier counters; escalation_rate is the share of screened images sent upstream"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        sent = stats['escalated'] + stats['screen_failed']
+        stats['escalation_rate'] = round(sent / stats['screened'], 4) if stats['screened'] else 0.0
+        stats['band'] = [self.real_below, self.ai_above]
+        return stats
+
+ENGINES = {
+    'sightengine': SightengineClient.from_env,
+    'local': LocalForensicDetector,
+    'cascade': CascadeDetector.from_env,
+}
+
+_instances = {}
+_instances_lock = threading.RLock()  # The cascade builds its tiers through get_detector()
+
+def get_detector(name=None):
+    """
+    Shared engine instance for this process (default DETECTION_ENGINE)
+
+    Raises:
+        ValueError: Unknown engine name
+    """
+    name = (name or DETECTION_ENGINE).lower()
+    if name not in ENGINES:
+        raise ValueError(f"Unknown detection engine '{name}' (expected one of: {', '.join(ENGINES)})")
+    with _instances_lock:
+        if name not in _instances:
+            _instances[name] = ENGINES[name]()
+        return _instances[name]
+
+def get_detector_stats():
+    """Stats of every engine this process has used, keyed by engine name"""
+    with _instances_lock:
+        instances = dict(_instances)
+    return {name: engine.get_stats() for name, engine in instances.items()}
+
+def decide_file(engine, path, prepare=None, read_timeout=None):
+    """
+    Score an image on disk with any engine
+
+    Args:
+        prepare: Optional callable returning a smaller upload payload (or
+            None); only called when the image actually goes to a remote engine
+
+    Returns:
+        Tuple of (score, tier) where tier is the name of the deciding engine
+    """
+    if isinstance(engine, CascadeDetector):
+        score = engine.screen_score(lambda: engine.screen.check_file(path))
+        if score is not None:
+            return score, engine.screen.name
+        engine = engine.upstream
+    payload = prepare() if prepare is not None and engine.remote else None
+    return engine.check_file(path, payload=payload, read_timeout=read_timeout), engine.name
+
+def decide_bytes(engine, data, filename='image', prepare=None, read_timeout=None):
+    """In-memory counterpart of decide_file()"""
+    if isinstance(engine, CascadeDetector):
+        score = engine.screen_score(lambda: engine.screen.check_bytes(data, filename))
+        if score is not None:
+            return score, engine.screen.name
+        engine = engine.upstream
+    payload = prepare() if prepare is not None and engine.remote else None
+    return engine.check_bytes(payload or data, filename, read_timeout=read_timeout), engine.name
@@ -0,0 +1,300 @@
+"""
+Local forensic detector - scores images offline from cheap pixel and file features
+About 5 ms of vectorized NumPy per image on top of decoding it, with no
+network and no quota. Decoding dominates: JPEGs are decoded at reduced DCT
+scale, but their entropy data is still read in full (~13 ms for a 1.5 MB
+photo), and a PNG is inflated completely (~30 ms at 1024 px); get_stats()
+reports the two parts separately. The features:
+  - FFT spectrum: isolated high-frequency peaks (upsampling grids) and the
+    share of high-frequency energy (generated images tend to be smooth)
+  - Noise residual: sensor noise leaves a floor of fine-grained variation
+    that generated pixels usually lack, and leave unevenly where present
+  - JPEG quantization tables: camera firmware uses its own tables, while
+    generator pipelines save with stock libjpeg (IJG) tables, or as PNG
+  - Metadata: camera EXIF (Make/Model) versus C2PA manifests or generator
+    parameter chunks
+The features are combined by a fixed logistic model into the same 0.0-1.0
+ai_generated score Sightengine returns. The weights are hand-set, so treat
+the score as a pre-screen rather than a final verdict.
+
+Usage:
+    detector = LocalForensicDetector()
+    score = detector.check_file('photo.jpg')
+    report = detector.analyze('photo.jpg')   # score plus the raw features
+"""
+import io
+import math
+import time
+import threading
+import numpy as np
+from PIL import Image
+from sightengine_client import DetectionAPIError
+
+# Side of the square luminance crop the pixel features are computed on
+ANALYSIS_SIZE = 256
+# Noise statistics use ANALYSIS_SIZE / NOISE_BLOCK blocks per side
+NOISE_BLOCK = 32
+
+# IJG (libjpeg) base tables in natural order; scaled by quality they are what
+# Pillow, OpenCV and most software encoders write
+IJG_LUMINANCE = np.array([
+    16, 11, 10, 16, 24, 40, 51, 61,
+    12, 12, 14, 19, 26, 58, 60, 55,
+    14, 13, 16, 24, 40, 57, 69, 56,
+    14, 17, 22, 29, 51, 87, 80, 62,
+    18, 22, 37, 56, 68, 109, 103, 77,
+    24, 35, 55, 64, 81, 104, 113, 92,
+    49, 64, 78, 87, 103, 121, 120, 101,
+    72, 92, 95, 98, 112, 100, 103, 99
+])
+
+# Logistic model: score = sigmoid(BIAS + sum(weight * feature)); features are
+# scaled to roughly -1..1 with positive meaning "looks generated"
+BIAS = -0.2
+WEIGHTS = {
+    'spectral_peaks': 1.2,
+    'smoothness': 1.0,
+    'low_noise': 1.4,
+    'uneven_noise': 0.6,
+    'encoder': 0.8,
+    'metadata': 1.8,
+}
+
+# Markers of generator output found in metadata
+GENERATOR_TEXT_KEYS = {'parameters', 'prompt', 'workflow', 'Dream', 'sd-metadata'}
+C2PA_MARKERS = (b'c2pa', b'jumb')
+
+def _ijg_table(quality):
+    scale = 5000 // quality if quality < 50 else 200 - quality * 2
+    return np.clip((IJG_LUMINANCE * scale + 50) // 100, 1, 255)
+
+# Every stock table, so a quantization fingerprint is one vectorized compare
+_IJG_TABLES = np.stack([_ijg_table(q) for q in range(1, 101)])
+
+_grids = {}
+_grids_lock = threading.Lock()
+
+def _spectrum_grid(size):
+    """Hann window, radius bins and high-band mask for a size x size FFT (cached)"""
+    grid = _grids.get(size)
+    if grid is None:
+        with _grids_lock:
+            window = np.outer(np.hanning(size), np.hanning(size))
+            coords = np.arange(size) - size // 2
+            radius = np.hypot(coords[:, None], coords[None, :])
+            bins = np.minimum(radius.astype(np.int32), size // 2)
+            high = (radius > size * 0.25) & (radius <= size // 2)
+            # The axes carry leftover edge energy even after windowing
+            high[size // 2, :] = False
+            high[:, size // 2] = False
+            grid = _grids[size] = (window, bins, high, np.bincount(bins.ravel()))
+    return grid
+
+def _load(source):
+    """Decode a crop for analysis; JPEGs are decoded at a reduced DCT scale"""
+    with Image.open(source) as image:
+        fmt = image.format
+        info = {
+            'format': fmt,
+            'quantization': getattr(image, 'quantization', None),
+            'applist': getattr(image, 'applist', []),
+            'text_keys': set(image.info) & GENERATOR_TEXT_KEYS,
+            'c2pa_chunk': any(key in image.info for key in ('caBX', 'c2pa')),
+            'exif': image.getexif(),
+        }
+        if fmt == 'JPEG':
+            # Keep at least 2x the crop so the noise floor survives the scaling
+            image.draft('L', (ANALYSIS_SIZE * 2, ANALYSIS_SIZE * 2))
+
+        # Crop before converting so only the analysed pixels are copied; the
+        # features do not depend on orientation, so EXIF rotation is skipped
+        width, height = image.size
+        side = min(width, height, ANALYSIS_SIZE)
+        if side < 32:
+            raise DetectionAPIError('image_too_small', 'Image is too small for local analysis')
+        left, top = (width - side) // 2, (height - side) // 2
+        crop = image.crop((left, top, left + side, top + side)).convert('L')
+        if side != ANALYSIS_SIZE:
+            crop = crop.resize((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.BILINEAR)
+    return np.asarray(crop, dtype=np.float32), info
+
+def spectral_features(gray):
+    """Peak prominence and high-frequency energy share of the 2-D spectrum"""
+    window, bins, high, counts = _spectrum_grid(gray.shape[0])
+    spectrum = np.abs(np.fft.fftshift(np.fft.fft2((gray - gray.mean()) * window)))
+    log_mag = np.log1p(spectrum)
+
+    # Compare each coefficient with the mean of its ring, so the natural
+    # 1/f fall-off does not count as a peak
+    ring_mean = np.bincount(bins.ravel(), weights=log_mag.ravel()) / np.maximum(counts, 1)
+    residual = (log_mag - ring_mean[bins])[high]
+    median = np.median(residual)
+    mad = np.median(np.abs(residual - median)) * 1.4826 + 1e-6
+    peak_z = float((residual.max() - median) / mad)
+
+    power = spectrum ** 2
+    total = power.sum() - power[bins == 0].sum()
+    high_share = float(power[high].sum() / total) if total > 0 else 0.0
+    return peak_z, high_share
+
+def noise_features(gray):
+    """Noise floor and its unevenness from a Laplacian residual"""
+    residual = (4 * gray[1:-1, 1:-1] - gray[:-2, 1:-1] - gray[2:, 1:-1]
+                - gray[1:-1, :-2] - gray[1:-1, 2:]) / 4
+    n = (residual.shape[0] // NOISE_BLOCK) * NOISE_BLOCK
+    blocks = residual[:n, :n].reshape(n // NOISE_BLOCK, NOISE_BLOCK, n // NOISE_BLOCK, NOISE_BLOCK)
+    block_std = blocks.std(axis=(1, 3)).ravel()
+    # The quietest blocks show the noise floor rather than texture
+    floor = float(np.percentile(block_std, 25))
+    quiet = block_std[block_std <= np.percentile(block_std, 50)]
+    unevenness = float(quiet.std() / (quiet.mean() + 1e-6))
+    return floor, unevenness
+
+def quantization_fingerprint(quantization):
+    """
+    Classify a JPEG's luminance table
+
+    Returns:
+        Tuple of (kind, quality): kind is 'ijg' with the matching IJG quality,
+        'custom' for non-stock tables (typical of camera firmware), or None
+        when the image is not a JPEG
+    """
+    if not quantization or 0 not in quantization:
+        return None, None
+    table = np.asarray(quantization[0][:64])
+    matches = np.flatnonzero((_IJG_TABLES == table).all(axis=1))
+    if matches.size:
+        return 'ijg', int(matches[-1]) + 1
+    return 'custom', None
+
+def metadata_features(info):
+    """Camera EXIF and provenance markers visible in the decoded headers"""
+    exif = info['exif']
+    camera = bool(exif.get(0x010F) or exif.get(0x0110))  # Make / Model
+    software = str(exif.get(0x0131) or '')
+    c2pa = info['c2pa_chunk'] or any(
+        marker in data for name, data in info['applist'] if name == 'APP11' for marker in C2PA_MARKERS
+    )
+    return {
+        'camera_exif': camera,
+        'software': software or None,
+        'c2pa': c2pa,
+        'generator_text': sorted(info['text_keys']),
+    }
+
+def _clip(value):
+    return max(-1.0, min(1.0, value))
+
+def score_features(features):
+    """Combine raw features into an ai_generated probability"""
+    metadata = features['metadata']
+    if metadata['generator_text']:
+        provenance = 1.0
+    elif metadata['camera_exif']:
+        provenance = -1.0
+    elif metadata['c2pa']:
+        provenance = 0.6  # Generators and a few cameras sign with C2PA
+    else:
+        provenance = 0.0
+
+    if features['quantization'] == 'custom':
+        encoder = -1.0
+    elif features['quantization'] == 'ijg' or features['format'] == 'PNG':
+        encoder = 0.4
+    else:
+        encoder = 0.0
+
+    signals = {
+        'spectral_peaks': _clip((features['spectral_peak_z'] - 4.0) / 2.0),
+        'smoothness': _clip((-math.log10(features['high_freq_share'] + 1e-9) - 2.5) / 1.5),
+        'low_noise': _clip((1.5 - features['noise_floor']) / 1.5),
+        'uneven_noise': _clip((features['noise_unevenness'] - 0.35) / 0.35),
+        'encoder': encoder,
+        'metadata': provenance,
+    }
+    z = BIAS + sum(WEIGHTS[name] * value for name, value in signals.items())
+    return 1 / (1 + math.exp(-z)), signals
+
+class LocalForensicDetector:
+    """
+    Offline detector with the same check_file / check_bytes interface as
+    SightengineClient (see detectors.py)
+    """
+
+    name = 'local'
+    remote = False
+
+    def __init__(self):
+        self._stats_lock = threading.Lock()
+        self._stats = {'analyzed': 0, 'failed': 0, 'total_ms': 0.0, 'decode_ms': 0.0}
+
+    def analyze(self, source):
+        """
+        Compute features and the score for a path or binary file object
+
+        Returns:
+            Dict with score, signals (scaled per-feature evidence) and the raw features
+
+        Raises:
+            DetectionAPIError: The image cannot be decoded or is too small
+        """
+        started = time.perf_counter()
+        try:
+            gray, info = _load(source)
+        except DetectionAPIError:
+            self._count('failed')
+            raise
+        except Exception:
+            self._count('failed')
+            raise DetectionAPIError('unsupported_image', 'Could not decode image')
+        decoded = time.perf_counter()
+
+        peak_z, high_share = spectral_features(gray)
+        floor, unevenness = noise_features(gray)
+        quant_kind, quant_quality = quantization_fingerprint(info['quantization'])
+        features = {
+            'format': info['format'],
+            'spectral_peak_z': round(peak_z, 3),
+            'high_freq_share': round(high_share, 6),
+            'noise_floor': round(floor, 3),
+            'noise_unevenness': round(unevenness, 3),
+            'quantization': quant_kind,
+            'jpeg_quality': quant_quality,
+            'metadata': metadata_features(info),
+        }
+        score, signals = score_features(features)
+
+        elapsed = (time.perf_counter() - started) * 1000
+        with self._stats_lock:
+            self._stats['analyzed'] += 1
+            self._stats['total_ms'] += elapsed
+            self._stats['decode_ms'] += (decoded - started) * 1000
+        return {
+            'score': round(score, 4),
+            'signals': {name: round(value, 3) for name, value in signals.items()},
+            'features': features,
+            'elapsed_ms': round(elapsed, 2),
+        }
+
+    def check_file(self, path, payload=None, read_timeout=None):
+        """ai_generated score 0.0-1.0 for an image on disk (payload and timeout are unused)"""
+        return self.analyze(path)['score']
+
+    def check_bytes(self, data, filename='image', read_timeout=None):
+        """ai_generated score 0.0-1.0 for an in-memory image"""
+        return self.analyze(io.BytesIO(data))['score']
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def get_stats(self):
+        """Return analysis counters and the mean time per image, and of that the decode"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        analyzed = stats['analyzed']
+        stats['mean_ms'] = round(stats['total_ms'] / analyzed, 2) if analyzed else 0.0
+        stats['mean_decode_ms'] = round(stats['decode_ms'] / analyzed, 2) if analyzed else 0.0
+        stats['total_ms'] = round(stats['total_ms'], 1)
+        stats['decode_ms'] = round(stats['decode_ms'], 1)
+        return stats
@@ -0,0 +1,84 @@
+"""
+Image normalization before upstream submission
+Decodes, orients and downscales large images so less data goes over the wire.
+Shared by the Flask detection routes and the Streamlit app (no Flask imports here)
+"""
+import io
+import os
+import time
+from PIL import Image, ImageOps
+
+# Preprocessing configuration (PREPROCESS_MAX_EDGE=0 disables the stage)
+PREPROCESS_MAX_EDGE = int(os.getenv('PREPROCESS_MAX_EDGE', 1024))
+PREPROCESS_QUALITY = int(os.getenv('PREPROCESS_QUALITY', 92))
+
+def prepare_for_upload(source, original_bytes, max_edge=None, quality=None):
+    """
+    Produce a smaller JPEG of an image for the detection API
+
+    JPEGs are decoded with draft(), which lets libjpeg scale by 1/2, 1/4 or
+    1/8 during the DCT instead of decoding every pixel; other formats use
+    reduce() for a fast integer box downsample before the final resize.
+
+    Args:
+        source: File path or binary file object of the original image
+        original_bytes: Size of the original file in bytes
+        max_edge: Longest edge of the output (default PREPROCESS_MAX_EDGE)
+        quality: JPEG quality of the output (default PREPROCESS_QUALITY)
+
+    Returns:
+        Tuple of (payload, stats). payload is the re-encoded JPEG bytes, or
+        None when the original should be sent as-is (stage disabled, image
+        already small enough, or re-encoding would not save anything).
+    """
+    max_edge = PREPROCESS_MAX_EDGE if max_edge is None else max_edge
+    quality = quality or PREPROCESS_QUALITY
+    started = time.perf_counter()
+    stats = {
+        'original_bytes': original_bytes,
+        'sent_bytes': original_bytes,
+        'bytes_saved': 0,
+        'resized': False
+    }
+
+    if max_edge <= 0:
+        stats['preprocess_ms'] = 0.0
+        return None, stats
+
+    with Image.open(source) as image:
+        stats['original_size'] = list(image.size)
+        if max(image.size) <= max_edge:
+            stats['preprocess_ms'] = round((time.perf_counter() - started) * 1000, 2)
+            return None, stats
+
+        if image.format == 'JPEG':
+            image.draft('RGB', (max_edge, max_edge))
+
+        image = ImageOps.exif_transpose(image)
+
+        factor = max(image.size) // max_edge
+        if factor >= 2:
+            image = image.reduce(factor)
+        if max(image.size) > max_edge:
+            image.thumbnail((max_edge, max_edge), Image.LANCZOS)
+
+        if image.mode != 'RGB':
+            # Flatten transparency onto white rather than black
+            background = Image.new('RGB', image.size, (255, 255, 255))
+            rgba = image.convert('RGBA')
+            background.paste(rgba, mask=rgba.getchannel('A'))
+            image = background
+
+        output = io.BytesIO()
+        image.save(output, 'JPEG', quality=quality, optimize=True)
+        payload = output.getvalue()
+        stats['sent_size'] = list(image.size)
+
+    stats['preprocess_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    if len(payload) >= original_bytes:
+        return None, stats
+
+    stats['sent_bytes'] = len(payload)
+    stats['bytes_saved'] = original_bytes - len(payload)
+    stats['resized'] = True
+    return payload, stats
@@ -0,0 +1,323 @@
+"""
+Bulk offline detection for folders and archives of images
+Walks directories, and the zip / tar archives given or found in them, as a
+stream; each image goes into the blob store and through the same pipeline
+as the upload routes (provenance, verdict cache, detection engine) on a
+bounded worker pool. Results are appended to an NDJSON or CSV file (by
+extension) and to ai_detections in batched inserts.
+
+After each batch the finished images are recorded in a checkpoint file
+(OUTPUT.checkpoint by default), so rerunning the same command resumes an
+interrupted run. Images that failed for a passing reason (rate limit,
+network, open circuit) are not recorded and are retried by the next run. A
+crash between a batch's insert and its checkpoint repeats that batch.
+
+Usage:
+    python ingest.py DUMP_DIR dump.zip --output results.ndjson
+    python ingest.py dump.tar.gz --output results.csv --workers 8 --user-id 3
+"""
+import os
+import sys
+import csv
+import json
+import time
+import sqlite3
+import tarfile
+import zipfile
+import argparse
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import requests
+from database import execute_many
+from upload_store import store_upload, release_upload, UPLOAD_FOLDER
+from sightengine_client import DetectionAPIError, CircuitOpenError, QuotaExceededError
+from routes.ai_detection import (
+    detector, detect_image_file, allowed_file, quota_message,
+    build_detection_row, build_detection_result, INSERT_DETECTION_SQL,
+    BATCH_CONCURRENCY, API_USER, API_SECRET
+)
+
+ARCHIVE_SUFFIXES = ('.zip', '.tar', '.tar.gz', '.tgz', '.tar.bz2', '.tbz2', '.tar.xz', '.txz')
+# Same per-file limit as uploads (MAX_CONTENT_LENGTH in server.py)
+MAX_FILE_BYTES = 16 * 1024 * 1024
+BATCH_SIZE = 100
+CSV_FIELDS = ['source', 'filename', 'is_ai_generated', 'confidence_percent', 'probability_score',
+              'likely_generator', 'detection_tier', 'cache', 'image_path', 'error']
+
+# stream is only readable until the next entry is requested
+ImageEntry = namedtuple('ImageEntry', 'source filename size stream')
+
+def _wanted(name):
+    """Image files, minus the macOS resource forks archives often carry"""
+    base = os.path.basename(name)
+    return allowed_file(base) and not base.startswith('._') and '__MACOSX/' not in name
+
+def _iter_zip(path, skip):
+    with zipfile.ZipFile(path) as archive:
+        for info in archive.infolist():
+            source = f'{path}!{info.filename}'
+            if info.is_dir() or not _wanted(info.filename) or source in skip:
+                continue
+            with archive.open(info) as stream:
+                yield ImageEntry(source, os.path.basename(info.filename), info.file_size, stream)
+
+def _iter_tar(path, skip):
+    # Stream mode reads the archive front to back once, compressed or not
+    with tarfile.open(path, 'r|*') as archive:
+        for member in archive:
+            source = f'{path}!{member.name}'
+            if not member.isfile() or not _wanted(member.name) or source in skip:
+                continue
+            yield ImageEntry(source, os.path.basename(member.name), member.size,
+                             archive.extractfile(member))
+
+def _iter_path(path, skip):
+    try:
+        lowered = path.lower()
+        if lowered.endswith('.zip'):
+            yield from _iter_zip(path, skip)
+        elif lowered.endswith(ARCHIVE_SUFFIXES):
+            yield from _iter_tar(path, skip)
+        elif _wanted(path) and path not in skip:
+            with open(path, 'rb') as stream:
+                yield ImageEntry(path, os.path.basename(path), os.path.getsize(path), stream)
+    except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+        print(f"⚠️  Skipping the rest of {path}: {e}")
+
+def iter_images(paths, skip=frozenset()):
+    """
+    Yield an ImageEntry for every image under the given files, folders and archives
+
+    Sources are absolute paths, with archive members as ARCHIVE!MEMBER;
+    those in skip are passed over without being read.
+    """
+    for path in paths:
+        path = os.path.abspath(path)
+        if not os.path.isdir(path):
+            yield from _iter_path(path, skip)
+            continue
+        for folder, folders, files in os.walk(path):
+            folders.sort()
+            for name in sorted(files):
+                yield from _iter_path(os.path.join(folder, name), skip)
+
+class Checkpoint:
+    """Sources finished by earlier runs, kept in a small SQLite file"""
+
+    def __init__(self, path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS ingested (
+                source TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                finished_at REAL NOT NULL
+            )
+        """)
+
+    def finished(self):
+        return {row[0] for row in self.connection.execute("SELECT source FROM ingested")}
+
+    def record(self, entries):
+        """Mark (source, status) pairs finished in one transaction"""
+        now = time.time()
+        with self.connection:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO ingested (source, status, finished_at) VALUES (?, ?, ?)",
+                [(source, status, now) for source, status in entries]
+            )
+
+    def close(self):
+        self.connection.close()
+
+class ResultWriter:
+    """Appends result records to an NDJSON file, or a CSV file when the name ends in .csv"""
+
+    def __init__(self, path):
+        self.is_csv = path.lower().endswith('.csv')
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self.file = open(path, 'a', newline='' if self.is_csv else None, encoding='utf-8')
+        if self.is_csv:
+            self.writer = csv.DictWriter(self.file, CSV_FIELDS, extrasaction='ignore')
+            if new_file:
+                self.writer.writeheader()
+
+    def write(self, record):
+        if self.is_csv:
+            self.writer.writerow(record)
+        else:
+            self.file.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+    def flush(self):
+        self.file.flush()
+        os.fsync(self.file.fileno())
+
+    def close(self):
+        self.file.close()
+
+class IngestRun:
+    """Collects finished detections and writes them out a batch at a time"""
+
+    def __init__(self, writer, checkpoint, user_id=None, batch_size=BATCH_SIZE):
+        self.writer = writer
+        self.checkpoint = checkpoint
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.records = []
+        self.rows = []
+        self.finished = []
+        self.counts = {'scored': 0, 'failed': 0, 'retry': 0}
+        self.stop_reason = None
+        self.started = time.perf_counter()
+
+    def add_result(self, source, filename, image_path, outcome):
+        verdict, cache_status, preprocessing = outcome
+        result = build_detection_result(filename, image_path, verdict, cache_status, preprocessing)
+        self.records.append({'source': source, **result})
+        self.rows.append(build_detection_row(filename[:255], image_path, verdict, self.user_id))
+        self.finished.append((source, 'done'))
+        self.counts['scored'] += 1
+        self._maybe_flush()
+
+    def add_error(self, source, filename, message, retry=False, image_path=None):
+        """Record a failure; retry leaves it out of the checkpoint so the next run tries again"""
+        if image_path:
+            release_upload(image_path)  # No detection row will point at it
+        self.records.append({'source': source, 'filename': filename, 'error': message})
+        if not retry:
+            self.finished.append((source, 'failed'))
+        self.counts['retry' if retry else 'failed'] += 1
+        self._maybe_flush()
+
+    def complete(self, future, source, filename, image_path):
+        """Handle one finished detect_image_file() call"""
+        try:
+            outcome = future.result()
+        except DetectionAPIError as e:
+            self.add_error(source, filename, f'API Error ({e.code}): {e.message}', image_path=image_path)
+        except QuotaExceededError as e:
+            if e.reason == 'budget':
+                self.stop_reason = quota_message(e)
+            self.add_error(source, filename, quota_message(e), retry=True, image_path=image_path)
+        except CircuitOpenError:
+            self.stop_reason = 'Detection service is temporarily unavailable'
+            self.add_error(source, filename, self.stop_reason, retry=True, image_path=image_path)
+        except requests.exceptions.RequestException as e:
+            self.add_error(source, filename, f'Network error: {str(e)}', retry=True, image_path=image_path)
+        except Exception as e:
+            self.add_error(source, filename, f'Error: {str(e)}', image_path=image_path)
+        else:
+            self.add_result(source, filename, image_path, outcome)
+
+    def _maybe_flush(self):
+        if len(self.records) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Insert the batch's rows, then write its results, then checkpoint it"""
+        if not self.records:
+            return
+        if self.rows and execute_many(INSERT_DETECTION_SQL, self.rows) is None:
+            # Nothing is recorded, so the next run redoes the batch; the blob
+            # references it took are repaired by the next `upload_store.py gc`
+            self.stop_reason = 'Could not save detections to the database'
+            self.records, self.rows, self.finished = [], [], []
+            return
+        for record in self.records:
+            self.writer.write(record)
+        self.writer.flush()
+        self.checkpoint.record(self.finished)
+        self.records, self.rows, self.finished = [], [], []
+
+        elapsed = time.perf_counter() - self.started
+        done = self.counts['scored'] + self.counts['failed'] + self.counts['retry']
+        print(f"  {done} images, {done / elapsed:.1f}/s "
+              f"({self.counts['failed']} failed, {self.counts['retry']} to retry)")
+
+def ingest(paths, run, workers=BATCH_CONCURRENCY, skip=frozenset(), upload_folder=UPLOAD_FOLDER):
+    """
+    Score every image under paths, feeding results to an IngestRun
+
+    Images are read one at a time in walk order; at most 2 * workers are
+    stored and waiting for a worker at once. Stops early when run.stop_reason
+    is set (spent budget, open circuit, database failure).
+    """
+    pending = {}
+    executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+
+    def collect(futures):
+        for future in futures:
+            run.complete(future, *pending.pop(future))
+
+    try:
+        for entry in iter_images(paths, skip):
+            if run.stop_reason:
+                break
+            if entry.size > MAX_FILE_BYTES:
+                run.add_error(entry.source, entry.filename,
+                              f'File too large (limit {MAX_FILE_BYTES // (1024 * 1024)} MB)')
+                continue
+            try:
+                image_path, upload_path, digest = store_upload(
+                    entry.stream, entry.filename, upload_folder, thumbnails=False
+                )
+            except (OSError, zipfile.BadZipFile, tarfile.TarError) as e:
+                run.add_error(entry.source, entry.filename, f'Could not read file: {e}')
+                continue
+            future = executor.submit(detect_image_file, upload_path, digest)
+            pending[future] = (entry.source, entry.filename, image_path)
+            if len(pending) >= workers * 2:
+                collect(wait(pending, return_when=FIRST_COMPLETED).done)
+        collect(wait(pending).done)
+    except KeyboardInterrupt:
+        run.stop_reason = 'Interrupted'
+        # Drop what has not started; let running calls finish and keep their results
+        for future, (_, _, image_path) in list(pending.items()):
+            if future.cancel():
+                release_upload(image_path)
+                del pending[future]
+        collect(wait(pending).done)
+    finally:
+        executor.shutdown(wait=True)
+        run.flush()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('paths', nargs='+', help='image files, folders, .zip or .tar(.gz/.bz2/.xz) archives')
+    parser.add_argument('--output', '-o', required=True, help='results file (.ndjson, or .csv)')
+    parser.add_argument('--checkpoint', help='checkpoint file (default OUTPUT.checkpoint)')
+    parser.add_argument('--workers', type=int, default=BATCH_CONCURRENCY,
+                        help='concurrent detections (default DETECTION_BATCH_CONCURRENCY)')
+    parser.add_argument('--batch-size', type=int, default=BATCH_SIZE, help='results per insert and checkpoint')
+    parser.add_argument('--user-id', type=int, help='user the ai_detections rows belong to')
+    args = parser.parse_args()
+
+    if detector.remote and (not API_USER or not API_SECRET):
+        print("❌ Sightengine API credentials missing (SIGHTENGINE_API_USER / SIGHTENGINE_API_SECRET)")
+        sys.exit(1)
+
+    checkpoint = Checkpoint(args.checkpoint or f'{args.output}.checkpoint')
+    finished = checkpoint.finished()
+    if finished:
+        print(f"↩️  Resuming: {len(finished)} images already done")
+
+    writer = ResultWriter(args.output)
+    run = IngestRun(writer, checkpoint, args.user_id, max(args.batch_size, 1))
+    try:
+        ingest(args.paths, run, workers=max(args.workers, 1), skip=finished)
+    finally:
+        writer.close()
+        checkpoint.close()
+
+    counts = run.counts
+    print(f"✅ {counts['scored']} scored, {counts['failed']} failed, "
+          f"{counts['retry']} left for the next run -> {args.output}")
+    if run.stop_reason:
+        print(f"⚠️  Stopped early: {run.stop_reason}")
+        print("   Rerun the same command to resume.")
+        sys.exit(2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Streaming multipart/form-data bodies for outbound uploads
+requests sends a file-like body with a known length chunk by chunk, so the
+image is never buffered in memory the way requests' own files= encoding does
+"""
+import io
+import os
+import uuid
+import hashlib
+
+CHUNK_SIZE = 64 * 1024
+
+class MultipartFileStream:
+    """
+    Read-only multipart body made of form fields plus one file read from disk
+
+    Deliberately not an io.IOBase: requests probes tell() on those, and an
+    unseekable stream would make it fall back to chunked transfer encoding
+    instead of sending a Content-Length.
+
+    Usage:
+        body = MultipartFileStream({'models': 'genai'}, 'media', path)
+        requests.post(url, data=body, headers={'Content-Type': body.content_type})
+    """
+
+    def __init__(self, fields, file_field, file_path, filename=None,
+                 file_content_type='application/octet-stream', payload=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+
+        preamble = io.BytesIO()
+        for name, value in fields.items():
+            preamble.write(
+                f'--{self.boundary}\r\n'
+                f'Content-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n'.encode('utf-8')
+            )
+        filename = filename or os.path.basename(file_path)
+        preamble.write(
+            f'--{self.boundary}\r\n'
+            f'Content-Disposition: form-data; name="{file_field}"; filename="{filename}"\r\n'
+            f'Content-Type: {file_content_type}\r\n\r\n'.encode('utf-8')
+        )
+
+        # An in-memory payload (e.g. a downscaled copy) replaces the file contents
+        if payload is not None:
+            body, body_length = io.BytesIO(payload), len(payload)
+        else:
+            body, body_length = open(file_path, 'rb'), os.path.getsize(file_path)
+
+        self._parts = [
+            io.BytesIO(preamble.getvalue()),
+            body,
+            io.BytesIO(f'\r\n--{self.boundary}--\r\n'.encode('utf-8'))
+        ]
+        self._length = (
+            len(self._parts[0].getvalue())
+            + body_length
+            + len(self._parts[2].getvalue())
+        )
+
+    def __len__(self):
+        return self._length
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = self._length
+        chunks = []
+        while size > 0 and self._parts:
+            chunk = self._parts[0].read(size)
+            if not chunk:
+                self._parts.pop(0).close()
+                continue
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b''.join(chunks)
+
+    def close(self):
+        for part in self._parts:
+            part.close()
+        self._parts = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def hash_file(path):
+    """Hex SHA-256 of a file on disk, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
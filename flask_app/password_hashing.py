@@ -0,0 +1,165 @@
+"""
+bcrypt hashing off the request threads
+Hashes and checks run in a bounded process pool; when too many are already
+waiting, callers get HashingBusyError (the routes answer 429) instead of
+piling up behind a login storm. Recently verified credentials are remembered
+briefly, so a client that logs in repeatedly does not pay bcrypt each time.
+"""
+import os
+import hmac
+import time
+import hashlib
+import secrets
+import threading
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+import bcrypt
+
+# Cost factor for new hashes; stored hashes with another cost are upgraded on login
+BCRYPT_ROUNDS = int(os.getenv('BCRYPT_ROUNDS', 12))
+# Worker processes (0 runs bcrypt inline on the calling thread)
+BCRYPT_WORKERS = int(os.getenv('BCRYPT_WORKERS', max(1, (os.cpu_count() or 2) // 2)))
+# Requests allowed to wait for a worker before new ones are rejected
+BCRYPT_MAX_QUEUE = int(os.getenv('BCRYPT_MAX_QUEUE', 16))
+BCRYPT_TIMEOUT = float(os.getenv('BCRYPT_TIMEOUT', 10))
+
+# Verified-credential cache (LOGIN_CACHE_TTL=0 disables it)
+LOGIN_CACHE_TTL = int(os.getenv('LOGIN_CACHE_TTL', 300))
+LOGIN_CACHE_MAX_ENTRIES = int(os.getenv('LOGIN_CACHE_MAX_ENTRIES', 10000))
+
+class HashingBusyError(Exception):
+    """Raised when the hashing pool is saturated"""
+
+    def __init__(self, retry_after=1):
+        super().__init__('Too many login attempts in progress, please retry shortly')
+        self.retry_after = retry_after
+
+_pool = None
+_pool_lock = threading.Lock()
+_inflight = 0
+
+# HMAC key for the credential cache; never leaves this process
+_cache_key = secrets.token_bytes(32)
+_verified = OrderedDict()
+_verified_lock = threading.Lock()
+
+_stats = {'hashed': 0, 'checked': 0, 'fast_path_hits': 0, 'rejected': 0}
+_stats_lock = threading.Lock()
+
+def _count(key):
+    with _stats_lock:
+        _stats[key] += 1
+
+def _hashpw(password, rounds):
+    return bcrypt.hashpw(password, bcrypt.gensalt(rounds))
+
+def _checkpw(password, hashed):
+    return bcrypt.checkpw(password, hashed)
+
+def _get_pool():
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(max_workers=BCRYPT_WORKERS)
+    return _pool
+
+def _reset_pool():
+    global _pool
+    with _pool_lock:
+        broken, _pool = _pool, None
+    if broken is not None:
+        broken.shutdown(wait=False, cancel_futures=True)
+
+def _release_slot(_future=None):
+    global _inflight
+    with _pool_lock:
+        _inflight -= 1
+
+def _run(fn, *args):
+    """Run fn in the pool, or raise HashingBusyError when the queue is full"""
+    if BCRYPT_WORKERS <= 0:
+        return fn(*args)
+
+    global _inflight
+    with _pool_lock:
+        if _inflight >= BCRYPT_WORKERS + BCRYPT_MAX_QUEUE:
+            _count('rejected')
+            raise HashingBusyError()
+        _inflight += 1
+    try:
+        future = _get_pool().submit(fn, *args)
+    except BrokenProcessPool:
+        _release_slot()
+        _reset_pool()  # A worker died; start a fresh pool on the next call
+        raise
+    # The slot is freed when the task actually ends or is cancelled, not when
+    # this caller stops waiting, so the bound tracks the pool's real load
+    future.add_done_callback(_release_slot)
+    try:
+        # The waiting thread is idle, so other requests keep this process's CPU
+        return future.result(timeout=BCRYPT_TIMEOUT)
+    except FutureTimeoutError:
+        future.cancel()  # Only succeeds while it is still queued
+        _count('rejected')
+        raise HashingBusyError()
+    except BrokenProcessPool:
+        _reset_pool()
+        raise
+
+def hash_password(password):
+    """Return a bcrypt hash (str) of a password at BCRYPT_ROUNDS"""
+    hashed = _run(_hashpw, password.encode('utf-8'), BCRYPT_ROUNDS)
+    _count('hashed')
+    return hashed.decode('utf-8')
+
+def _cache_token(password, password_hash):
+    # Keyed by the stored hash too, so a password change invalidates the entry
+    return hmac.new(_cache_key, f'{password_hash}\0{password}'.encode('utf-8'), hashlib.sha256).digest()
+
+def check_password(password, password_hash):
+    """
+    Verify a password against a stored bcrypt hash
+
+    Only successful checks are remembered, so wrong guesses always cost a
+    full bcrypt round.
+    """
+    token = _cache_token(password, password_hash) if LOGIN_CACHE_TTL > 0 else None
+    if token is not None:
+        with _verified_lock:
+            expires_at = _verified.get(token)
+            if expires_at and expires_at > time.time():
+                _verified.move_to_end(token)
+                _count('fast_path_hits')
+                return True
+
+    matched = _run(_checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+    _count('checked')
+
+    if matched and token is not None:
+        with _verified_lock:
+            _verified[token] = time.time() + LOGIN_CACHE_TTL
+            _verified.move_to_end(token)
+            while len(_verified) > LOGIN_CACHE_MAX_ENTRIES:
+                _verified.popitem(last=False)
+    return matched
+
+def needs_rehash(password_hash):
+    """True if a stored hash was made with a different cost than BCRYPT_ROUNDS"""
+    try:
+        return int(password_hash.split('$')[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return False
+
+def get_hashing_stats():
+    """Return password hashing counters for this process"""
+    with _stats_lock:
+        stats = dict(_stats)
+    with _pool_lock:
+        stats['inflight'] = _inflight
+    stats['workers'] = BCRYPT_WORKERS
+    stats['rounds'] = BCRYPT_ROUNDS
+    with _verified_lock:
+        stats['verified_cache_entries'] = len(_verified)
+    return stats
@@ -0,0 +1,109 @@
+"""
+Perceptual hashing and near-duplicate lookup for uploaded images
+Shared by the Flask detection routes and the Streamlit app (no Flask imports here)
+"""
+import threading
+import numpy as np
+from PIL import Image
+
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+def compute_dhash(image):
+    """
+    Compute a 64-bit difference hash for a PIL image
+
+    The image is shrunk to 9x8 grayscale and each bit records whether a pixel
+    is brighter than its right-hand neighbour, so re-encoding, resizing and
+    mild recompression leave most bits unchanged.
+
+    Returns:
+        Hash as a 16-character hex string
+    """
+    if image.format == 'JPEG':
+        # Let libjpeg decode at a reduced scale instead of the full frame
+        image.draft('L', (HASH_SIZE * 4, HASH_SIZE * 4))
+
+    small = image.convert('L').resize((HASH_SIZE + 1, HASH_SIZE), Image.LANCZOS)
+    pixels = np.asarray(small, dtype=np.int16)
+    bits = pixels[:, 1:] > pixels[:, :-1]
+    return np.packbits(bits.ravel()).tobytes().hex()
+
+def hamming_distance(a, b):
+    """Number of differing bits between two integer hashes"""
+    return bin(a ^ b).count('1')
+
+class NearDuplicateIndex:
+    """
+    Multi-index hashing over 64-bit perceptual hashes
+
+    Each hash is split into max_distance + 1 disjoint bit ranges. By the
+    pigeonhole principle any hash within max_distance bits of a query agrees
+    exactly with it on at least one range, so a query only has to verify the
+    few entries sharing one of its range values instead of the whole index.
+    """
+
+    def __init__(self, max_distance=4):
+        self.max_distance = max_distance
+        chunks = max_distance + 1
+        step = HASH_BITS / chunks
+        bounds = [round(i * step) for i in range(chunks + 1)]
+        self._ranges = [
+            (HASH_BITS - end, (1 << (end - start)) - 1)
+            for start, end in zip(bounds, bounds[1:])
+        ]
+        self._tables = [{} for _ in self._ranges]
+        self._keys = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _chunks(self, value):
+        return [(value >> shift) & mask for shift, mask in self._ranges]
+
+    def add(self, phash, key):
+        """Index a hex hash under the given key (re-adding a key moves it)"""
+        value = int(phash, 16)
+        with self._lock:
+            if key in self._keys:
+                self._discard(key)
+            self._keys[key] = value
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                table.setdefault(chunk, set()).add(key)
+
+    def remove(self, key):
+        """Drop a key from the index if present"""
+        with self._lock:
+            if key in self._keys:
+                self._discard(key)
+
+    def _discard(self, key):
+        value = self._keys.pop(key)
+        for table, chunk in zip(self._tables, self._chunks(value)):
+            bucket = table.get(chunk)
+            if bucket:
+                bucket.discard(key)
+                if not bucket:
+                    del table[chunk]
+
+    def find(self, phash):
+        """
+        Find the closest indexed hash within max_distance bits
+
+        Returns:
+            Tuple of (key, distance), or None when nothing is close enough
+        """
+        value = int(phash, 16)
+        best = None
+        with self._lock:
+            seen = set()
+            for table, chunk in zip(self._tables, self._chunks(value)):
+                for key in table.get(chunk, ()):
+                    if key in seen:
+                        continue
+                    seen.add(key)
+                    distance = hamming_distance(value, self._keys[key])
+                    if distance <= self.max_distance and (best is None or distance < best[1]):
+                        best = (key, distance)
+        return best
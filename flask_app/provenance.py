@@ -0,0 +1,351 @@
+"""
+Header-only provenance scanner - finds generator markers without decoding pixels
+Parses the container structure in the first PROVENANCE_SCAN_BYTES of a file:
+  - PNG text chunks (Stable Diffusion web UI `parameters`, ComfyUI `prompt` /
+    `workflow`, InvokeAI metadata) and C2PA `caBX` chunks
+  - JPEG APP1 EXIF (Software, Make/Model, UserComment) and XMP, APP11 JUMBF
+    (C2PA) and COM segments, stopping at the first scan
+  - WebP EXIF / XMP / C2PA chunks
+Only structured fields decide: EXIF / PNG Software, XMP CreatorTool, the C2PA
+claim generator, an IPTC DigitalSourceType of trained algorithmic media, and
+the generation parameters front-ends write into PNG text and UserComment. A
+generator named in free text (captions, comments, the rest of the XMP) is
+recorded as a hint only - a photo captioned "not Midjourney" is still a photo.
+Declared reports can be answered with directly; nothing declared means
+nothing was found, not that the image is real. Shared by the Flask routes and
+the Streamlit app (no Flask imports here)
+
+Usage:
+    report = scan_provenance('upload.png')
+    if report and report['declared']:
+        print(report['generator'], report['evidence'])
+"""
+import os
+import re
+import struct
+import zlib
+
+# Bytes read from the start of the file; markers live in the headers (0 disables the scan)
+PROVENANCE_SCAN_BYTES = int(os.getenv('PROVENANCE_SCAN_BYTES', 256 * 1024))
+# Cap on the inflated size of one compressed PNG text chunk; larger ones are skipped
+MAX_TEXT_BYTES = 256 * 1024
+# Score reported for images whose metadata marks them as generated
+PROVENANCE_SCORE = 1.0
+
+# Case-insensitive substrings of metadata text, and the generator they name
+GENERATOR_SIGNATURES = [
+    ('midjourney', 'Midjourney'),
+    ('dall-e', 'DALL-E'),
+    ('dall·e', 'DALL-E'),
+    ('openai', 'DALL-E'),
+    ('chatgpt', 'DALL-E'),
+    ('adobe firefly', 'Adobe Firefly'),
+    ('adobe_firefly', 'Adobe Firefly'),
+    ('novelai', 'NovelAI'),
+    ('stable diffusion', 'Stable Diffusion'),
+    ('stablediffusion', 'Stable Diffusion'),
+    ('comfyui', 'Stable Diffusion (ComfyUI)'),
+    ('invokeai', 'Stable Diffusion (InvokeAI)'),
+    ('automatic1111', 'Stable Diffusion (web UI)'),
+    ('black forest labs', 'Flux'),
+    ('google imagen', 'Imagen'),
+    ('gemini', 'Imagen'),
+    ('leonardo.ai', 'Leonardo.Ai'),
+    ('ideogram', 'Ideogram'),
+    ('bing image creator', 'DALL-E'),
+    ('xai grok', 'Grok'),
+]
+
+# PNG text keywords written by generator front-ends
+PNG_TEXT_KEYWORDS = {
+    'parameters': 'Stable Diffusion (web UI)',
+    'prompt': 'Stable Diffusion (ComfyUI)',
+    'workflow': 'Stable Diffusion (ComfyUI)',
+    'dream': 'Stable Diffusion (InvokeAI)',
+    'sd-metadata': 'Stable Diffusion (InvokeAI)',
+    'invokeai_metadata': 'Stable Diffusion (InvokeAI)',
+}
+
+# IPTC DigitalSourceType terms for generated media (XMP and C2PA), as the
+# vocabulary URL so a prose mention of the words does not count
+AI_SOURCE_TYPES = (b'digitalsourcetype/trainedAlgorithmicMedia',
+                   b'digitalsourcetype/compositeWithTrainedAlgorithmicMedia')
+
+# <xmp:CreatorTool>...</xmp:CreatorTool> or xmp:CreatorTool="..."
+XMP_CREATOR_TOOL = re.compile(rb'CreatorTool(?:>|=")([^<"]{1,200})')
+
+# "Steps: 20, Sampler: Euler a, CFG scale: 7" - generation settings in free text
+GENERATION_PARAMS = re.compile(r'Steps: \d+.*(Sampler|CFG scale): ', re.S)
+
+EXIF_TAGS = {0x010E: 'ImageDescription', 0x010F: 'Make', 0x0110: 'Model',
+             0x0131: 'Software', 0x013B: 'Artist', 0x9286: 'UserComment'}
+EXIF_IFD_POINTER = 0x8769
+XMP_HEADER = b'http://ns.adobe.com/xap/1.0/\x00'
+
+def _match_generator(text):
+    """(matched word, generator) for the first signature in a metadata string, or None"""
+    lowered = text.lower()
+    for needle, generator in GENERATOR_SIGNATURES:
+        if needle in lowered:
+            return needle, generator
+    return None
+
+def _cbor_text_after(data, key, start=0):
+    """The CBOR text string that follows a text key in a C2PA manifest, or None"""
+    index = data.find(key, start)
+    if index < 0:
+        return None
+    pos = index + len(key)
+    head = data[pos] if pos < len(data) else None
+    if head is not None and 0x60 <= head <= 0x77:
+        length, pos = head - 0x60, pos + 1
+    elif head == 0x78 and pos + 1 < len(data):
+        length, pos = data[pos + 1], pos + 2
+    elif head == 0x79 and pos + 2 < len(data):
+        length, pos = int.from_bytes(data[pos + 1:pos + 3], 'big'), pos + 3
+    else:
+        return None
+    return data[pos:pos + length].decode('utf-8', 'replace')
+
+class _Findings:
+    def __init__(self):
+        self.evidence = []  # Structured markers: these decide the verdict
+        self.hints = []  # Generator names in free text: recorded only
+        self.generator = None
+        self.c2pa = False
+        self.camera = None
+
+    def mark(self, evidence, generator=None):
+        self.evidence.append(evidence)
+        if generator and not self.generator:
+            self.generator = generator
+
+    def check_tool(self, where, text):
+        """A field naming the software that produced the file"""
+        match = _match_generator(text)
+        if match:
+            self.mark(f'{where} names {match[1]}', match[1])
+
+    def check_text(self, where, text, settings=False):
+        """
+        Free text; settings=True for fields front-ends write their generation
+        parameters into (PNG text, EXIF UserComment), where those decide
+        """
+        if settings and GENERATION_PARAMS.search(text):
+            self.mark(f'{where} holds generation settings (steps, sampler)', 'Stable Diffusion')
+            return
+        match = _match_generator(text)
+        if match:
+            self.hints.append(f'{where} mentions "{match[0]}" ({match[1]})')
+
+    def check_xmp(self, where, data):
+        for source_type in AI_SOURCE_TYPES:
+            if source_type in data:
+                self.mark(f'{where} DigitalSourceType is {source_type.split(b"/")[-1].decode()}')
+                break
+        tool = XMP_CREATOR_TOOL.search(data)
+        if tool:
+            self.check_tool(f'{where} CreatorTool', tool.group(1).decode('utf-8', 'replace'))
+        self.check_text(where, XMP_CREATOR_TOOL.sub(b'', data).decode('utf-8', 'replace'))
+
+    def check_c2pa(self, where, data):
+        self.c2pa = True
+        for source_type in AI_SOURCE_TYPES:
+            if source_type in data:
+                self.mark(f'{where} C2PA manifest declares {source_type.split(b"/")[-1].decode()}')
+                break
+        # claim_generator (v1) or claim_generator_info.name (v2)
+        claimed = _cbor_text_after(data, b'claim_generator')
+        info = data.find(b'claim_generator_info')
+        if claimed is None and info >= 0:
+            claimed = _cbor_text_after(data, b'\x64name', info)
+        match = _match_generator(claimed) if claimed else None
+        if match:
+            self.mark(f'{where} C2PA manifest was signed by {match[1]}', match[1])
+
+def _parse_exif(tiff, findings, where):
+    """Read the text tags of IFD0 and the Exif IFD from a TIFF block"""
+    if tiff[:2] == b'II':
+        order = '<'
+    elif tiff[:2] == b'MM':
+        order = '>'
+    else:
+        return
+    values = {}
+
+    def read_ifd(offset, depth=0):
+        if offset + 2 > len(tiff) or depth > 1:
+            return
+        (count,) = struct.unpack_from(order + 'H', tiff, offset)
+        for index in range(min(count, 256)):
+            entry = offset + 2 + index * 12
+            if entry + 12 > len(tiff):
+                return
+            tag, kind, length = struct.unpack_from(order + 'HHI', tiff, entry)
+            if tag == EXIF_IFD_POINTER:
+                read_ifd(struct.unpack_from(order + 'I', tiff, entry + 8)[0], depth + 1)
+            elif tag in EXIF_TAGS and kind in (1, 2, 7):  # BYTE, ASCII, UNDEFINED
+                start = entry + 8 if length <= 4 else struct.unpack_from(order + 'I', tiff, entry + 8)[0]
+                values[EXIF_TAGS[tag]] = tiff[start:start + length]
+
+    try:
+        read_ifd(struct.unpack_from(order + 'I', tiff, 4)[0])
+    except struct.error:
+        return
+
+    for name, raw in values.items():
+        if name == 'UserComment':
+            # 8-byte charset prefix; writers disagree on the byte order of
+            # UNICODE (UTF-16), so go by which half of the first ASCII char is zero
+            prefix, body = raw[:8], raw[8:]
+            if prefix.startswith(b'UNICODE'):
+                encoding = 'utf-16-be' if body[:1] == b'\x00' else 'utf-16-le'
+            else:
+                encoding = 'utf-8'
+            text = body.decode(encoding, 'replace')
+        else:
+            text = raw.rstrip(b'\x00').decode('utf-8', 'replace')
+        if name in ('Make', 'Model'):
+            findings.camera = ' '.join(filter(None, [findings.camera, text.strip()])) or None
+        elif name == 'Software':
+            findings.check_tool(f'{where} Software', text)
+        elif text:
+            findings.check_text(f'{where} {name}', text, settings=name == 'UserComment')
+
+def _inflate(data):
+    """
+    Decompress a zTXt/iTXt payload, producing at most MAX_TEXT_BYTES
+
+    Raises:
+        zlib.error: Corrupt, truncated, or inflating past the limit
+    """
+    inflater = zlib.decompressobj()
+    text = inflater.decompress(data, MAX_TEXT_BYTES)
+    if inflater.unconsumed_tail or not inflater.eof:
+        raise zlib.error('compressed text is truncated or larger than MAX_TEXT_BYTES')
+    return text
+
+def _scan_png(head, findings):
+    offset = 8
+    while offset + 8 <= len(head):
+        length, kind = struct.unpack_from('>I4s', head, offset)
+        data = head[offset + 8:offset + 8 + length]
+        if kind == b'IEND':
+            break
+        if kind in (b'tEXt', b'zTXt', b'iTXt'):
+            keyword, _, rest = data.partition(b'\x00')
+            keyword = keyword.decode('latin-1')
+            try:
+                if kind == b'tEXt':
+                    text = rest.decode('latin-1')
+                elif kind == b'zTXt':
+                    text = _inflate(rest[1:]).decode('latin-1')
+                else:
+                    compressed, rest = rest[0], rest[2:]
+                    _, _, rest = rest.partition(b'\x00')  # Language tag
+                    _, _, rest = rest.partition(b'\x00')  # Translated keyword
+                    text = (_inflate(rest) if compressed else rest).decode('utf-8', 'replace')
+            except (zlib.error, IndexError):  # Corrupt, cut off by the scan window or too large
+                text = ''
+            generator = PNG_TEXT_KEYWORDS.get(keyword.lower())
+            if keyword == 'XML:com.adobe.xmp':
+                findings.check_xmp('PNG XMP', text.encode('utf-8'))
+            elif generator:
+                findings.mark(f'PNG text chunk "{keyword}" ({generator} generation metadata)', generator)
+            elif keyword == 'Software':
+                findings.check_tool('PNG Software', text)
+            else:
+                findings.check_text(f'PNG text "{keyword}"', text, settings=True)
+        elif kind == b'eXIf':
+            _parse_exif(data, findings, 'PNG EXIF')
+        elif kind == b'caBX':
+            findings.check_c2pa('PNG', data)
+        offset += 12 + length  # length, type, data, CRC
+
+def _scan_jpeg(head, findings):
+    offset = 2
+    while offset + 4 <= len(head):
+        if head[offset] != 0xFF:
+            break
+        marker = head[offset + 1]
+        if marker == 0xFF:
+            offset += 1  # Fill byte
+            continue
+        if marker == 0xDA or marker == 0xD9:  # Start of scan: pixels follow
+            break
+        if 0xD0 <= marker <= 0xD7 or marker == 0x01:
+            offset += 2
+            continue
+        (length,) = struct.unpack_from('>H', head, offset + 2)
+        data = head[offset + 4:offset + 2 + length]
+        if marker == 0xE1 and data.startswith(b'Exif\x00\x00'):
+            _parse_exif(data[6:], findings, 'EXIF')
+        elif marker == 0xE1 and data.startswith(XMP_HEADER):
+            findings.check_xmp('XMP', data[len(XMP_HEADER):])
+        elif marker == 0xEB and (b'jumb' in data or b'c2pa' in data):
+            findings.check_c2pa('JPEG', data)
+        elif marker == 0xFE:
+            findings.check_text('JPEG comment', data.decode('utf-8', 'replace'))
+        offset += 2 + length
+
+def _scan_webp(head, findings):
+    offset = 12
+    while offset + 8 <= len(head):
+        kind, length = struct.unpack_from('<4sI', head, offset)
+        data = head[offset + 8:offset + 8 + length]
+        if kind == b'EXIF':
+            _parse_exif(data[6:] if data.startswith(b'Exif\x00\x00') else data, findings, 'WebP EXIF')
+        elif kind == b'XMP ':
+            findings.check_xmp('WebP XMP', data)
+        elif kind == b'C2PA':
+            findings.check_c2pa('WebP', data)
+        offset += 8 + length + (length & 1)
+
+def scan_provenance(source, limit=None):
+    """
+    Look for generator provenance in an image's headers
+
+    Args:
+        source: File path, binary file object or bytes
+        limit: Bytes to read from the start (default PROVENANCE_SCAN_BYTES)
+
+    Returns:
+        Dict with declared (True when structured markers settle it),
+        generator (name or None), evidence and hints (lists of strings),
+        c2pa and camera (Make/Model or None) when anything was found,
+        otherwise None (also when scanning is disabled)
+    """
+    limit = PROVENANCE_SCAN_BYTES if limit is None else limit
+    if limit <= 0:
+        return None
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        head = bytes(source[:limit])
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            head = f.read(limit)
+    else:
+        position = source.tell()
+        head = source.read(limit)
+        source.seek(position)
+
+    findings = _Findings()
+    try:
+        if head.startswith(b'\x89PNG\r\n\x1a\n'):
+            _scan_png(head, findings)
+        elif head.startswith(b'\xff\xd8'):
+            _scan_jpeg(head, findings)
+        elif head[:4] == b'RIFF' and head[8:12] == b'WEBP':
+            _scan_webp(head, findings)
+    except struct.error:
+        pass  # Truncated header; keep whatever was found before it
+
+    if not findings.evidence and not findings.hints:
+        return None
+    return {
+        'declared': bool(findings.evidence),
+        'generator': findings.generator,
+        'evidence': findings.evidence,
+        'hints': findings.hints,
+        'c2pa': findings.c2pa,
+        'camera': findings.camera,
+    }
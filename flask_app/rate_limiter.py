@@ -0,0 +1,205 @@
+"""
+Outbound rate limiting and monthly budget for the Sightengine API
+A token bucket plus a per-month operation counter, kept in a small SQLite file
+(API_QUOTA_DB) so every Flask worker and the Streamlit app draw from the same
+allowance. Callers reserve a token and sleep until it is due; when the wait
+would exceed max_wait, or the month's budget is spent, the call is shed with
+QuotaExceededError instead of being sent and bounced with a 429 upstream.
+
+Usage:
+    limiter = RateLimiter.from_env()
+    limiter.acquire()   # blocks for at most max_wait seconds
+"""
+import os
+import time
+import sqlite3
+import threading
+from datetime import datetime, timezone
+import requests
+
+QUOTA_DB_PATH = os.getenv(
+    'API_QUOTA_DB',
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), 'api_quota.db')
+)
+
+class QuotaExceededError(requests.exceptions.RequestException):
+    """
+    Raised without contacting the API when the call would break the limits
+
+    reason is 'rate' (retry in a moment) or 'budget' (the monthly allowance
+    is spent; retry_after points at the start of next month).
+    """
+
+    def __init__(self, reason, retry_after):
+        if reason == 'budget':
+            message = 'Monthly detection budget exhausted'
+        else:
+            message = f'Detection API rate limit reached, retry in {retry_after:.0f}s'
+        super().__init__(message)
+        self.reason = reason
+        self.retry_after = max(retry_after, 1)
+
+def _current_period(now):
+    return datetime.fromtimestamp(now, timezone.utc).strftime('%Y-%m')
+
+def _seconds_to_next_period(now):
+    current = datetime.fromtimestamp(now, timezone.utc)
+    if current.month == 12:
+        start = current.replace(year=current.year + 1, month=1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        start = current.replace(month=current.month + 1, day=1, hour=0, minute=0, second=0, microsecond=0)
+    return start.timestamp() - now
+
+class RateLimiter:
+    """
+    Token bucket shared through a SQLite file
+
+    rate tokens per second refill a bucket of `burst`; rate <= 0 disables
+    smoothing and monthly_budget <= 0 disables the budget. Reservations can
+    push the bucket negative, which queues callers in arrival order across
+    processes without any polling.
+    """
+
+    def __init__(self, path=QUOTA_DB_PATH, name='sightengine', rate=2.0, burst=5,
+                 monthly_budget=2000, max_wait=10.0):
+        self.path = path
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.monthly_budget = monthly_budget
+        self.max_wait = max_wait
+        self._initialized = False
+        self._init_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {'acquired': 0, 'throttled': 0, 'wait_seconds': 0.0,
+                       'shed_rate': 0, 'shed_budget': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Limiter configured from SIGHTENGINE_RATE_* / SIGHTENGINE_MONTHLY_BUDGET"""
+        return cls(
+            rate=float(os.getenv('SIGHTENGINE_RATE_PER_SECOND', 2)),
+            burst=float(os.getenv('SIGHTENGINE_RATE_BURST', 5)),
+            monthly_budget=int(os.getenv('SIGHTENGINE_MONTHLY_BUDGET', 2000)),
+            max_wait=float(os.getenv('SIGHTENGINE_MAX_QUEUE_WAIT', 10))
+        )
+
+    @property
+    def enabled(self):
+        return self.rate > 0 or self.monthly_budget > 0
+
+    def _connect(self):
+        connection = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        if not self._initialized:
+            with self._init_lock:
+                connection.execute("""
+                    CREATE TABLE IF NOT EXISTS api_quota (
+                        name TEXT PRIMARY KEY,
+                        tokens REAL NOT NULL,
+                        updated_at REAL NOT NULL,
+                        period TEXT NOT NULL,
+                        used INTEGER NOT NULL DEFAULT 0
+                    )
+                """)
+                self._initialized = True
+        return connection
+
+    def _count(self, key, amount=1):
+        with self._stats_lock:
+            self._stats[key] += amount
+
+    def _refill(self, row, now):
+        """Bucket level and budget use as of now, from a stored row (or a fresh bucket)"""
+        period = _current_period(now)
+        if row is None:
+            return float(self.burst), period, 0
+        tokens = row['tokens']
+        if self.rate > 0:
+            tokens = min(float(self.burst), tokens + (now - row['updated_at']) * self.rate)
+        used = row['used'] if row['period'] == period else 0
+        return tokens, period, used
+
+    def acquire(self, cost=1, max_wait=None):
+        """
+        Reserve `cost` operations, sleeping until the bucket allows them
+
+        Returns:
+            Seconds spent waiting
+
+        Raises:
+            QuotaExceededError: The wait would exceed max_wait or the monthly
+                budget has no room left
+        """
+        if not self.enabled:
+            return 0.0
+        max_wait = self.max_wait if max_wait is None else max_wait
+
+        now = time.time()
+        connection = self._connect()
+        try:
+            connection.execute("BEGIN IMMEDIATE")
+            row = connection.execute(
+                "SELECT tokens, updated_at, period, used FROM api_quota WHERE name = ?",
+                (self.name,)
+            ).fetchone()
+            tokens, period, used = self._refill(row, now)
+
+            if self.monthly_budget > 0 and used + cost > self.monthly_budget:
+                connection.execute("ROLLBACK")
+                self._count('shed_budget')
+                raise QuotaExceededError('budget', _seconds_to_next_period(now))
+
+            wait = max(0.0, (cost - tokens) / self.rate) if self.rate > 0 else 0.0
+            if wait > max_wait:
+                connection.execute("ROLLBACK")
+                self._count('shed_rate')
+                raise QuotaExceededError('rate', wait - max_wait)
+
+            connection.execute(
+                "INSERT OR REPLACE INTO api_quota (name, tokens, updated_at, period, used) VALUES (?, ?, ?, ?, ?)",
+                (self.name, tokens - cost if self.rate > 0 else tokens, now, period, used + cost)
+            )
+            connection.execute("COMMIT")
+        finally:
+            connection.close()
+
+        self._count('acquired')
+        if wait > 0:
+            self._count('throttled')
+            self._count('wait_seconds', wait)
+            time.sleep(wait)
+        return wait
+
+    def get_status(self):
+        """Remaining budget and current throttle wait, plus this process's counters"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['wait_seconds'] = round(stats['wait_seconds'], 3)
+        stats.update(rate_per_second=self.rate, burst=self.burst, monthly_budget=self.monthly_budget)
+        if not self.enabled:
+            return stats
+
+        now = time.time()
+        try:
+            connection = self._connect()
+            try:
+                row = connection.execute(
+                    "SELECT tokens, updated_at, period, used FROM api_quota WHERE name = ?",
+                    (self.name,)
+                ).fetchone()
+            finally:
+                connection.close()
+        except sqlite3.Error as e:
+            print(f"Quota status error: {e}")
+            return stats
+
+        tokens, period, used = self._refill(row, now)
+        stats['period'] = period
+        stats['used'] = used
+        stats['remaining'] = max(0, self.monthly_budget - used) if self.monthly_budget > 0 else None
+        stats['resets_in'] = round(_seconds_to_next_period(now))
+        stats['throttle_wait'] = round(max(0.0, (1 - tokens) / self.rate), 3) if self.rate > 0 else 0.0
+        return stats
@@ -1,11 +1,10 @@
 """
 Admin upload routes - File upload handling for manuals, posters, and case images
 """
-import os
-import time
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
 from database import execute_query
+from content_cache import invalidate_list
+from upload_store import save_upload, release_upload
 from routes.auth import admin_required
 
 admin_bp = Blueprint('admin', __name__)
@@ -39,30 +38,24 @@ def upload_manual(current_user):
     if not allowed_file(file.filename, 'pdf'):
         return jsonify({'message': 'Only PDF files allowed'}), 400
     
-    # Save file
-    filename = secure_filename(file.filename)
-    timestamp = str(int(time.time() * 1000))
-    filename = f"{timestamp}_{filename}"
-    
-    manual_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'manuals')
-    os.makedirs(manual_dir, exist_ok=True)
-    upload_path = os.path.join(manual_dir, filename)
-    file.save(upload_path)
+    # Save file (identical files are stored once)
+    file_path, _, _ = save_upload(file, current_app.config['UPLOAD_FOLDER'])
     
     # Save to database
-    file_path = f"/uploads/manuals/{filename}"
     manual_id = execute_query(
         "INSERT INTO user_manual (title, file_path) VALUES (%s, %s)",
         (title, file_path)
     )
     
     if manual_id:
+        invalidate_list('user_manual')
         return jsonify({
             'message': 'Manual uploaded successfully',
             'id': manual_id,
             'file_path': file_path
         }), 201
     else:
+        release_upload(file_path)
         return jsonify({'message': 'Failed to save manual'}), 500
 
 @admin_bp.route('/scam-tips', methods=['POST'])
@@ -84,30 +77,24 @@ def upload_scam_tip(current_user):
     if not allowed_file(file.filename, 'image'):
         return jsonify({'message': 'Only image files allowed'}), 400
     
-    # Save file
-    filename = secure_filename(file.filename)
-    timestamp = str(int(time.time() * 1000))
-    filename = f"{timestamp}_{filename}"
-    
-    poster_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'posters')
-    os.makedirs(poster_dir, exist_ok=True)
-    upload_path = os.path.join(poster_dir, filename)
-    file.save(upload_path)
+    # Save file (identical files are stored once)
+    image_path, _, _ = save_upload(file, current_app.config['UPLOAD_FOLDER'])
     
     # Save to database
-    image_path = f"/uploads/posters/{filename}"
     tip_id = execute_query(
         "INSERT INTO scam_tips (title, image_path) VALUES (%s, %s)",
         (title, image_path)
     )
     
     if tip_id:
+        invalidate_list('scam_tips')
         return jsonify({
             'message': 'Scam tip uploaded successfully',
             'id': tip_id,
             'image_path': image_path
         }), 201
     else:
+        release_upload(image_path)
         return jsonify({'message': 'Failed to save scam tip'}), 500
 
 @admin_bp.route('/scam-cases', methods=['POST'])
@@ -130,29 +117,23 @@ def upload_scam_case(current_user):
     if not allowed_file(file.filename, 'image'):
         return jsonify({'message': 'Only image files allowed'}), 400
     
-    # Save file
-    filename = secure_filename(file.filename)
-    timestamp = str(int(time.time() * 1000))
-    filename = f"{timestamp}_{filename}"
-    
-    cases_dir = os.path.join(current_app.config['UPLOAD_FOLDER'], 'cases')
-    os.makedirs(cases_dir, exist_ok=True)
-    upload_path = os.path.join(cases_dir, filename)
-    file.save(upload_path)
+    # Save file (identical files are stored once)
+    image_path, _, _ = save_upload(file, current_app.config['UPLOAD_FOLDER'])
     
     # Save to database
-    image_path = f"/uploads/cases/{filename}"
     case_id = execute_query(
         "INSERT INTO malaysia_cases (headline, image_path, news_link) VALUES (%s, %s, %s)",
         (headline, image_path, news_link)
     )
     
     if case_id:
+        invalidate_list('malaysia_cases')
         return jsonify({
             'message': 'Scam case uploaded successfully',
             'id': case_id,
             'image_path': image_path
         }), 201
     else:
+        release_upload(image_path)
         return jsonify({'message': 'Failed to save scam case'}), 500
 
@@ -1,29 +1,223 @@
 """
-AI Image Detection routes - Using Sightengine API
+AI Image Detection routes - Using Sightengine API (or a local engine, see detectors.py)
 Replaces reverse image search with AI-generated image detection
 """
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
 from flask import Blueprint, request, jsonify, current_app
-from werkzeug.utils import secure_filename
 import requests
 from datetime import datetime
-from database import execute_query
-from routes.auth import token_required
+from database import execute_query, execute_many
+from detection_jobs import enqueue_job, get_job, QueueFullError
+from detection_cache import lookup_detection, peek_detection, store_detection
+from multipart_stream import hash_file
+from sightengine_client import SightengineClient, DetectionAPIError, CircuitOpenError, QuotaExceededError
+from detectors import get_detector, decide_file
+from phash_index import compute_dhash
+from provenance import scan_provenance
+from verdicts import verdict_for_score, verdict_for_provenance, with_metadata_hints, expand_row
+from image_preprocess import prepare_for_upload
+from upload_store import save_upload, release_upload
+from single_flight import SingleFlight
+from routes.auth import token_required, resolve_auth
 
 ai_detection_bp = Blueprint('ai_detection', __name__)
 
 # Sightengine API Configuration
-API_URL = "https://api.sightengine.com/1.0/check.json"
 API_USER = os.getenv("SIGHTENGINE_API_USER", "")
 API_SECRET = os.getenv("SIGHTENGINE_API_SECRET", "")
 
+# Detection engine chosen by DETECTION_ENGINE (see detectors.py); the default
+# Sightengine client keeps pooled connections, retries and a circuit breaker
+detector = get_detector()
+
+# Concurrent uploads of the same image share one upstream call (see single_flight.py)
+detection_flight = SingleFlight()
+
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'webp'}
 
+# Batch detection limits
+BATCH_MAX_FILES = int(os.getenv('DETECTION_BATCH_MAX_FILES', 20))
+BATCH_CONCURRENCY = int(os.getenv('DETECTION_BATCH_CONCURRENCY', 4))
+
+# Detection history page sizes
+HISTORY_PAGE_SIZE = 50
+HISTORY_MAX_PAGE_SIZE = 200
+
+# Shared by the single and batch endpoints
+INSERT_DETECTION_SQL = """INSERT INTO ai_detections 
+   (filename, image_path, is_ai_generated, confidence_percent, 
+    probability_score, likely_generator, explanation_id, explanation, user_id, 
+    detection_tier) 
+   VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s)"""
+
+_batch_executor = None
+_batch_executor_lock = threading.Lock()
+
 def allowed_file(filename):
     """Check if file extension is allowed"""
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+def call_detector(upload_path, timeout=None):
+    """
+    Score an image on disk with the configured detection engine
+    
+    Images that go to the remote API are downscaled first when large (see
+    image_preprocess); otherwise the multipart body is streamed from the
+    file, so memory use stays flat regardless of image size.
+    
+    Returns:
+        Tuple of (ai_generated score 0.0-1.0, tier, preprocessing stats or
+        None) where tier names the engine that decided (see detectors.py)
+        
+    Raises:
+        DetectionAPIError: API responded with a failure status, or the
+            local engine could not decode the image
+        CircuitOpenError: The API is failing and calls are short-circuited
+        QuotaExceededError: Rate limit or monthly budget would be exceeded
+        requests.exceptions.RequestException: Network failure or timeout
+    """
+    preprocessing = None
+    
+    def prepare():
+        nonlocal preprocessing
+        try:
+            payload, preprocessing = prepare_for_upload(upload_path, os.path.getsize(upload_path))
+        except Exception:
+            return None  # Let the API judge files Pillow cannot decode
+        return payload
+    
+    score, tier = decide_file(detector, upload_path, prepare, read_timeout=timeout)
+    return score, tier, preprocessing
+
+def cached_verdict(entry):
+    """Verdict for a detection_cache entry, rebuilt from its score (only upstream verdicts are cached)"""
+    return verdict_for_score(entry['score'], SightengineClient.name)
+
+def detect_image_file(upload_path, digest=None, timeout=None):
+    """
+    Score a saved image, reusing cached verdicts for identical or near-identical images
+    
+    Generator markers in the file's headers (see provenance.py) decide the
+    verdict outright, before any decoding, cache lookup or engine call;
+    generator names in free-text metadata are only added to the explanation.
+    
+    The upload was hashed while it was saved, so the file is read again only
+    for its headers (provenance), a reduced-scale decode (phash) and, for
+    images that go upstream, the streamed request body. It is not teed to
+    the API during the save: the cache lookup that decides whether to call
+    upstream needs the complete digest.
+    
+    Returns:
+        Tuple of (verdict, cache_status, preprocessing) where verdict holds
+        score, is_ai_generated, likely_generator, explanation and tier (the
+        engine that decided), and preprocessing describes the upload sent upstream (None on a cache hit).
+        cache_status is 'coalesced' when a concurrent request for the same
+        image made the upstream call, and None for metadata verdicts
+    """
+    report = scan_provenance(upload_path)
+    if report and report['declared']:
+        return verdict_for_provenance(report), None, None
+    
+    verdict, cache_status, preprocessing = _score_image(upload_path, digest, timeout)
+    if report:
+        verdict = with_metadata_hints(verdict, report['hints'])
+    return verdict, cache_status, preprocessing
+
+def _score_image(upload_path, digest, timeout):
+    """detect_image_file() past the provenance scan: verdict cache, then the engine"""
+    digest = digest or hash_file(upload_path)
+    try:
+        with Image.open(upload_path) as image:
+            phash = compute_dhash(image)
+    except Exception:
+        phash = None  # Undecodable images still go to the API by exact hash only
+    
+    # Only upstream verdicts are cached, so a hit was decided upstream
+    cached, cache_status = lookup_detection(digest, phash)
+    if cached:
+        return cached_verdict(cached), cache_status, None
+    
+    if not detector.remote:
+        # Local scoring costs less than coordinating with other requests
+        score, tier, _ = call_detector(upload_path, timeout=timeout)
+        return verdict_for_score(score, tier), cache_status, None
+    
+    def score_and_store():
+        # A caller that just finished this image may have stored it after our lookup
+        stored = peek_detection(digest)
+        if stored:
+            return cached_verdict(stored), 'coalesced', None
+        score, tier, preprocessing = call_detector(upload_path, timeout=timeout)
+        verdict = verdict_for_score(score, tier)
+        if get_detector(tier).remote:
+            # Local cascade decisions stay out of the cache so they never stand in for upstream ones;
+            # hits rebuild the explanation from the score, so none is stored
+            store_detection(digest, round(score, 4), verdict['is_ai_generated'],
+                            verdict['likely_generator'], None, phash)
+        return verdict, cache_status, preprocessing
+    
+    def published():
+        stored = peek_detection(digest)
+        return (cached_verdict(stored), 'coalesced', None) if stored else None
+    
+    outcome, shared = detection_flight.do(digest, score_and_store, check=published)
+    if shared:
+        return outcome[0], 'coalesced', None  # Another request paid for the upstream call
+    return outcome
+
+def quota_message(error):
+    """User-facing text for a call shed by the rate limiter"""
+    if error.reason == 'budget':
+        return 'The monthly detection quota has been used up. Please try again next month.'
+    return 'Too many detections right now. Please try again shortly.'
+
+def build_detection_row(filename, image_path, verdict, user_id):
+    """Parameters for one ai_detections INSERT (see INSERT_DETECTION_SQL)"""
+    score = verdict['score']
+    return (filename, image_path, verdict['is_ai_generated'],
+            round(score * 100, 2), round(score, 4),
+            verdict['likely_generator'], verdict['explanation_id'],
+            verdict['explanation_detail'], user_id, verdict['tier'])
+
+def build_detection_result(filename, image_path, verdict, cache_status, preprocessing=None):
+    """Response JSON for one detected image"""
+    score = verdict['score']
+    result = {
+        "is_ai_generated": verdict['is_ai_generated'],
+        "confidence_percent": round(score * 100, 2),
+        "probability_score": round(score, 4),
+        "explanation": verdict['explanation'],
+        "likely_generator": verdict['likely_generator'],
+        "image_path": image_path,
+        "filename": filename,
+        "cache": cache_status,
+        "detection_tier": verdict['tier']
+    }
+    if preprocessing:
+        result["preprocessing"] = preprocessing
+    return result
+
+def get_optional_user_id():
+    """Return the user id from a Bearer token, or None for anonymous requests"""
+    current_user, _ = resolve_auth()  # Invalid or missing tokens just mean anonymous
+    return current_user.get('id') if current_user else None
+
+def _get_batch_executor():
+    """Shared pool bounding concurrent Sightengine calls across batch requests"""
+    global _batch_executor
+    if _batch_executor is None:
+        with _batch_executor_lock:
+            if _batch_executor is None:
+                _batch_executor = ThreadPoolExecutor(
+                    max_workers=BATCH_CONCURRENCY,
+                    thread_name_prefix='detect-batch'
+                )
+    return _batch_executor
+
 @ai_detection_bp.route('/detect-ai-image', methods=['POST'])
 def detect_ai_image():
     """
@@ -42,149 +236,45 @@ def detect_ai_image():
         return jsonify({'message': 'Invalid file type. Allowed: PNG, JPG, JPEG, WebP'}), 400
     
     # Check API credentials
-    if not API_USER or not API_SECRET:
+    if detector.remote and (not API_USER or not API_SECRET):
         return jsonify({
             'message': 'API credentials not configured',
             'error': 'Sightengine API credentials missing'
         }), 500
     
     try:
-        # Save uploaded file temporarily
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-        filename = f"{timestamp}_{filename}"
-        
-        upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 'images', filename)
-        file.save(upload_path)
-        
-        # Read file for API request
-        with open(upload_path, 'rb') as image_file:
-            files = {"media": image_file.read()}
-        
-        # Make API call to Sightengine
-        data = {
-            "models": "genai",
-            "api_user": API_USER,
-            "api_secret": API_SECRET
-        }
-        
-        response = requests.post(API_URL, files=files, data=data, timeout=30)
-        result = response.json()
-        
-        # Check for API errors
-        if result.get("status") != "success":
-            error_code = result.get("error", {}).get("code", "unknown")
-            error_msg = result.get("error", {}).get("message", "Unknown error")
-            return jsonify({
-                'message': f'API Error ({error_code}): {error_msg}',
-                'error': error_msg
-            }), 400
-        
-        # Extract AI generation score
-        score = result["type"]["ai_generated"]
-        confidence_percent = score * 100
-        probability_score = score
-        
-        # Determine if AI-generated
-        is_ai = score > 0.5
-        
-        # Determine likely generator
-        if is_ai:
-            if score > 0.9:
-                likely_generator = "Midjourney/DALL-E (High Confidence)"
-            elif score > 0.75:
-                likely_generator = "Stable Diffusion/Flux"
-            else:
-                likely_generator = "Unknown AI Generator"
-        else:
-            likely_generator = "Real Photo"
-        
-        # Generate explanation
-        explanation_points = []
-        if is_ai:
-            if score > 0.9:
-                explanation_points.extend([
-                    "• Very high AI probability detected",
-                    "• Strong diffusion model patterns identified",
-                    "• Unnatural smoothness in textures"
-                ])
-            elif score > 0.75:
-                explanation_points.extend([
-                    "• High AI probability detected",
-                    "• Moderate diffusion patterns present"
-                ])
-            else:
-                explanation_points.extend([
-                    "• Moderate AI probability detected",
-                    "• Some synthetic artifacts found"
-                ])
-            
-            explanation_points.extend([
-                "• Possible anatomical inconsistencies",
-                "• Lighting/shadow patterns suggest generation"
-            ])
-        else:
-            if score < 0.1:
-                explanation_points.extend([
-                    "• Very low AI probability",
-                    "• Natural grain and imperfections present",
-                    "• Organic asymmetry detected"
-                ])
-            elif score < 0.3:
-                explanation_points.extend([
-                    "• Low AI probability",
-                    "• Mostly natural characteristics"
-                ])
-            else:
-                explanation_points.extend([
-                    "• Borderline case",
-                    "• May be edited or filtered real photo"
-                ])
-            
-            explanation_points.extend([
-                "• Realistic depth-of-field",
-                "• Natural lighting characteristics"
-            ])
-        
-        explanation = "\n".join(explanation_points)
-        
-        # Create response JSON
-        detection_result = {
-            "is_ai_generated": is_ai,
-            "confidence_percent": round(confidence_percent, 2),
-            "probability_score": round(probability_score, 4),
-            "explanation": explanation,
-            "likely_generator": likely_generator,
-            "image_path": f"/uploads/images/{filename}",
-            "filename": file.filename
-        }
+        image_path, upload_path, digest = save_upload(file, current_app.config['UPLOAD_FOLDER'])
+        try:
+            verdict, cache_status, preprocessing = detect_image_file(upload_path, digest)
+        except Exception:
+            release_upload(image_path)  # No detection row will point at it
+            raise
         
-        # Save detection result to database (optional - requires user to be logged in)
-        auth_header = request.headers.get('Authorization', '')
-        user_id = None
-        
-        if auth_header.startswith('Bearer '):
-            try:
-                import jwt
-                token = auth_header.split(' ')[1]
-                decoded = jwt.decode(token, os.getenv('SECRET_KEY', 'your-secret-key-change-this'), algorithms=['HS256'])
-                user_id = decoded.get('id')
-            except:
-                pass  # User not logged in or invalid token
+        detection_result = build_detection_result(
+            file.filename, image_path, verdict, cache_status, preprocessing
+        )
         
-        # Save to database
+        # Save detection result to database (user_id only when logged in)
         execute_query(
-            """INSERT INTO ai_detections 
-               (filename, image_path, is_ai_generated, confidence_percent, 
-                probability_score, likely_generator, explanation, user_id) 
-               VALUES (%s, %s, %s, %s, %s, %s, %s, %s)""",
-            (file.filename, f"/uploads/images/{filename}", is_ai, 
-             round(confidence_percent, 2), round(probability_score, 4),
-             likely_generator, explanation, user_id)
+            INSERT_DETECTION_SQL,
+            build_detection_row(file.filename, image_path, verdict, get_optional_user_id())
         )
         
         return jsonify(detection_result), 200
         
+    except DetectionAPIError as e:
+        return jsonify({
+            'message': f'API Error ({e.code}): {e.message}',
+            'error': e.message
+        }), 400
+    except QuotaExceededError as e:
+        response = jsonify({'message': quota_message(e)})
+        response.headers['Retry-After'] = str(int(e.retry_after))
+        return response, 429
+    except CircuitOpenError as e:
+        response = jsonify({'message': 'Detection service is temporarily unavailable. Please try again shortly.'})
+        response.headers['Retry-After'] = str(int(e.retry_after))
+        return response, 503
     except requests.exceptions.Timeout:
         return jsonify({'message': 'Request timed out. Please try again.'}), 504
     except requests.exceptions.RequestException as e:
@@ -192,24 +282,253 @@ def detect_ai_image():
     except Exception as e:
         return jsonify({'message': f'Error: {str(e)}'}), 500
 
+@ai_detection_bp.route('/detect-ai-images', methods=['POST'])
+def detect_ai_images():
+    """
+    Detect AI generation for several images in one multipart request
+    Identical files are scored once; results come back in upload order
+    """
+    files = request.files.getlist('images')
+    
+    if not files:
+        return jsonify({'message': 'No image files provided'}), 400
+    
+    if len(files) > BATCH_MAX_FILES:
+        return jsonify({'message': f'Too many files. Maximum per request: {BATCH_MAX_FILES}'}), 400
+    
+    # Check API credentials
+    if detector.remote and (not API_USER or not API_SECRET):
+        return jsonify({
+            'message': 'API credentials not configured',
+            'error': 'Sightengine API credentials missing'
+        }), 500
+    
+    # The blob store keeps one copy per distinct image; remember which inputs share it
+    items = []
+    uploads = {}
+    for file in files:
+        if file.filename == '' or not allowed_file(file.filename):
+            items.append((file.filename, None, 'Invalid file type. Allowed: PNG, JPG, JPEG, WebP'))
+            continue
+        
+        try:
+            image_path, upload_path, digest = save_upload(file, current_app.config['UPLOAD_FOLDER'])
+        except Exception as e:
+            items.append((file.filename, None, f'Error: {str(e)}'))  # Fails this file, not the batch
+            continue
+        uploads.setdefault(digest, (image_path, upload_path))
+        items.append((file.filename, digest, None))
+    
+    # Fan the distinct images out over the shared bounded pool
+    executor = _get_batch_executor()
+    futures = {
+        digest: executor.submit(detect_image_file, upload_path, digest)
+        for digest, (image_path, upload_path) in uploads.items()
+    }
+    
+    outcomes = {}
+    for digest, future in futures.items():
+        try:
+            outcomes[digest] = future.result()
+        except DetectionAPIError as e:
+            outcomes[digest] = f'API Error ({e.code}): {e.message}'
+        except QuotaExceededError as e:
+            outcomes[digest] = quota_message(e)
+        except CircuitOpenError:
+            outcomes[digest] = 'Detection service is temporarily unavailable'
+        except requests.exceptions.Timeout:
+            outcomes[digest] = 'Request timed out'
+        except requests.exceptions.RequestException as e:
+            outcomes[digest] = f'Network error: {str(e)}'
+        except Exception as e:
+            outcomes[digest] = f'Error: {str(e)}'
+    
+    user_id = get_optional_user_id()
+    results = []
+    rows = []
+    for filename, digest, error in items:
+        if digest is None:
+            results.append({'filename': filename, 'error': error})
+            continue
+        
+        outcome = outcomes[digest]
+        if isinstance(outcome, str):
+            release_upload(uploads[digest][0])
+            results.append({'filename': filename, 'error': outcome})
+            continue
+        
+        verdict, cache_status, preprocessing = outcome
+        image_path = uploads[digest][0]
+        results.append(build_detection_result(filename, image_path, verdict, cache_status, preprocessing))
+        rows.append(build_detection_row(filename, image_path, verdict, user_id))
+    
+    # One multi-row INSERT for the whole batch
+    if rows:
+        execute_many(INSERT_DETECTION_SQL, rows)
+    
+    return jsonify({'results': results}), 200
+
+def run_detection_job(job, timeout):
+    """Background worker entry point for a queued detection job"""
+    try:
+        verdict, cache_status, preprocessing = detect_image_file(job['file_path'], timeout=timeout)
+    except QuotaExceededError as e:
+        if e.reason == 'rate':
+            # Shed by the rate limiter: run again once tokens are back, without spending an attempt
+            e.defer = e.retry_after
+        raise  # A spent monthly budget will not recover on retry
+    except CircuitOpenError as e:
+        # Upstream is known to be down: wait out the breaker instead of spending attempts on it
+        e.defer = e.retry_after
+        raise
+    except requests.exceptions.RequestException as e:
+        e.retryable = True  # Network failures are worth another attempt
+        raise
+    
+    execute_query(
+        INSERT_DETECTION_SQL,
+        build_detection_row(job['filename'], job['image_path'], verdict, job['user_id'])
+    )
+    
+    return build_detection_result(job['filename'], job['image_path'], verdict, cache_status, preprocessing)
+
+def release_job_upload(job):
+    """Job queue failure hook: no detection row will ever reference the job's upload"""
+    release_upload(job['image_path'])
+
+@ai_detection_bp.route('/detection-jobs', methods=['POST'])
+def create_detection_job():
+    """
+    Queue an uploaded image for detection and return immediately
+    Poll GET /detection-jobs/<job_id> for the result
+    """
+    if 'image' not in request.files:
+        return jsonify({'message': 'No image file provided'}), 400
+    
+    file = request.files['image']
+    
+    if file.filename == '':
+        return jsonify({'message': 'No file selected'}), 400
+    
+    if not allowed_file(file.filename):
+        return jsonify({'message': 'Invalid file type. Allowed: PNG, JPG, JPEG, WebP'}), 400
+    
+    # Check API credentials
+    if detector.remote and (not API_USER or not API_SECRET):
+        return jsonify({
+            'message': 'API credentials not configured',
+            'error': 'Sightengine API credentials missing'
+        }), 500
+    
+    try:
+        image_path, upload_path, _ = save_upload(file, current_app.config['UPLOAD_FOLDER'])
+    except Exception as e:
+        return jsonify({'message': f'Error: {str(e)}'}), 500
+    
+    try:
+        job_id = enqueue_job(file.filename, image_path, upload_path, get_optional_user_id())
+    except QueueFullError as e:
+        release_upload(image_path)
+        return jsonify({'message': str(e)}), 503
+    
+    return jsonify({
+        'job_id': job_id,
+        'status': 'queued',
+        'status_url': f'/api/detection-jobs/{job_id}'
+    }), 202
+
+@ai_detection_bp.route('/detection-jobs/<job_id>', methods=['GET'])
+def get_detection_job(job_id):
+    """Get the status, and once finished the result, of a detection job"""
+    job = get_job(job_id)
+    
+    if not job:
+        return jsonify({'message': 'Job not found'}), 404
+    
+    response = {
+        'job_id': job['id'],
+        'status': job['status'],
+        'filename': job['filename'],
+        'created_at': job['created_at'],
+        'finished_at': job['finished_at']
+    }
+    if job['status'] == 'done':
+        response['result'] = job['result']
+    elif job['status'] == 'failed':
+        response['error'] = job['error']
+    
+    return jsonify(response), 200
+
+def _format_cursor(row):
+    """Encode a history row position as '<created_at>,<id>'"""
+    created_at = row['created_at']
+    if isinstance(created_at, datetime):
+        created_at = created_at.strftime("%Y-%m-%d %H:%M:%S")
+    return f"{created_at},{row['id']}"
+
+def _parse_cursor(cursor):
+    """Decode a '<created_at>,<id>' cursor, or return None if malformed"""
+    created_at, _, row_id = cursor.rpartition(',')
+    try:
+        return datetime.strptime(created_at, "%Y-%m-%d %H:%M:%S").strftime("%Y-%m-%d %H:%M:%S"), int(row_id)
+    except ValueError:
+        return None
+
 @ai_detection_bp.route('/detection-history', methods=['GET'])
 @token_required
 def get_detection_history(current_user):
-    """Get AI detection history for logged-in user"""
+    """
+    Get AI detection history for logged-in user, newest first
+    
+    Query params:
+        limit: Page size (default 50, max HISTORY_MAX_PAGE_SIZE)
+        before: Cursor from the previous page's X-Next-Cursor header
+    """
     user_id = current_user.get('id')
     
-    history = execute_query(
-        """SELECT id, filename, image_path, is_ai_generated, 
-                  confidence_percent, likely_generator, created_at 
-           FROM ai_detections 
-           WHERE user_id = %s 
-           ORDER BY created_at DESC 
-           LIMIT 50""",
-        (user_id,),
-        fetch_all=True
-    )
+    try:
+        limit = min(max(int(request.args.get('limit', HISTORY_PAGE_SIZE)), 1), HISTORY_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'message': 'limit must be an integer'}), 400
+    
+    # Keyset pagination: seek past the last row seen instead of using OFFSET,
+    # so every page is a short range scan on idx_ai_detections_user_created.
+    # The predicate is spelled out rather than (created_at, id) < (%s, %s):
+    # MySQL only uses user_id from the index for a row comparison
+    before = request.args.get('before')
+    if before:
+        position = _parse_cursor(before)
+        if not position:
+            return jsonify({'message': 'Invalid cursor. Expected before=<created_at>,<id>'}), 400
+        history = execute_query(
+            """SELECT id, filename, image_path, is_ai_generated, 
+                      confidence_percent, likely_generator, created_at 
+               FROM ai_detections 
+               WHERE user_id = %s 
+                 AND (created_at < %s OR (created_at = %s AND id < %s)) 
+               ORDER BY created_at DESC, id DESC 
+               LIMIT %s""",
+            (user_id, position[0], position[0], position[1], limit + 1),
+            fetch_all=True
+        )
+    else:
+        history = execute_query(
+            """SELECT id, filename, image_path, is_ai_generated, 
+                      confidence_percent, likely_generator, created_at 
+               FROM ai_detections 
+               WHERE user_id = %s 
+               ORDER BY created_at DESC, id DESC 
+               LIMIT %s""",
+            (user_id, limit + 1),
+            fetch_all=True
+        )
+    
+    history = history or []
+    response = jsonify(history[:limit])
+    if len(history) > limit:
+        response.headers['X-Next-Cursor'] = _format_cursor(history[limit - 1])
     
-    return jsonify(history or []), 200
+    return response, 200
 
 @ai_detection_bp.route('/detection/<int:detection_id>', methods=['GET'])
 @token_required
@@ -227,4 +546,4 @@ def get_detection_detail(current_user, detection_id):
     if not detection:
         return jsonify({'message': 'Detection not found'}), 404
     
-    return jsonify(detection), 200
+    return jsonify(expand_row(detection)), 200
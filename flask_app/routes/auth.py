@@ -3,11 +3,15 @@ Authentication routes - Register and Login
 Matches Node.js auth.js functionality with JWT and bcrypt
 """
 import os
-from flask import Blueprint, request, jsonify
-import bcrypt
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from flask import Blueprint, request, jsonify, g
 import jwt
 from datetime import datetime, timedelta
 from database import execute_query
+from password_hashing import hash_password, check_password, needs_rehash, HashingBusyError
 from functools import wraps
 
 auth_bp = Blueprint('auth', __name__)
@@ -15,30 +19,88 @@ auth_bp = Blueprint('auth', __name__)
 SECRET_KEY = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 REG_SECRET = os.getenv('REG_SECRET', 'replace_with_strong_reg_secret')
 
+# Verified token payloads, keyed by SHA-256 of the token and kept until the token expires
+TOKEN_CACHE_MAX_ENTRIES = int(os.getenv('TOKEN_CACHE_MAX_ENTRIES', 10000))
+_token_cache = OrderedDict()
+_token_cache_lock = threading.Lock()
+_token_stats = {'hits': 0, 'misses': 0}
+
+def busy_response(error):
+    """429 for requests turned away by the password hashing pool"""
+    response = jsonify({'message': str(error)})
+    response.headers['Retry-After'] = str(error.retry_after)
+    return response, 429
+
+def decode_token(token):
+    """
+    Verify a JWT and return its payload, reusing earlier verifications
+    
+    Raises:
+        jwt.ExpiredSignatureError, jwt.InvalidTokenError
+    """
+    key = hashlib.sha256(token.encode('utf-8')).digest()
+    now = time.time()
+    with _token_cache_lock:
+        entry = _token_cache.get(key)
+        if entry and entry[1] > now:
+            _token_cache.move_to_end(key)
+            _token_stats['hits'] += 1
+            return dict(entry[0])
+        _token_stats['misses'] += 1
+    
+    data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
+    
+    # Tokens without an expiry are verified every time
+    if 'exp' in data:
+        with _token_cache_lock:
+            _token_cache[key] = (data, float(data['exp']))
+            _token_cache.move_to_end(key)
+            while len(_token_cache) > TOKEN_CACHE_MAX_ENTRIES:
+                _token_cache.popitem(last=False)
+    return dict(data)
+
+def _resolve_auth():
+    if 'Authorization' not in request.headers:
+        return None, 'Token is missing'
+    
+    try:
+        token = request.headers['Authorization'].split(' ')[1]  # Bearer <token>
+    except IndexError:
+        return None, 'Invalid token format'
+    
+    if not token:
+        return None, 'Token is missing'
+    
+    try:
+        return decode_token(token), None
+    except jwt.ExpiredSignatureError:
+        return None, 'Token has expired'
+    except jwt.InvalidTokenError:
+        return None, 'Invalid token'
+
+def resolve_auth():
+    """
+    Resolve the request's bearer token, once per request
+    
+    Returns:
+        Tuple of (token payload, error message); exactly one is None
+    """
+    if 'auth' not in g:
+        g.auth = _resolve_auth()
+    return g.auth
+
+def get_token_cache_stats():
+    """Return verified-token cache counters for this process"""
+    with _token_cache_lock:
+        return dict(_token_stats, entries=len(_token_cache))
+
 def token_required(f):
     """Decorator for protected routes"""
     @wraps(f)
     def decorated(*args, **kwargs):
-        token = None
-        
-        # Get token from header
-        if 'Authorization' in request.headers:
-            auth_header = request.headers['Authorization']
-            try:
-                token = auth_header.split(' ')[1]  # Bearer <token>
-            except IndexError:
-                return jsonify({'message': 'Invalid token format'}), 401
-        
-        if not token:
-            return jsonify({'message': 'Token is missing'}), 401
-        
-        try:
-            data = jwt.decode(token, SECRET_KEY, algorithms=['HS256'])
-            current_user = data
-        except jwt.ExpiredSignatureError:
-            return jsonify({'message': 'Token has expired'}), 401
-        except jwt.InvalidTokenError:
-            return jsonify({'message': 'Invalid token'}), 401
+        current_user, error = resolve_auth()
+        if error:
+            return jsonify({'message': error}), 401
         
         return f(current_user, *args, **kwargs)
     
@@ -89,7 +151,10 @@ def register():
         final_role = 'admin'
     
     # Hash password
-    password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+    try:
+        password_hash = hash_password(password)
+    except HashingBusyError as e:
+        return busy_response(e)
     
     # Insert new user
     user_id = execute_query(
@@ -130,14 +195,24 @@ def login():
         return jsonify({'message': 'Invalid credentials'}), 401
     
     # Verify password
-    password_match = bcrypt.checkpw(
-        password.encode('utf-8'),
-        user['password_hash'].encode('utf-8')
-    )
+    try:
+        password_match = check_password(password, user['password_hash'])
+    except HashingBusyError as e:
+        return busy_response(e)
     
     if not password_match:
         return jsonify({'message': 'Invalid credentials'}), 401
     
+    # Upgrade hashes made with a different BCRYPT_ROUNDS while we have the password
+    if needs_rehash(user['password_hash']):
+        try:
+            execute_query(
+                "UPDATE users SET password_hash = %s WHERE id = %s",
+                (hash_password(password), user['id'])
+            )
+        except HashingBusyError:
+            pass  # Try again on a later login
+    
     # Create JWT token
     payload = {
         'id': user['id'],
@@ -1,40 +1,79 @@
 """
 Content management routes - CRUD operations for user manuals, scam tips, and cases
 """
-from flask import Blueprint, request, jsonify
+import os
+from datetime import datetime, timezone
+from flask import Blueprint, Response, request, jsonify, current_app
 from database import execute_query
+from content_cache import get_list, invalidate_list
+from upload_store import retain_upload, release_upload
 from routes.auth import token_required, admin_required
 
 content_bp = Blueprint('content', __name__)
 
+# Cache-Control for the public lists; browsers and CDNs revalidate with the
+# weak ETag, which costs one version lookup instead of the list query
+CONTENT_CACHE_CONTROL = os.getenv('CONTENT_CACHE_CONTROL', 'public, max-age=30')
+
+def versioned_list(table, query):
+    """
+    Serve a public content list from the read-through cache (see content_cache.py)
+    Validators come from the table's version counter, so a matching
+    If-None-Match (or If-Modified-Since) gets 304 without a body
+    """
+    def load():
+        rows = execute_query(query, fetch_all=True)
+        return None if rows is None else current_app.json.dumps(rows)
+    
+    version, updated_at, body = get_list(table, load)
+    if body is None:
+        return jsonify([]), 200  # Query failed; don't let anyone cache the empty list
+    
+    etag = f'{table}-{version}'
+    last_modified = datetime.fromtimestamp(int(updated_at), timezone.utc) if updated_at else None
+    
+    if request.if_none_match:
+        not_modified = request.if_none_match.contains_weak(etag)
+    else:
+        since = request.if_modified_since
+        not_modified = bool(since and last_modified and last_modified <= since)
+    
+    if not_modified:
+        response = Response(status=304)
+    else:
+        response = Response(body, mimetype='application/json')
+    
+    response.set_etag(etag, weak=True)
+    if last_modified:
+        response.last_modified = last_modified
+    response.headers['Cache-Control'] = CONTENT_CACHE_CONTROL
+    return response
+
 # ===== GET ROUTES (Public access) =====
 
 @content_bp.route('/user-manual', methods=['GET'])
 def get_user_manuals():
     """Get all user manuals"""
-    manuals = execute_query(
-        "SELECT id, title, file_path, created_at FROM user_manual ORDER BY created_at DESC",
-        fetch_all=True
+    return versioned_list(
+        'user_manual',
+        "SELECT id, title, file_path, created_at FROM user_manual ORDER BY created_at DESC"
     )
-    return jsonify(manuals or []), 200
 
 @content_bp.route('/scam-tips', methods=['GET'])
 def get_scam_tips():
     """Get all scam tips"""
-    tips = execute_query(
-        "SELECT id, title, image_path, created_at FROM scam_tips ORDER BY created_at DESC",
-        fetch_all=True
+    return versioned_list(
+        'scam_tips',
+        "SELECT id, title, image_path, created_at FROM scam_tips ORDER BY created_at DESC"
     )
-    return jsonify(tips or []), 200
 
 @content_bp.route('/scam-cases', methods=['GET'])
 def get_scam_cases():
     """Get all Malaysia scam cases"""
-    cases = execute_query(
-        "SELECT id, headline, image_path, news_link, created_at FROM malaysia_cases ORDER BY created_at DESC",
-        fetch_all=True
+    return versioned_list(
+        'malaysia_cases',
+        "SELECT id, headline, image_path, news_link, created_at FROM malaysia_cases ORDER BY created_at DESC"
     )
-    return jsonify(cases or []), 200
 
 # ===== POST ROUTES (Admin only) =====
 
@@ -56,6 +95,8 @@ def create_user_manual(current_user):
     )
     
     if manual_id:
+        retain_upload(body)  # A blob path from an earlier upload gains this row's reference
+        invalidate_list('user_manual')
         return jsonify({'message': 'Manual created', 'id': manual_id}), 201
     else:
         return jsonify({'message': 'Failed to create manual'}), 500
@@ -78,6 +119,8 @@ def create_scam_tip(current_user):
     )
     
     if tip_id:
+        retain_upload(body)  # A blob path from an earlier upload gains this row's reference
+        invalidate_list('scam_tips')
         return jsonify({'message': 'Scam tip created', 'id': tip_id}), 201
     else:
         return jsonify({'message': 'Failed to create scam tip'}), 500
@@ -100,6 +143,8 @@ def create_scam_case(current_user):
     )
     
     if case_id:
+        retain_upload(body)  # A blob path from an earlier upload gains this row's reference
+        invalidate_list('malaysia_cases')
         return jsonify({'message': 'Scam case created', 'id': case_id}), 201
     else:
         return jsonify({'message': 'Failed to create scam case'}), 500
@@ -136,11 +181,23 @@ def update_content(current_user, resource, item_id):
     # For scam-cases, use 'headline' instead of 'title'
     title_field = 'headline' if resource == 'scam-cases' else 'title'
     
+    existing = execute_query(
+        f"SELECT {body_field} AS path FROM {table_name} WHERE id = %s",
+        (item_id,),
+        fetch_one=True
+    )
+    
     execute_query(
         f"UPDATE {table_name} SET {title_field} = %s, {body_field} = %s WHERE id = %s",
         (title, body, item_id)
     )
     
+    # The row now references the new file instead of the replaced one
+    if existing and existing['path'] != body:
+        retain_upload(body)
+        release_upload(existing['path'])
+    
+    invalidate_list(table_name)
     return jsonify({'message': 'Updated successfully'}), 200
 
 # ===== DELETE ROUTES (Admin only) =====
@@ -151,19 +208,30 @@ def delete_content(current_user, resource, item_id):
     """Delete content item"""
     # Map resource to table
     table_map = {
-        'user-manual': 'user_manual',
-        'scam-tips': 'scam_tips',
-        'scam-cases': 'malaysia_cases'
+        'user-manual': ('user_manual', 'file_path'),
+        'scam-tips': ('scam_tips', 'image_path'),
+        'scam-cases': ('malaysia_cases', 'image_path')
     }
     
     if resource not in table_map:
         return jsonify({'message': 'Invalid resource'}), 400
     
-    table_name = table_map[resource]
+    table_name, path_field = table_map[resource]
+    
+    existing = execute_query(
+        f"SELECT {path_field} AS path FROM {table_name} WHERE id = %s",
+        (item_id,),
+        fetch_one=True
+    )
     
     execute_query(
         f"DELETE FROM {table_name} WHERE id = %s",
         (item_id,)
     )
     
+    # Drop this row's reference; unreferenced files are removed by the GC pass
+    if existing:
+        release_upload(existing['path'])
+    
+    invalidate_list(table_name)
     return jsonify({'message': 'Deleted successfully'}), 200
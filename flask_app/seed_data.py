@@ -6,7 +6,8 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from database import execute_query
-import bcrypt
+from content_versions import bump_version
+from password_hashing import hash_password
 
 def seed_data():
     """Add sample data to the database"""
@@ -23,7 +24,7 @@ def seed_data():
         )
         
         if not admin_exists:
-            password_hash = bcrypt.hashpw('admin123'.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+            password_hash = hash_password('admin123')
             execute_query(
                 "INSERT INTO users (username, password_hash, role) VALUES (%s, %s, %s)",
                 ('admin', password_hash, 'admin')
@@ -63,6 +64,7 @@ def seed_data():
                     "INSERT INTO scam_tips (title, image_path) VALUES (%s, %s)",
                     (tip['title'], tip['image_path'])
                 )
+                bump_version('scam_tips')
                 print(f"✅ Added: {tip['title']}")
             else:
                 print(f"⚠️  Already exists: {tip['title']}")
@@ -101,6 +103,7 @@ def seed_data():
                     "INSERT INTO malaysia_cases (headline, image_path, news_link) VALUES (%s, %s, %s)",
                     (case['headline'], case['image_path'], case['news_link'])
                 )
+                bump_version('malaysia_cases')
                 print(f"✅ Added: {case['headline']}")
             else:
                 print(f"⚠️  Already exists: {case['headline']}")
@@ -132,6 +135,7 @@ def seed_data():
                     "INSERT INTO user_manual (title, file_path) VALUES (%s, %s)",
                     (manual['title'], manual['file_path'])
                 )
+                bump_version('user_manual')
                 print(f"✅ Added: {manual['title']}")
             else:
                 print(f"⚠️  Already exists: {manual['title']}")
@@ -3,7 +3,9 @@ Flask Application Server - AI Image Detection & Content Management
 Replaces Node.js Express server with Python Flask
 """
 import os
-from flask import Flask, render_template, send_from_directory
+import multiprocessing
+from flask import Flask, render_template, request, send_file, abort
+from werkzeug.security import safe_join
 from flask_cors import CORS
 from dotenv import load_dotenv
 
@@ -15,18 +17,24 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 # Import blueprints
-from routes.auth import auth_bp
+from routes.auth import auth_bp, admin_required, get_token_cache_stats
 from routes.content import content_bp
 from routes.admin import admin_bp
-from routes.ai_detection import ai_detection_bp
-from database import init_db
+from routes.ai_detection import ai_detection_bp, run_detection_job, release_job_upload, detection_flight
+from detectors import get_detector_stats
+from database import init_db, get_pool_stats
+from detection_cache import get_cache_stats
+from content_cache import get_content_cache_stats
+from password_hashing import get_hashing_stats
+from detection_jobs import start_workers, get_queue_stats
+from derivatives import DERIVATIVE_SIZES, is_image, source_digest, get_derivative, get_derivative_stats
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.getenv('SECRET_KEY', 'your-secret-key-change-this')
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
 
 # CORS configuration
-CORS(app)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 # Create upload directories
 UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
@@ -34,9 +42,14 @@ os.makedirs(os.path.join(UPLOAD_FOLDER, 'manuals'), exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'posters'), exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'cases'), exist_ok=True)
 os.makedirs(os.path.join(UPLOAD_FOLDER, 'images'), exist_ok=True)
+os.makedirs(os.path.join(UPLOAD_FOLDER, 'blobs'), exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 
+# Cache-Control for uploads; content-addressed blobs never change in place
+BLOB_CACHE_CONTROL = os.getenv('BLOB_CACHE_CONTROL', 'public, max-age=31536000, immutable')
+UPLOAD_CACHE_CONTROL = os.getenv('UPLOAD_CACHE_CONTROL', 'public, max-age=3600')
+
 # Register blueprints
 app.register_blueprint(auth_bp, url_prefix='/api/auth')
 app.register_blueprint(content_bp, url_prefix='/api/content')
@@ -46,7 +59,35 @@ app.register_blueprint(ai_detection_bp, url_prefix='/api')
 # Serve static files
 @app.route('/uploads/<path:filename>')
 def uploaded_file(filename):
-    return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
+    """
+    Serve an upload, or with ?size=small|medium|large a WebP thumbnail of it
+    Responses carry a strong ETag of the content hash and honour conditional requests
+    """
+    size = request.args.get('size')
+    if size and size not in DERIVATIVE_SIZES:
+        return {'message': f"Invalid size. Allowed: {', '.join(DERIVATIVE_SIZES)}"}, 400
+    
+    source_path = safe_join(app.config['UPLOAD_FOLDER'], filename)
+    if not source_path or not os.path.isfile(source_path):
+        abort(404)
+    
+    digest = source_digest(source_path)
+    # Blob URLs embed the content hash, so they can be cached forever
+    cache_control = BLOB_CACHE_CONTROL if filename.startswith('blobs/') else UPLOAD_CACHE_CONTROL
+    
+    if size and is_image(filename):
+        derivative = get_derivative(source_path, app.config['UPLOAD_FOLDER'], size)
+        if derivative:
+            response = send_file(derivative, mimetype='image/webp', etag=f'{digest}-{size}')
+        else:
+            # Not rendered yet; serve the original but make caches come back for the thumbnail
+            response = send_file(source_path, etag=digest)
+            cache_control = 'no-cache'
+    else:
+        response = send_file(source_path, etag=digest)
+    
+    response.headers['Cache-Control'] = cache_control
+    return response
 
 # Main route - serve index page
 @app.route('/')
@@ -58,11 +99,34 @@ def index():
 def health():
     return {'status': 'ok'}
 
+# Runtime metrics for this worker process; they expose internals, so admins only
+@app.route('/metrics')
+@admin_required
+def metrics(current_user):
+    return {
+        'db_pool': get_pool_stats(),
+        'detection_cache': get_cache_stats(),
+        'content_cache': get_content_cache_stats(),
+        'detection_jobs': get_queue_stats(),
+        'derivatives': get_derivative_stats(),
+        'password_hashing': get_hashing_stats(),
+        'auth_tokens': get_token_cache_stats(),
+        'detectors': get_detector_stats(),
+        'single_flight': detection_flight.get_stats()
+    }
+
 if __name__ == '__main__':
     print("🔧 Initializing database...")
     init_db()
     print("✅ Database ready")
     
+    debug = os.getenv('FLASK_ENV') == 'development'
+    # Background workers for /api/detection-jobs (also resumes jobs left from a
+    # previous run). Under the debug reloader only the serving child runs them;
+    # the parent just watches files and restarts it
+    if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+        start_workers(run_detection_job, on_failure=release_job_upload)
+    
     PORT = int(os.getenv('PORT', 4000))
     print(f"🚀 Server starting on http://localhost:{PORT}")
     print("Press Ctrl+C to stop")
@@ -70,5 +134,11 @@ if __name__ == '__main__':
     app.run(
         host='0.0.0.0',
         port=PORT,
-        debug=os.getenv('FLASK_ENV') == 'development'
+        debug=debug
     )
+elif multiprocessing.parent_process() is None:
+    # Imported by a WSGI server: create the schema before workers can pick up jobs.
+    # Skipped in multiprocessing children: with the spawn start method the
+    # password hashing pool re-imports this module in each worker process
+    init_db()
+    start_workers(run_detection_job, on_failure=release_job_upload)
@@ -0,0 +1,264 @@
+"""
+Sightengine genai client shared by the Flask routes and the Streamlit app
+One keep-alive requests.Session per client, separate connect/read timeouts,
+bounded retries with jittered backoff, a circuit breaker that fails fast
+while the API is unhealthy, and the shared rate limiter / monthly budget from
+rate_limiter.py (no Flask imports here)
+
+Usage:
+    client = SightengineClient.from_env()
+    score = client.check_file('photo.jpg')
+"""
+import os
+import time
+import random
+import threading
+import requests
+from requests.adapters import HTTPAdapter
+from multipart_stream import MultipartFileStream
+from rate_limiter import RateLimiter, QuotaExceededError
+
+DEFAULT_API_URL = "https://api.sightengine.com/1.0/check.json"
+
+# HTTP statuses worth another attempt
+RETRYABLE_STATUSES = {429, 500, 502, 503, 504}
+
+class DetectionAPIError(Exception):
+    """Sightengine answered with a non-success status"""
+
+    def __init__(self, code, message):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised without contacting the API while the circuit breaker is open"""
+
+    def __init__(self, retry_after):
+        super().__init__(f'Detection API unavailable, retry in {retry_after:.0f}s')
+        self.retry_after = retry_after
+
+class _RetryableResponse(Exception):
+    def __init__(self, response):
+        super().__init__(f'HTTP {response.status_code}')
+        self.response = response
+
+class CircuitBreaker:
+    """
+    Consecutive-failure breaker
+
+    After failure_threshold failed calls in a row (a call counts once, after
+    its retries) the circuit opens and calls fail immediately. Once reset_timeout has passed one probe call is
+    let through (half-open); its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._lock = threading.Lock()
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return 'closed'
+            if self._probing or time.monotonic() - self._opened_at >= self.reset_timeout:
+                return 'half_open'
+            return 'open'
+
+    def before_call(self):
+        """Raise CircuitOpenError unless a call may go out now"""
+        with self._lock:
+            if self._opened_at is None:
+                return
+            waited = time.monotonic() - self._opened_at
+            if waited < self.reset_timeout or self._probing:
+                raise CircuitOpenError(max(self.reset_timeout - waited, 1))
+            self._probing = True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def cancel_probe(self):
+        with self._lock:
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+class SightengineClient:
+    """
+    Thread-safe client for the genai model
+
+    Connection, connect-timeout and 5xx/429 failures are retried up to
+    max_retries times with full-jitter exponential backoff. Read timeouts
+    are not retried: the upload already reached the API, and a second wait
+    would double the worst-case latency. The breaker sees one outcome per
+    call; a 429 that outlasts the retries is a rate signal, not an outage,
+    and never counts as a breaker failure.
+    """
+
+    name = 'sightengine'
+    remote = True  # Uploads are worth downscaling first (see image_preprocess)
+
+    def __init__(self, api_url, api_user, api_secret, connect_timeout=5, read_timeout=30,
+                 max_retries=2, backoff_base=0.5, backoff_max=4.0,
+                 failure_threshold=5, reset_timeout=30, pool_size=10, limiter=None):
+        self.api_url = api_url
+        self.fields = {'models': 'genai', 'api_user': api_user, 'api_secret': api_secret}
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.limiter = limiter
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+
+        self._stats_lock = threading.Lock()
+        self._stats = {'calls': 0, 'attempts': 0, 'retries': 0, 'failures': 0, 'short_circuited': 0}
+
+    @classmethod
+    def from_env(cls):
+        """Client configured from SIGHTENGINE_* environment variables"""
+        return cls(
+            os.getenv('SIGHTENGINE_API_URL', DEFAULT_API_URL),
+            os.getenv('SIGHTENGINE_API_USER', ''),
+            os.getenv('SIGHTENGINE_API_SECRET', ''),
+            connect_timeout=float(os.getenv('SIGHTENGINE_CONNECT_TIMEOUT', 5)),
+            read_timeout=float(os.getenv('SIGHTENGINE_READ_TIMEOUT', 30)),
+            max_retries=int(os.getenv('SIGHTENGINE_MAX_RETRIES', 2)),
+            failure_threshold=int(os.getenv('SIGHTENGINE_BREAKER_THRESHOLD', 5)),
+            reset_timeout=float(os.getenv('SIGHTENGINE_BREAKER_RESET', 30)),
+            pool_size=int(os.getenv('SIGHTENGINE_POOL_SIZE', 10)),
+            limiter=RateLimiter.from_env()
+        )
+
+    def _count(self, key):
+        with self._stats_lock:
+            self._stats[key] += 1
+
+    def check_file(self, path, payload=None, read_timeout=None):
+        """
+        Score an image on disk, streaming it (or `payload`, e.g. a downscaled
+        copy, in its place) as the multipart body
+
+        Returns:
+            ai_generated score 0.0-1.0
+
+        Raises:
+            DetectionAPIError: API responded with a failure status
+            CircuitOpenError: Upstream is marked unhealthy
+            QuotaExceededError: Rate limit or monthly budget would be exceeded
+            requests.exceptions.RequestException: Network failure or timeout
+        """
+        return self._check(lambda: MultipartFileStream(self.fields, 'media', path, payload=payload),
+                           read_timeout)
+
+    def check_bytes(self, data, filename='image', read_timeout=None):
+        """Score an in-memory image; see check_file()"""
+        return self._check(lambda: MultipartFileStream(self.fields, 'media', filename, payload=data),
+                           read_timeout)
+
+    def _check(self, make_body, read_timeout):
+        self._count('calls')
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        try:
+            self.breaker.before_call()  # Once per call: the retries below are part of it
+        except CircuitOpenError:
+            self._count('short_circuited')
+            raise
+
+        attempt = 0
+        while True:
+            if self.limiter is not None:
+                try:
+                    self.limiter.acquire()  # Every attempt is an operation upstream
+                except QuotaExceededError:
+                    self.breaker.cancel_probe()
+                    raise
+
+            self._count('attempts')
+            try:
+                result = self._post(make_body, timeout)
+            except (requests.exceptions.ConnectionError, requests.exceptions.ConnectTimeout,
+                    _RetryableResponse) as e:
+                if attempt < self.max_retries:
+                    self._sleep_before_retry(attempt, e)
+                    attempt += 1
+                    self._count('retries')
+                    continue
+                # Retries exhausted: one breaker failure for the whole call
+                self._count('failures')
+                if isinstance(e, _RetryableResponse):
+                    if e.response.status_code == 429:
+                        self.breaker.cancel_probe()  # Throttled, not down; the breaker ignores it
+                    else:
+                        self.breaker.record_failure()
+                    e.response.raise_for_status()  # HTTPError, a RequestException like the rest
+                self.breaker.record_failure()
+                raise
+            except requests.exceptions.RequestException:
+                self.breaker.record_failure()
+                self._count('failures')
+                raise
+            except DetectionAPIError:
+                self.breaker.record_success()  # Upstream answered, just not with JSON
+                raise
+            except BaseException:
+                self.breaker.cancel_probe()  # Local error (e.g. unreadable file); no verdict on upstream
+                raise
+
+            # Any well-formed answer, including an API-level error, means upstream is up
+            self.breaker.record_success()
+            if result.get('status') != 'success':
+                error = result.get('error', {})
+                raise DetectionAPIError(error.get('code', 'unknown'), error.get('message', 'Unknown error'))
+            return result['type']['ai_generated']
+
+    def _post(self, make_body, timeout):
+        # A fresh body per attempt: the previous one was consumed by the send
+        with make_body() as body:
+            response = self.session.post(
+                self.api_url,
+                data=body,
+                headers={'Content-Type': body.content_type},
+                timeout=timeout
+            )
+        if response.status_code in RETRYABLE_STATUSES:
+            raise _RetryableResponse(response)
+        try:
+            return response.json()
+        except ValueError:
+            raise DetectionAPIError('invalid_response', f'Unexpected HTTP {response.status_code} response')
+
+    def _sleep_before_retry(self, attempt, error):
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if isinstance(error, _RetryableResponse):
+            retry_after = error.response.headers.get('Retry-After', '')
+            if retry_after.isdigit():
+                delay = min(self.backoff_max, max(delay, int(retry_after)))
+        time.sleep(delay)
+
+    def get_stats(self):
+        """Return call counters and the breaker state"""
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['circuit'] = self.breaker.state
+        if self.limiter is not None:
+            stats['quota'] = self.limiter.get_status()
+        return stats
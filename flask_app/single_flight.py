@@ -0,0 +1,144 @@
+"""
+Request coalescing for identical concurrent work
+The first caller for a key runs the work; callers arriving while it runs wait
+for the same outcome instead of repeating it. flight_locks extends this
+across worker processes: a process that loses the row-insert race polls for
+the winner's result instead of calling upstream itself.
+"""
+import os
+import time
+import uuid
+import threading
+from concurrent.futures import Future
+from database import execute_query, transaction, Error
+
+# 'process' coalesces threads within a worker; 'db' also coordinates workers
+SINGLE_FLIGHT_MODE = os.getenv('SINGLE_FLIGHT_MODE', 'process').lower()
+# How long a cross-process lock is honoured before others assume its owner died
+SINGLE_FLIGHT_LOCK_TTL = float(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 60))
+SINGLE_FLIGHT_POLL_INTERVAL = 0.1
+
+_owner = uuid.uuid4().hex
+
+class SingleFlight:
+    """
+    Per-key coalescing, within this process and optionally across processes
+
+    Usage:
+        flight = SingleFlight()
+        result, shared = flight.do(key, compute, check=lookup_result)
+    """
+
+    def __init__(self, mode=SINGLE_FLIGHT_MODE, lock_ttl=SINGLE_FLIGHT_LOCK_TTL):
+        self.mode = mode
+        self.lock_ttl = lock_ttl
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._stats = {'leaders': 0, 'coalesced': 0, 'remote_waits': 0, 'remote_reused': 0}
+
+    def _count(self, key):
+        with self._lock:
+            self._stats[key] += 1
+
+    def do(self, key, fn, check=None):
+        """
+        Run fn() once for all concurrent callers with the same key
+
+        In 'db' mode, check() is polled for a result published by another
+        process that holds the key's lock; it should return None until then.
+
+        Returns:
+            Tuple of (result, shared) where shared is True when this caller
+            reused another caller's run. Exceptions propagate to every caller.
+        """
+        with self._lock:
+            future = self._calls.get(key)
+            leader = future is None
+            if leader:
+                future = Future()
+                self._calls[key] = future
+                self._stats['leaders'] += 1
+            else:
+                self._stats['coalesced'] += 1
+
+        if not leader:
+            return future.result()[0], True
+
+        try:
+            outcome = self._run(key, fn, check)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(outcome)
+            return outcome
+        finally:
+            with self._lock:
+                del self._calls[key]
+
+    def _run(self, key, fn, check):
+        if self.mode != 'db' or check is None:
+            return fn(), False
+
+        if acquire_lock(key, self.lock_ttl):
+            try:
+                return fn(), False
+            finally:
+                release_lock(key)
+
+        self._count('remote_waits')
+        result = wait_for_remote(key, check, self.lock_ttl)
+        if result is not None:
+            self._count('remote_reused')
+            return result, True
+        return fn(), False  # The other process gave up or died; do the work here
+
+    def get_stats(self):
+        """Counters for this process; saved_calls is the work avoided by coalescing"""
+        with self._lock:
+            stats = dict(self._stats, in_flight=len(self._calls), mode=self.mode)
+        stats['saved_calls'] = stats['coalesced'] + stats['remote_reused']
+        return stats
+
+def acquire_lock(key, ttl=SINGLE_FLIGHT_LOCK_TTL):
+    """Try to take the cross-process lock for key; returns True on success"""
+    now = time.time()
+    try:
+        with transaction() as cursor:
+            cursor.execute("DELETE FROM flight_locks WHERE lock_key = %s AND expires_at < %s", (key, now))
+            cursor.execute(
+                "INSERT INTO flight_locks (lock_key, owner, expires_at) VALUES (%s, %s, %s)",
+                (key, _owner, now + ttl)
+            )
+        return True
+    except Error:
+        return False  # Another process holds it
+
+def release_lock(key):
+    execute_query("DELETE FROM flight_locks WHERE lock_key = %s AND owner = %s", (key, _owner))
+
+def lock_held(key):
+    row = execute_query(
+        "SELECT 1 AS held FROM flight_locks WHERE lock_key = %s AND expires_at >= %s",
+        (key, time.time()),
+        fetch_one=True
+    )
+    return bool(row)
+
+def wait_for_remote(key, check, timeout=SINGLE_FLIGHT_LOCK_TTL):
+    """
+    Poll check() while another process holds the lock for key
+
+    Returns:
+        check()'s first truthy result, or None once the lock is released
+        or expires without one (the caller should then do the work itself)
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        time.sleep(SINGLE_FLIGHT_POLL_INTERVAL)
+        result = check()
+        if result:
+            return result
+        if not lock_held(key):
+            return check() or None
+    return None
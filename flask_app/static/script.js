@@ -659,14 +659,14 @@ async function loadPublicContent(resource, targetId) {
             html = data.map(item => `
                 <div class="content-item">
                     <h3>${item.title}</h3>
-                    ${item.image_path ? `<img src="${item.image_path}" alt="${item.title}">` : ""}
+                    ${item.image_path ? `<a href="${item.image_path}" target="_blank"><img src="${item.image_path}?size=medium" alt="${item.title}" loading="lazy"></a>` : ""}
                 </div>
             `).join("");
         } else if (resource === "scam-cases") {
             html = data.map(item => `
                 <div class="content-item">
                     <h3>${item.headline}</h3>
-                    ${item.image_path ? `<img src="${item.image_path}" alt="${item.headline}">` : ""}
+                    ${item.image_path ? `<a href="${item.image_path}" target="_blank"><img src="${item.image_path}?size=medium" alt="${item.headline}" loading="lazy"></a>` : ""}
                     ${item.news_link ? `<p><a href="${item.news_link}" target="_blank">Read full news article →</a></p>` : ""}
                 </div>
             `).join("");
@@ -0,0 +1,37 @@
+"""
+Shared fixtures - every test runs against throwaway SQLite files
+The environment is set before any app module is imported, since they read
+their configuration at import time
+"""
+import os
+import sys
+import atexit
+import shutil
+import tempfile
+import pytest
+
+_workdir = tempfile.mkdtemp(prefix='flask_app_tests_')
+atexit.register(shutil.rmtree, _workdir, ignore_errors=True)
+os.environ.update({
+    'DB_BACKEND': 'sqlite',
+    'SQLITE_PATH': os.path.join(_workdir, 'app.db'),
+    'DETECTION_JOBS_DB': os.path.join(_workdir, 'detection_jobs.db'),
+    'API_QUOTA_DB': os.path.join(_workdir, 'api_quota.db'),
+    'SECRET_KEY': 'throwaway-test-secret-key-of-32-bytes-or-more',
+})
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+@pytest.fixture(scope='session')
+def db():
+    """The app database with all tables created"""
+    from database import init_db
+    init_db()
+
+@pytest.fixture
+def jobs_db(tmp_path, monkeypatch):
+    """A fresh, empty detection job queue"""
+    import detection_jobs
+    monkeypatch.setattr(detection_jobs, 'JOBS_DB_PATH', str(tmp_path / 'jobs.db'))
+    detection_jobs.init_jobs_db()
+    return detection_jobs
@@ -0,0 +1,142 @@
+"""Circuit breaker transitions and how the Sightengine client feeds it"""
+from types import SimpleNamespace
+import pytest
+import requests
+import sightengine_client
+from sightengine_client import CircuitBreaker, CircuitOpenError, SightengineClient, _RetryableResponse
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(sightengine_client, 'time', SimpleNamespace(monotonic=clock.monotonic, sleep=clock.sleep))
+    return clock
+
+def _fail_times(breaker, count):
+    for _ in range(count):
+        breaker.before_call()
+        breaker.record_failure()
+
+def test_opens_after_consecutive_failures(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    _fail_times(breaker, 2)
+    assert breaker.state == 'closed'
+    _fail_times(breaker, 1)
+    assert breaker.state == 'open'
+
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker(failure_threshold=3, reset_timeout=30)
+
+    _fail_times(breaker, 2)
+    breaker.before_call()
+    breaker.record_success()
+    _fail_times(breaker, 2)
+
+    assert breaker.state == 'closed'
+
+def test_half_open_lets_one_probe_through(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _fail_times(breaker, 1)
+
+    clock.now += 30
+    assert breaker.state == 'half_open'
+    breaker.before_call()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()  # Only one probe at a time
+
+    breaker.record_success()
+    assert breaker.state == 'closed'
+    breaker.before_call()
+
+def test_failed_probe_reopens(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _fail_times(breaker, 1)
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.record_failure()
+
+    assert breaker.state == 'open'
+    clock.now += 29
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+def test_cancelled_probe_frees_the_slot(clock):
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=30)
+    _fail_times(breaker, 1)
+
+    clock.now += 30
+    breaker.before_call()
+    breaker.cancel_probe()
+
+    breaker.before_call()
+
+class FakeResponse:
+    def __init__(self, status_code):
+        self.status_code = status_code
+        self.headers = {}
+
+    def raise_for_status(self):
+        raise requests.exceptions.HTTPError(f'{self.status_code} Error')
+
+def _client(outcomes, threshold=5):
+    """Client whose upstream answers with outcomes in order (exceptions are raised)"""
+    client = SightengineClient('http://upstream.invalid', 'user', 'secret',
+                               max_retries=2, failure_threshold=threshold)
+    client._post = lambda make_body, timeout: _pop(outcomes)
+    return client
+
+def _pop(outcomes):
+    outcome = outcomes.pop(0)
+    if isinstance(outcome, BaseException):
+        raise outcome
+    return outcome
+
+SUCCESS = {'status': 'success', 'type': {'ai_generated': 0.2}}
+
+def test_one_breaker_failure_per_call(clock):
+    client = _client([_RetryableResponse(FakeResponse(503))] * 6)
+
+    for _ in range(2):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client._check(None, None)
+
+    assert client.get_stats()['attempts'] == 6
+    assert client.breaker._failures == 2
+    assert client.breaker.state == 'closed'
+
+def test_rate_limited_calls_do_not_open_breaker(clock):
+    client = _client([_RetryableResponse(FakeResponse(429))] * 9, threshold=1)
+
+    for _ in range(3):
+        with pytest.raises(requests.exceptions.HTTPError):
+            client._check(None, None)
+
+    assert client.breaker.state == 'closed'
+
+def test_retried_probe_can_close_the_breaker(clock):
+    client = _client([requests.exceptions.ConnectionError()] * 3, threshold=1)
+    with pytest.raises(requests.exceptions.ConnectionError):
+        client._check(None, None)
+    assert client.breaker.state == 'open'
+
+    clock.now += client.breaker.reset_timeout + 1  # Jittered sleeps leave the clock off the integer grid
+    outcomes = [_RetryableResponse(FakeResponse(503)), SUCCESS]
+    client._post = lambda make_body, timeout: _pop(outcomes)
+
+    assert client._check(None, None) == 0.2
+    assert client.breaker.state == 'closed'
+
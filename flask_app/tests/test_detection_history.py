@@ -0,0 +1,48 @@
+"""Keyset pagination of GET /api/detection-history"""
+import time
+import jwt
+import pytest
+from flask import Flask
+from database import execute_query, execute_many
+from routes.ai_detection import ai_detection_bp
+from routes.auth import SECRET_KEY
+
+@pytest.fixture
+def client(db):
+    app = Flask(__name__)
+    app.register_blueprint(ai_detection_bp, url_prefix='/api')
+    return app.test_client()
+
+@pytest.fixture
+def user(db):
+    username = f'history-{time.monotonic_ns()}'
+    user_id = execute_query("INSERT INTO users (username, password_hash) VALUES (%s, %s)",
+                            (username, 'x'))
+    token = jwt.encode({'id': user_id, 'username': username, 'role': 'user', 'exp': time.time() + 3600},
+                       SECRET_KEY, algorithm='HS256')
+    return user_id, {'Authorization': f'Bearer {token}'}
+
+def test_pages_cover_every_row_once_across_timestamp_ties(client, user):
+    user_id, headers = user
+    # Two seconds' worth of rows, so pages break inside runs of equal created_at
+    created = ['2026-01-01 10:00:00'] * 4 + ['2026-01-01 10:00:01'] * 3
+    execute_many(
+        """INSERT INTO ai_detections (filename, image_path, is_ai_generated, confidence_percent,
+                                      probability_score, user_id, created_at)
+           VALUES (%s, %s, %s, %s, %s, %s, %s)""",
+        [(f'{i}.png', f'/uploads/{i}.png', False, 10, 0.1, user_id, at) for i, at in enumerate(created)]
+    )
+
+    seen = []
+    url = '/api/detection-history?limit=3'
+    while True:
+        response = client.get(url, headers=headers)
+        assert response.status_code == 200
+        seen.extend((row['created_at'], row['id']) for row in response.get_json())
+        cursor = response.headers.get('X-Next-Cursor')
+        if not cursor:
+            break
+        url = f'/api/detection-history?limit=3&before={cursor}'
+
+    assert len(seen) == len(created)
+    assert seen == sorted(seen, reverse=True)
@@ -0,0 +1,23 @@
+"""The detection job runner's retry decisions against the real queue"""
+import time
+from PIL import Image
+from routes import ai_detection
+
+def test_job_is_deferred_while_breaker_is_open(db, jobs_db, tmp_path):
+    image_path = tmp_path / 'photo.png'
+    Image.new('RGB', (64, 64), 'red').save(image_path)
+    breaker = ai_detection.detector.breaker
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+    try:
+        job_id = jobs_db.enqueue_job('photo.png', '/uploads/photo.png', str(image_path))
+
+        jobs_db._run_job(jobs_db._claim_next_job(), ai_detection.run_detection_job)
+
+        job = jobs_db.get_job(job_id)
+        assert job['status'] == 'queued'
+        assert job['attempts'] == 0
+        assert job['run_after'] > time.time() + 1
+        assert jobs_db._claim_next_job() is None
+    finally:
+        breaker.record_success()
@@ -0,0 +1,120 @@
+"""Job queue outcomes: retries, deferral and lease recovery"""
+import time
+import pytest
+
+def _fail(**attributes):
+    error = RuntimeError('upstream unavailable')
+    for name, value in attributes.items():
+        setattr(error, name, value)
+    def runner(job, read_timeout):
+        raise error
+    return runner
+
+def _set(jobs, job_id, **columns):
+    connection = jobs._connect()
+    try:
+        assignments = ', '.join(f'{column} = ?' for column in columns)
+        connection.execute(f"UPDATE detection_jobs SET {assignments} WHERE id = ?",
+                           (*columns.values(), job_id))
+    finally:
+        connection.close()
+
+def test_success_stores_result(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    jobs_db._run_job(jobs_db._claim_next_job(), lambda job, read_timeout: {'score': 0.2})
+
+    job = jobs_db.get_job(job_id)
+    assert job['status'] == 'done'
+    assert job['result'] == {'score': 0.2}
+    assert job['attempts'] == 1
+
+def test_retryable_error_is_retried_until_attempts_run_out(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    for attempt in range(1, jobs_db.JOB_MAX_ATTEMPTS + 1):
+        job = jobs_db._claim_next_job()
+        assert job['attempts'] == attempt
+        jobs_db._run_job(job, _fail(retryable=True))
+
+    job = jobs_db.get_job(job_id)
+    assert job['status'] == 'failed'
+    assert job['error'] == 'upstream unavailable'
+    assert jobs_db._claim_next_job() is None
+
+def test_failure_hook_runs_only_when_job_fails_for_good(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+    failed = []
+
+    jobs_db._run_job(jobs_db._claim_next_job(), _fail(defer=60), failed.append)
+    _set(jobs_db, job_id, run_after=None)
+    for _ in range(jobs_db.JOB_MAX_ATTEMPTS - 1):
+        jobs_db._run_job(jobs_db._claim_next_job(), _fail(retryable=True), failed.append)
+    assert failed == []
+
+    jobs_db._run_job(jobs_db._claim_next_job(), _fail(retryable=True), failed.append)
+    assert [job['id'] for job in failed] == [job_id]
+
+def test_non_retryable_error_fails_at_once(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    jobs_db._run_job(jobs_db._claim_next_job(), _fail())
+
+    assert jobs_db.get_job(job_id)['status'] == 'failed'
+
+def test_deferred_job_waits_and_keeps_its_attempt(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    jobs_db._run_job(jobs_db._claim_next_job(), _fail(defer=60))
+
+    job = jobs_db.get_job(job_id)
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 0
+    assert job['run_after'] > time.time() + 30
+    assert jobs_db._claim_next_job() is None  # Not before run_after
+
+    _set(jobs_db, job_id, run_after=time.time() - 1)
+    assert jobs_db._claim_next_job()['id'] == job_id
+
+def test_deferral_does_not_exhaust_attempts(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    for _ in range(jobs_db.JOB_MAX_ATTEMPTS * 2):
+        jobs_db._run_job(jobs_db._claim_next_job(), _fail(defer=60))
+        _set(jobs_db, job_id, run_after=None)
+
+    job = jobs_db.get_job(job_id)
+    assert job['status'] == 'queued'
+    assert job['attempts'] == 0
+
+def test_expired_lease_requeues_running_job(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+    jobs_db._claim_next_job()
+    assert jobs_db._claim_next_job() is None  # Still leased
+
+    _set(jobs_db, job_id, started_at=time.time() - jobs_db.JOB_LEASE_SECONDS - 1)
+
+    job = jobs_db._claim_next_job()
+    assert job['id'] == job_id
+    assert job['attempts'] == 2
+
+def test_expired_lease_fails_job_out_of_attempts(jobs_db):
+    job_id = jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+    jobs_db._claim_next_job()
+    _set(jobs_db, job_id, attempts=jobs_db.JOB_MAX_ATTEMPTS,
+         started_at=time.time() - jobs_db.JOB_LEASE_SECONDS - 1)
+
+    failed = []
+    assert jobs_db._claim_next_job(failed.append) is None
+
+    job = jobs_db.get_job(job_id)
+    assert job['status'] == 'failed'
+    assert 'worker lost' in job['error']
+    assert [job['image_path'] for job in failed] == ['/uploads/a.png']
+
+def test_queue_full(jobs_db, monkeypatch):
+    monkeypatch.setattr(jobs_db, 'JOB_MAX_QUEUE', 1)
+    jobs_db.enqueue_job('a.png', '/uploads/a.png', '/tmp/a.png')
+
+    with pytest.raises(jobs_db.QueueFullError):
+        jobs_db.enqueue_job('b.png', '/uploads/b.png', '/tmp/b.png')
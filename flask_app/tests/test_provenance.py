@@ -0,0 +1,29 @@
+"""Compressed PNG text chunks in the provenance scanner"""
+import io
+import struct
+import zlib
+from PIL import Image
+from provenance import scan_provenance, MAX_TEXT_BYTES
+
+def _png_with(*chunks):
+    out = io.BytesIO()
+    Image.new('RGB', (8, 8)).save(out, 'PNG')
+    png = out.getvalue()
+    extra = b''.join(struct.pack('>I4s', len(data), kind) + data + struct.pack('>I', zlib.crc32(kind + data))
+                     for kind, data in chunks)
+    return png[:33] + extra + png[33:]  # After IHDR
+
+def test_compressed_text_is_read():
+    report = scan_provenance(_png_with(
+        (b'zTXt', b'Comment\x00\x00' + zlib.compress(b'made with midjourney')),
+        (b'iTXt', b'Software\x00\x01\x00\x00\x00' + zlib.compress(b'Adobe Firefly')),
+    ))
+
+    assert report['declared']
+    assert report['generator'] == 'Adobe Firefly'
+    assert any('midjourney' in hint for hint in report['hints'])
+
+def test_oversized_compressed_text_is_skipped():
+    bomb = zlib.compress(b'midjourney ' * (MAX_TEXT_BYTES // 4), 9)
+
+    assert scan_provenance(_png_with((b'zTXt', b'Comment\x00\x00' + bomb))) is None
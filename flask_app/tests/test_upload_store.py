@@ -0,0 +1,106 @@
+"""Blob reference counting, release and garbage collection"""
+import io
+import os
+import time
+import pytest
+from database import execute_query
+from upload_store import (store_upload, retain_upload, release_upload, collect_garbage,
+                          blob_digest)
+
+@pytest.fixture
+def upload_folder(db, tmp_path):
+    return str(tmp_path / 'uploads')
+
+def _store(upload_folder, data):
+    public_path, path, digest = store_upload(io.BytesIO(data), 'image.png', upload_folder, thumbnails=False)
+    return public_path, path
+
+def _ref_count(public_path):
+    row = execute_query("SELECT ref_count FROM blobs WHERE digest = %s",
+                        (blob_digest(public_path),), fetch_one=True)
+    return row['ref_count'] if row else None
+
+def _age(public_path, seconds):
+    """Pretend the blob's last reference changed `seconds` ago"""
+    execute_query("UPDATE blobs SET last_ref_at = %s WHERE digest = %s",
+                  (time.time() - seconds, blob_digest(public_path)))
+
+def test_identical_uploads_share_one_blob(upload_folder):
+    data = os.urandom(256)
+    first_path, first_file = _store(upload_folder, data)
+    second_path, second_file = _store(upload_folder, data)
+
+    assert first_path == second_path
+    assert first_file == second_file
+    assert _ref_count(first_path) == 2
+
+def test_same_bytes_under_another_extension_reuse_the_blob(upload_folder):
+    data = os.urandom(256)
+    first_path, first_file = store_upload(io.BytesIO(data), 'photo.jpg', upload_folder, thumbnails=False)[:2]
+    second_path, second_file = store_upload(io.BytesIO(data), 'photo.jpeg', upload_folder, thumbnails=False)[:2]
+
+    assert second_path == first_path
+    assert second_file == first_file
+    assert os.listdir(os.path.dirname(first_file)) == [os.path.basename(first_file)]
+    assert _ref_count(first_path) == 2
+
+def test_release_and_retain(upload_folder):
+    public_path, _ = _store(upload_folder, os.urandom(256))
+
+    retain_upload(public_path)
+    assert _ref_count(public_path) == 2
+
+    release_upload(public_path, count=2)
+    assert _ref_count(public_path) == 0
+    release_upload(public_path)
+    assert _ref_count(public_path) == 0  # Never negative
+
+def test_non_blob_paths_are_ignored(upload_folder):
+    retain_upload('/uploads/images/legacy.png')
+    release_upload('free text body')
+
+def test_gc_deletes_unreferenced_blob_after_grace(upload_folder):
+    public_path, path = _store(upload_folder, os.urandom(256))
+    release_upload(public_path)
+
+    collect_garbage(upload_folder, grace_seconds=3600)
+    assert os.path.exists(path)  # Released just now
+
+    _age(public_path, 7200)
+    collect_garbage(upload_folder, grace_seconds=3600)
+    assert not os.path.exists(path)
+    assert _ref_count(public_path) is None
+
+def test_gc_keeps_referenced_and_pinned_blobs(upload_folder):
+    referenced_path, referenced_file = _store(upload_folder, os.urandom(256))
+    pinned_path, pinned_file = _store(upload_folder, os.urandom(256))
+    execute_query("INSERT INTO scam_tips (title, image_path) VALUES (%s, %s)",
+                  ('tip', referenced_path))
+    release_upload(pinned_path)
+    _age(referenced_path, 7200)
+    _age(pinned_path, 7200)
+
+    collect_garbage(upload_folder, grace_seconds=3600, pinned_paths=[pinned_path])
+
+    assert os.path.exists(referenced_file)
+    assert os.path.exists(pinned_file)
+
+def test_gc_repairs_drifted_counts(upload_folder):
+    public_path, path = _store(upload_folder, os.urandom(256))
+    retain_upload(public_path, count=3)  # References no row actually holds
+    _age(public_path, 7200)
+
+    collect_garbage(upload_folder, grace_seconds=3600)
+
+    assert not os.path.exists(path)
+
+def test_gc_dry_run_changes_nothing(upload_folder):
+    public_path, path = _store(upload_folder, os.urandom(256))
+    release_upload(public_path)
+    _age(public_path, 7200)
+
+    stats = collect_garbage(upload_folder, grace_seconds=3600, dry_run=True)
+
+    assert stats['deleted'] >= 1
+    assert os.path.exists(path)
+    assert _ref_count(public_path) == 0
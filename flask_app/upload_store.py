@@ -0,0 +1,230 @@
+"""
+Deduplicated upload storage
+Uploads are written once per distinct content under uploads/blobs/ab/cd/<sha256>.<ext>
+and the blobs table counts the rows that point at each file, so identical
+uploads share one copy and unreferenced ones can be garbage-collected
+
+Usage:
+    python upload_store.py gc [--dry-run]
+"""
+import os
+import sys
+import time
+from werkzeug.utils import secure_filename
+from database import execute_query, execute_many, transaction, Error
+from blob_store import store_stream, iter_blobs
+from derivatives import is_image, remove_derivatives, schedule as schedule_derivatives
+
+UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'uploads')
+BLOB_DIR = 'blobs'
+BLOB_URL_PREFIX = f'/uploads/{BLOB_DIR}/'
+
+# Unreferenced blobs younger than this are kept, so an upload whose row is
+# about to be inserted (or is waiting in the job queue) is never collected
+BLOB_GC_GRACE_SECONDS = int(os.getenv('BLOB_GC_GRACE_SECONDS', 3600))
+
+# Every column that may hold a public /uploads/blobs/... path
+REFERENCE_COLUMNS = [
+    ('ai_detections', 'image_path'),
+    ('user_manual', 'file_path'),
+    ('scam_tips', 'image_path'),
+    ('malaysia_cases', 'image_path')
+]
+
+def save_upload(file, upload_folder=UPLOAD_FOLDER):
+    """
+    Stream a werkzeug FileStorage into the blob store and take one reference on it
+
+    The caller is expected to store the returned public path in exactly one
+    row; call release_upload() if that row is never written.
+
+    Returns:
+        Tuple of (public path, file path on disk, SHA-256 digest)
+    """
+    return store_upload(file.stream, file.filename, upload_folder)
+
+def store_upload(stream, filename, upload_folder=UPLOAD_FOLDER, thumbnails=True):
+    """
+    Same as save_upload() for any binary stream (e.g. an archive member)
+
+    Args:
+        thumbnails: Render thumbnails now; otherwise the first request for
+            one renders it
+    """
+    filename = secure_filename(filename)
+    ext = filename.rsplit('.', 1)[1].lower() if '.' in filename else 'bin'
+
+    root = os.path.join(upload_folder, BLOB_DIR)
+    digest, path, size, created = store_stream(root, stream, ext)
+    public_path = BLOB_URL_PREFIX + os.path.relpath(path, root).replace(os.sep, '/')
+
+    # Thumbnails are rendered off the request thread
+    if thumbnails and created and is_image(path):
+        schedule_derivatives(path, upload_folder)
+
+    add_reference(digest, public_path, size)
+    return public_path, path, digest
+
+def add_reference(digest, public_path, size, count=1):
+    """Record `count` more rows pointing at a blob, creating its entry if new"""
+    now = time.time()
+    try:
+        with transaction() as cursor:
+            cursor.execute(
+                "UPDATE blobs SET ref_count = ref_count + %s, last_ref_at = %s WHERE digest = %s",
+                (count, now, digest)
+            )
+            if cursor.rowcount == 0:
+                cursor.execute(
+                    """INSERT INTO blobs (digest, path, size, ref_count, created_at, last_ref_at)
+                       VALUES (%s, %s, %s, %s, %s, %s)""",
+                    (digest, public_path, size, count, now, now)
+                )
+    except Error:
+        # Lost an insert race with a concurrent upload of the same bytes
+        execute_query(
+            "UPDATE blobs SET ref_count = ref_count + %s, last_ref_at = %s WHERE digest = %s",
+            (count, now, digest)
+        )
+
+def retain_upload(public_path, count=1):
+    """
+    Take `count` more references to an already stored upload, for a row that
+    starts pointing at it without uploading it (e.g. an edited content path)
+
+    Paths outside the blob store are ignored, as in release_upload().
+    """
+    digest = blob_digest(public_path)
+    if digest is None:
+        return
+    execute_query(
+        "UPDATE blobs SET ref_count = ref_count + %s, last_ref_at = %s WHERE digest = %s",
+        (count, time.time(), digest)
+    )
+
+def release_upload(public_path, count=1):
+    """
+    Drop `count` references to a stored upload
+
+    Paths outside the blob store (legacy uploads, free-text bodies) are
+    ignored. The file itself is left for the next GC pass.
+    """
+    digest = blob_digest(public_path)
+    if digest is None:
+        return
+    execute_query(
+        "UPDATE blobs SET ref_count = CASE WHEN ref_count > %s THEN ref_count - %s ELSE 0 END, "
+        "last_ref_at = %s WHERE digest = %s",
+        (count, count, time.time(), digest)
+    )
+
+def blob_digest(public_path):
+    """The content hash of a /uploads/blobs/... path, or None for other paths"""
+    if not public_path or not public_path.startswith(BLOB_URL_PREFIX):
+        return None
+    return public_path.rsplit('/', 1)[-1].split('.', 1)[0]
+
+def count_references():
+    """Count the rows that currently point at each blob, by digest"""
+    counts = {}
+    for table, column in REFERENCE_COLUMNS:
+        rows = execute_query(
+            f"SELECT {column} AS path, COUNT(*) AS refs FROM {table} "
+            f"WHERE {column} LIKE %s GROUP BY {column}",
+            (BLOB_URL_PREFIX + '%',),
+            fetch_all=True
+        ) or []
+        for row in rows:
+            digest = blob_digest(row['path'])
+            counts[digest] = counts.get(digest, 0) + int(row['refs'])
+    return counts
+
+def collect_garbage(upload_folder=UPLOAD_FOLDER, grace_seconds=BLOB_GC_GRACE_SECONDS,
+                    pinned_paths=(), dry_run=False):
+    """
+    Reconcile reference counts with the tables and delete unreferenced blobs
+
+    Counts are recomputed from REFERENCE_COLUMNS, which also repairs any
+    drift from crashed requests. A blob is deleted, with its thumbnails,
+    only when nothing points at it, it is not pinned (e.g. by a queued job)
+    and it has been unreferenced for at least grace_seconds. Files on disk
+    with no blobs entry are orphans from interrupted writes and follow the
+    same grace rule.
+
+    Returns:
+        Dict of counters describing the pass
+    """
+    now = time.time()
+    cutoff = now - grace_seconds
+    root = os.path.join(upload_folder, BLOB_DIR)
+    references = count_references()
+    pinned = {blob_digest(path) for path in pinned_paths}
+    stats = {'blobs': 0, 'recounted': 0, 'deleted': 0, 'orphans_deleted': 0, 'bytes_freed': 0}
+
+    entries = execute_query(
+        "SELECT digest, path, size, ref_count, last_ref_at FROM blobs",
+        fetch_all=True
+    ) or []
+    stats['blobs'] = len(entries)
+
+    recounts = []
+    doomed = []
+    for entry in entries:
+        digest = entry['digest']
+        actual = references.get(digest, 0)
+        if actual != entry['ref_count']:
+            recounts.append((actual, digest))
+        if actual == 0 and digest not in pinned and entry['last_ref_at'] < cutoff:
+            doomed.append(entry)
+
+    stats['recounted'] = len(recounts)
+    if dry_run:
+        stats['deleted'] = len(doomed)
+        return stats
+
+    if recounts:
+        execute_many("UPDATE blobs SET ref_count = %s WHERE digest = %s", recounts)
+
+    for entry in doomed:
+        # Re-check under the delete so a reference taken since the scan wins
+        with transaction() as cursor:
+            cursor.execute(
+                "DELETE FROM blobs WHERE digest = %s AND ref_count = 0",
+                (entry['digest'],)
+            )
+            if cursor.rowcount == 0:
+                continue
+        path = os.path.join(upload_folder, entry['path'][len('/uploads/'):])
+        try:
+            os.remove(path)
+            stats['bytes_freed'] += entry['size'] or 0
+        except FileNotFoundError:
+            pass
+        stats['bytes_freed'] += remove_derivatives(upload_folder, entry['digest'])
+        stats['deleted'] += 1
+
+    known = {entry['digest'] for entry in entries}
+    for digest, path in iter_blobs(root):
+        if digest in known or digest in references or digest in pinned:
+            continue
+        try:
+            if os.path.getmtime(path) < cutoff:
+                stats['bytes_freed'] += os.path.getsize(path)
+                os.remove(path)
+                stats['bytes_freed'] += remove_derivatives(upload_folder, digest)
+                stats['orphans_deleted'] += 1
+        except FileNotFoundError:
+            pass
+
+    return stats
+
+if __name__ == '__main__':
+    if len(sys.argv) < 2 or sys.argv[1] != 'gc':
+        print(__doc__.strip().splitlines()[-1].strip())
+        sys.exit(1)
+
+    from detection_jobs import init_jobs_db, get_active_image_paths
+    init_jobs_db()
+    result = collect_garbage(pinned_paths=get_active_image_paths(), dry_run='--dry-run' in sys.argv)
+    for key, value in result.items():
+        print(f"{key}: {value}")
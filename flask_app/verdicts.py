@@ -0,0 +1,135 @@
+"""
+Score-to-verdict table shared by the Flask routes and the Streamlit app
+VERDICT_BANDS maps an ai_generated score to is_ai, likely_generator and one
+of a fixed set of explanations, joined and interned once at import. Each
+explanation has a small id: ai_detections rows store explanation_id next to
+the score, and expand_explanation() turns it back into text on read.
+Ids are persisted - never renumber them, add new ones instead
+
+Usage:
+    verdict = verdict_for_score(0.93, tier='sightengine')
+    print(verdict['likely_generator'], verdict['explanation'])
+"""
+import sys
+from collections import namedtuple
+from provenance import PROVENANCE_SCORE
+
+# Scores above this are AI-generated verdicts
+AI_THRESHOLD = 0.5
+
+Band = namedtuple('Band', 'explanation_id is_ai likely_generator points')
+
+AI_POINTS = (
+    "• Possible anatomical inconsistencies",
+    "• Lighting/shadow patterns suggest generation",
+)
+REAL_POINTS = (
+    "• Realistic depth-of-field",
+    "• Natural lighting characteristics",
+)
+
+# (lower bound, bound included, band), highest first; the first match wins
+VERDICT_BANDS = [
+    (0.9, False, Band(1, True, "Midjourney/DALL-E (High Confidence)", (
+        "• Very high AI probability detected",
+        "• Strong diffusion model patterns identified",
+        "• Unnatural smoothness in textures",
+    ) + AI_POINTS)),
+    (0.75, False, Band(2, True, "Stable Diffusion/Flux", (
+        "• High AI probability detected",
+        "• Moderate diffusion patterns present",
+    ) + AI_POINTS)),
+    (AI_THRESHOLD, False, Band(3, True, "Unknown AI Generator", (
+        "• Moderate AI probability detected",
+        "• Some synthetic artifacts found",
+    ) + AI_POINTS)),
+    (0.3, True, Band(4, False, "Real Photo", (
+        "• Borderline case",
+        "• May be edited or filtered real photo",
+    ) + REAL_POINTS)),
+    (0.1, True, Band(5, False, "Real Photo", (
+        "• Low AI probability",
+        "• Mostly natural characteristics",
+    ) + REAL_POINTS)),
+    (float('-inf'), True, Band(6, False, "Real Photo", (
+        "• Very low AI probability",
+        "• Natural grain and imperfections present",
+        "• Organic asymmetry detected",
+    ) + REAL_POINTS)),
+]
+
+# Verdicts decided by generator metadata (see provenance.py); the row keeps
+# the per-image evidence in its explanation column
+PROVENANCE_EXPLANATION_ID = 7
+
+EXPLANATIONS = {band.explanation_id: sys.intern("\n".join(band.points)) for _, _, band in VERDICT_BANDS}
+EXPLANATIONS[PROVENANCE_EXPLANATION_ID] = sys.intern("• AI generation declared in the file's own metadata")
+
+def band_for_score(score):
+    """The VERDICT_BANDS entry a score falls in"""
+    for bound, inclusive, band in VERDICT_BANDS:
+        if score > bound or (inclusive and score == bound):
+            return band
+    return VERDICT_BANDS[-1][2]  # NaN
+
+def verdict_for_score(score, tier=None):
+    """
+    Verdict dict for an engine score
+
+    Returns:
+        Dict with score, is_ai_generated, likely_generator, explanation,
+        explanation_id, explanation_detail (always None here) and tier
+    """
+    band = band_for_score(score)
+    return {
+        'score': score,
+        'is_ai_generated': band.is_ai,
+        'likely_generator': band.likely_generator,
+        'explanation': EXPLANATIONS[band.explanation_id],
+        'explanation_id': band.explanation_id,
+        'explanation_detail': None,
+        'tier': tier
+    }
+
+def verdict_for_provenance(report):
+    """Verdict for an image whose metadata names its generator (tier 'metadata')"""
+    detail = "\n".join(f"• {item}" for item in report['evidence'])
+    return {
+        'score': PROVENANCE_SCORE,
+        'is_ai_generated': True,
+        'likely_generator': report['generator'] or 'Unknown AI Generator',
+        'explanation': expand_explanation(PROVENANCE_EXPLANATION_ID, detail),
+        'explanation_id': PROVENANCE_EXPLANATION_ID,
+        'explanation_detail': detail,
+        'tier': 'metadata'
+    }
+
+def with_metadata_hints(verdict, hints):
+    """
+    Copy of an engine verdict whose explanation also lists generator names
+    found in free-text metadata (see provenance.py); they inform, not decide
+    """
+    if not hints:
+        return verdict
+    detail = "\n".join(f"• Metadata text: {hint} (not treated as proof)" for hint in hints)
+    return dict(verdict,
+                explanation=expand_explanation(verdict['explanation_id'], detail),
+                explanation_detail=detail)
+
+def expand_explanation(explanation_id, detail=None):
+    """
+    Explanation text for a stored id, followed by the row's own detail lines
+
+    Unknown ids (or None, for rows written before explanation_id existed)
+    return the detail unchanged, which is the full stored text for those rows
+    """
+    template = EXPLANATIONS.get(explanation_id)
+    if template is None:
+        return detail
+    return f"{template}\n{detail}" if detail else template
+
+def expand_row(row):
+    """Fill in an ai_detections row's explanation from its explanation_id, in place"""
+    if row and row.get('explanation_id') is not None:
+        row['explanation'] = expand_explanation(row['explanation_id'], row.get('explanation'))
+    return row
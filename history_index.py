@@ -0,0 +1,157 @@
+"""
+Append-only index of saved analyses for the Streamlit history view
+Rows are written by save_image_and_results, so the history page is a single
+indexed query instead of a rescan of RESULTS_DIR
+"""
+import os
+import json
+import sqlite3
+from contextlib import contextmanager
+
+THUMBNAIL_SIZE = (150, 150)
+
+class HistoryIndex:
+    """
+    SQLite index of analysis results
+
+    seq numbers rows 1..n in insertion order with no gaps (unlike id, which
+    can skip values), so it is both the row count and a page address
+    """
+
+    def __init__(self, results_dir):
+        self.results_dir = results_dir
+        self.db_path = os.path.join(results_dir, 'history.db')
+        self.thumbnail_dir = os.path.join(results_dir, 'thumbnails')
+        os.makedirs(self.thumbnail_dir, exist_ok=True)
+
+        with self._connect() as connection:
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS analyses (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    timestamp TEXT NOT NULL,
+                    original_filename TEXT NOT NULL,
+                    json_path TEXT NOT NULL UNIQUE,
+                    image_path TEXT,
+                    thumbnail_path TEXT,
+                    is_ai_generated INTEGER NOT NULL,
+                    confidence_percent REAL NOT NULL,
+                    phash TEXT,
+                    result_json TEXT NOT NULL,
+                    seq INTEGER
+                )
+            """)
+            # Indexes created before seq existed
+            columns = {row['name'] for row in connection.execute("PRAGMA table_info(analyses)")}
+            if 'seq' not in columns:
+                connection.execute("ALTER TABLE analyses ADD COLUMN seq INTEGER")
+            connection.execute(
+                "UPDATE analyses SET seq = (SELECT COUNT(*) FROM analyses AS earlier "
+                "WHERE earlier.id <= analyses.id) WHERE seq IS NULL"
+            )
+            connection.execute("CREATE UNIQUE INDEX IF NOT EXISTS idx_analyses_seq ON analyses (seq)")
+
+        if self.count() == 0:
+            self._backfill()
+
+    @contextmanager
+    def _connect(self):
+        connection = sqlite3.connect(self.db_path, timeout=30)
+        connection.row_factory = sqlite3.Row
+        connection.execute("PRAGMA journal_mode=WAL")
+        try:
+            with connection:
+                yield connection
+        finally:
+            connection.close()
+
+    def make_thumbnail(self, image, name):
+        """Save a small JPEG preview of a PIL image and return its path"""
+        thumbnail = image.copy()
+        thumbnail.thumbnail(THUMBNAIL_SIZE)
+        if thumbnail.mode != 'RGB':
+            thumbnail = thumbnail.convert('RGB')
+        thumbnail_path = os.path.join(self.thumbnail_dir, f"{name}.jpg")
+        thumbnail.save(thumbnail_path, 'JPEG', quality=85)
+        return thumbnail_path
+
+    def add(self, json_path, result, thumbnail_path=None):
+        """Append one saved analysis (result is the dict written to json_path)"""
+        with self._connect() as connection:
+            self._insert(connection, json_path, result, thumbnail_path)
+
+    def _insert(self, connection, json_path, result, thumbnail_path=None):
+        connection.execute(
+            """INSERT OR IGNORE INTO analyses
+               (timestamp, original_filename, json_path, image_path, thumbnail_path,
+                is_ai_generated, confidence_percent, phash, result_json, seq)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?,
+                       (SELECT COALESCE(MAX(seq), 0) + 1 FROM analyses))""",
+            (
+                result.get('timestamp', ''),
+                result.get('original_filename', 'Unknown'),
+                json_path,
+                result.get('saved_image_path'),
+                thumbnail_path,
+                1 if result.get('is_ai_generated') else 0,
+                result.get('confidence_percent', 0),
+                result.get('phash'),
+                json.dumps(result)
+            )
+        )
+
+    def count(self):
+        """Total analyses; seq has no gaps, so MAX(seq) is an O(1) index lookup"""
+        with self._connect() as connection:
+            row = connection.execute("SELECT MAX(seq) AS last_seq FROM analyses").fetchone()
+        return row['last_seq'] or 0
+
+    def page(self, page, page_size=10):
+        """
+        Return one page of analyses, newest first
+
+        Pages are addressed by seq range rather than OFFSET, so any page costs
+        the same regardless of how many analyses exist.
+        """
+        newest = self.count() - page * page_size
+        with self._connect() as connection:
+            rows = connection.execute(
+                "SELECT * FROM analyses WHERE seq <= ? ORDER BY seq DESC LIMIT ?",
+                (newest, page_size)
+            ).fetchall()
+
+        entries = []
+        for row in rows:
+            entry = dict(row)
+            entry['result'] = json.loads(entry.pop('result_json'))
+            entries.append(entry)
+        return entries
+
+    def phashes(self, tiers=None):
+        """
+        Yield (phash, json_path) for every analysis with a perceptual hash,
+        or with tiers only those whose detection_tier is one of them
+        """
+        query = "SELECT phash, json_path FROM analyses WHERE phash IS NOT NULL"
+        params = ()
+        if tiers is not None:
+            tiers = tuple(tiers)
+            query += (" AND json_extract(result_json, '$.detection_tier') IN (%s)"
+                      % ", ".join("?" * len(tiers)))
+            params = tiers
+        with self._connect() as connection:
+            rows = connection.execute(query, params).fetchall()
+        for row in rows:
+            yield row['phash'], row['json_path']
+
+    def _backfill(self):
+        """One-time import of results saved before the index existed"""
+        json_files = sorted(f for f in os.listdir(self.results_dir) if f.endswith('.json'))
+        with self._connect() as connection:
+            for json_file in json_files:
+                json_path = os.path.join(self.results_dir, json_file)
+                try:
+                    with open(json_path, 'r', encoding='utf-8') as f:
+                        result = json.load(f)
+                except (OSError, ValueError):
+                    continue
+                self._insert(connection, json_path, result)